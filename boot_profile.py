@@ -0,0 +1,28 @@
+import utime
+import gc
+
+# Perfil do arranque: instante (ticks_ms desde o reset) e memória livre no fim
+# de cada fase. Reportado na consola por report() e em /status.
+
+_stages = []
+
+def mark(stage):
+    """ Regista o fim de uma fase do arranque """
+    now = utime.ticks_ms()
+    prev = _stages[-1][1] if _stages else 0
+    _stages.append((stage, now, gc.mem_free()))
+    print("[BOOT] %-18s %6d ms (+%d ms) livre: %d B" % (stage, now, utime.ticks_diff(now, prev), gc.mem_free()))
+
+def stages():
+    """ Fases registadas, para o /status """
+    out = []
+    prev = 0
+    for stage, t, free in _stages:
+        out.append({"stage": stage, "t_ms": t, "dt_ms": utime.ticks_diff(t, prev), "mem_free": free})
+        prev = t
+    return out
+
+def report():
+    print("[BOOT] Resumo do arranque:")
+    for s in stages():
+        print("[BOOT]   %-18s %6d ms (+%d ms) livre: %d B" % (s["stage"], s["t_ms"], s["dt_ms"], s["mem_free"]))
@@ -0,0 +1,159 @@
+import utime
+from array import array
+from machine import Pin
+import uasyncio as asyncio
+
+# Botão por interrupção. A IRQ só regista o instante e o nível de cada flanco
+# num anel pré-alocado e acorda o consumidor; o debounce e a máquina de gestos
+# correm fora da IRQ, sobre os instantes registados, e produzem eventos:
+#
+#   (SHORT, 1, t)        clique simples (depois de MULTI_GAP_MS sem novo clique)
+#   (MULTI, n, t)        n cliques seguidos
+#   (LONG, 0, t)         pressionado LONG_MS (emitido ainda com o botão em baixo)
+#   (VERY_LONG, 0, t)    pressionado VERY_LONG_MS
+
+BUTTON_PIN = 26
+DEBOUNCE_MS = 30        # nível tem de ficar estável este tempo para contar
+LONG_MS = 1500
+VERY_LONG_MS = 15000
+MULTI_GAP_MS = 250      # intervalo máximo entre cliques de um multi-clique
+EDGE_RING = 16          # potência de 2
+MAX_EVENTS = 8
+
+SHORT = "SHORT"
+MULTI = "MULTI"
+LONG = "LONG"
+VERY_LONG = "VERY_LONG"
+
+# Escritos pela IRQ
+_edge_t = array('l', [0] * EDGE_RING)
+_edge_v = bytearray(EDGE_RING)
+_edge_head = 0
+
+# Estado da máquina de gestos (só o consumidor mexe)
+_edge_tail = 0
+_level = 0              # nível já com debounce
+_raw_level = 0
+_raw_t = 0
+_pressed_at = 0
+_long_sent = False
+_very_long_sent = False
+_clicks = 0
+_released_at = 0
+_events = []
+
+_flag = asyncio.ThreadSafeFlag()
+_pin = None
+
+stats = {"edges": 0, "bounces": 0, "overruns": 0, "events": 0, "dropped": 0}
+
+def _on_edge(pin):
+    global _edge_head
+    i = _edge_head & (EDGE_RING - 1)
+    _edge_t[i] = utime.ticks_ms()
+    _edge_v[i] = pin.value()
+    _edge_head += 1
+    _flag.set()
+
+def init(pin_id=BUTTON_PIN):
+    global _pin, _level, _raw_level, _raw_t
+    _pin = Pin(pin_id, Pin.IN, Pin.PULL_DOWN)
+    _level = _raw_level = _pin.value()
+    _raw_t = utime.ticks_ms()
+    _pin.irq(handler=_on_edge, trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING)
+
+def is_pressed():
+    return _level == 1
+
+def _emit(kind, count, t):
+    if len(_events) >= MAX_EVENTS:
+        _events.pop(0)
+        stats["dropped"] += 1
+    _events.append((kind, count, t))
+    stats["events"] += 1
+
+def _drain_edges():
+    """ Passa os flancos registados pela IRQ para o nível bruto mais recente """
+    global _edge_tail, _raw_level, _raw_t
+    head = _edge_head
+    if head - _edge_tail > EDGE_RING:
+        # Rajada de ressaltos maior que o anel: só os mais recentes interessam
+        stats["overruns"] += 1
+        _edge_tail = head - EDGE_RING
+    while _edge_tail != head:
+        i = _edge_tail & (EDGE_RING - 1)
+        stats["edges"] += 1
+        if utime.ticks_diff(_edge_t[i], _raw_t) < DEBOUNCE_MS:
+            stats["bounces"] += 1  # flanco dentro da janela de debounce do anterior
+        _raw_level = _edge_v[i]
+        _raw_t = _edge_t[i]
+        _edge_tail += 1
+
+def _process(now):
+    """ Debounce e gestos até `now`; os eventos ficam em _events """
+    global _level, _pressed_at, _long_sent, _very_long_sent, _clicks, _released_at
+    _drain_edges()
+
+    if _raw_level != _level and utime.ticks_diff(now, _raw_t) >= DEBOUNCE_MS:
+        _level = _raw_level
+        if _level:
+            _pressed_at = _raw_t
+            _long_sent = _very_long_sent = False
+        else:
+            if _long_sent:
+                _clicks = 0
+            else:
+                _clicks += 1
+                _released_at = _raw_t
+
+    if _level:
+        held = utime.ticks_diff(now, _pressed_at)
+        if not _long_sent and held >= LONG_MS:
+            _long_sent = True
+            _clicks = 0
+            _emit(LONG, 0, now)
+        if not _very_long_sent and held >= VERY_LONG_MS:
+            _very_long_sent = True
+            _emit(VERY_LONG, 0, now)
+    elif _clicks and utime.ticks_diff(now, _released_at) >= MULTI_GAP_MS:
+        _emit(SHORT if _clicks == 1 else MULTI, _clicks, _released_at)
+        _clicks = 0
+
+def _next_deadline(now):
+    """ ms até a máquina de gestos precisar de correr sem novos flancos (None = só com flancos) """
+    waits = []
+    if _raw_level != _level:
+        waits.append(DEBOUNCE_MS - utime.ticks_diff(now, _raw_t))
+    if _level:
+        held = utime.ticks_diff(now, _pressed_at)
+        if not _long_sent:
+            waits.append(LONG_MS - held)
+        elif not _very_long_sent:
+            waits.append(VERY_LONG_MS - held)
+    elif _clicks:
+        waits.append(MULTI_GAP_MS - utime.ticks_diff(now, _released_at))
+    if not waits:
+        return None
+    return max(1, min(waits))
+
+async def next_event(timeout_ms=None):
+    """ Próximo gesto, ou None se passar `timeout_ms` sem nenhum """
+    start = utime.ticks_ms()
+    while True:
+        now = utime.ticks_ms()
+        _process(now)
+        if _events:
+            return _events.pop(0)
+        wait = _next_deadline(now)
+        if timeout_ms is not None:
+            left = timeout_ms - utime.ticks_diff(now, start)
+            if left <= 0:
+                return None
+            wait = left if wait is None else min(wait, left)
+        if wait is None:
+            await _flag.wait()
+        else:
+            try:
+                await asyncio.wait_for_ms(_flag.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
@@ -1,144 +1,124 @@
 import utime
-import _thread
 import machine
-from machine import Pin
+import uasyncio as asyncio
 import config
 import state
-import neopixel
-
-# Configuração dos LEDs e botão
-np = neopixel.NeoPixel(Pin(23), 8)
-button_pin = Pin(26, Pin.IN, Pin.PULL_DOWN)
+import button
+import leds
+import mem_profile
 
 # Parâmetros
-LONG_PRESS_DURATION = 1500  # 5s para standby/reset
 MENU_TIMEOUT = 4000         # Timeout dos menus
+MENU_BLINK_MS = 200
+
+COMFORT_ORDER = ("TEMPERATE", "MEDIUM", "WARM")
+
+_menu_blinking = False
+
+def comfort_color(s):
+    if not s.triac_on:
+        return (1, 0, 0)  # standby: vermelho fixo
+    elif s.comfort_mode == "TEMPERATE":
+        return (3, 3, 0)
+    elif s.comfort_mode == "MEDIUM":
+        return (4, 2, 0)
+    elif s.comfort_mode == "WARM":
+        return (5, 1, 0)
+    return leds.OFF
 
 def update_comfort_led():
     """ Atualiza o LED 0 com base no modo atual """
-    if not state.triac_on:
-        np[0] = (1, 0, 0)  # standby: vermelho fixo
-    elif state.comfort_mode == "TEMPERATE":
-        np[0] = (3, 3, 0)
-    elif state.comfort_mode == "MEDIUM":
-        np[0] = (4, 2, 0)
-    elif state.comfort_mode == "WARM":
-        np[0] = (5, 1, 0)
+    global _menu_blinking
+    s = state.snapshot
+    if s.menu_state == "BLOQUEADO":
+        leds.set_status((3, 0, 0))
     else:
-        np[0] = (0, 0, 0)
-    np.write()
+        leds.set_status(comfort_color(s))
+    # No menu de conforto o LED pisca com a cor do modo
+    if s.menu_state == "MENU_CONFORTO" and s.triac_on:
+        leds.play(((comfort_color(s), MENU_BLINK_MS), (leds.OFF, MENU_BLINK_MS)), repeat=True)
+        _menu_blinking = True
+    elif _menu_blinking:
+        leds.stop()
+        _menu_blinking = False
 
 def unlock_effect():
-    steps = 40
-    for i in range(steps + 1):
-        r = int(10 - (10 * i / steps))
-        g = int(0 + (40 * i / steps))
-        np[0] = (r, g, 0)
-        np.write()
-        utime.sleep_ms(15)
-    for _ in range(3):
-        np[0] = (0, 20, 0)
-        np.write()
-        utime.sleep_ms(100)
-        np[0] = (0, 0, 0)
-        np.write()
-        utime.sleep_ms(100)
+    """ Animação de desbloqueio; corre no serviço de LEDs sem bloquear quem a pede """
+    leds.play(leds.UNLOCK)
 
-def button_control_thread():
-    last_menu_state = None
-    last_blink_time = utime.ticks_ms()
-    blink_state = False
-
-    last_comfort_mode_shown = None
-    last_comfort_check = utime.ticks_ms()
-
-    while True:
-        now = utime.ticks_ms()
-
-        # === Atualiza LED se houver mudança de estado ===
-        if state.menu_state != last_menu_state:
-            print(f"[STATE] {last_menu_state} -> {state.menu_state}")
-            last_menu_state = state.menu_state
-            blink_state = False
-            update_comfort_led()
-            last_comfort_mode_shown = state.comfort_mode
-            if state.menu_state == "BLOQUEADO":
-                np[0] = (3, 0, 0)
-                np.write()
-
-        # === Atualização periódica de LED no modo OPERATIONAL ===
-        if state.menu_state == "OPERATIONAL" and state.triac_on:
-            if utime.ticks_diff(now, last_comfort_check) > 1000:
-                last_comfort_check = now
-                if state.comfort_mode != last_comfort_mode_shown:
-                    update_comfort_led()
-                    last_comfort_mode_shown = state.comfort_mode
+def on_long_press():
+    s = state.snapshot
+    if s.menu_state == "BLOQUEADO":
+        print("[BOTÃO] Desbloqueio por pressão longa")
+        state.update(menu_state="OPERATIONAL", triac_on=True)
+        update_comfort_led()
+        unlock_effect()
+    elif not s.triac_on:
+        print("[BOTÃO] Saindo de standby")
+        # A percentagem volta a ser 100%, mas será modulada pela temperatura
+        state.update(triac_on=True, menu_state="OPERATIONAL", percentage=100)
+        update_comfort_led()
+    else:
+        print("[BOTÃO] Entrando em standby")
+        # mantém OPERATIONAL
+        state.update(triac_on=False, percentage=0, menu_state="OPERATIONAL")
+        update_comfort_led()
 
-        # === LED pisca no menu conforto ===
-        if state.menu_state == "MENU_CONFORTO" and state.triac_on:
-            if utime.ticks_diff(now, last_blink_time) > 200:
-                blink_state = not blink_state
-                if blink_state:
-                    update_comfort_led()
-                else:
-                    np[0] = (0, 0, 0)
-                    np.write()
-                last_blink_time = now
+def on_click(now):
+    s = state.snapshot
+    if s.menu_state == "OPERATIONAL" and s.triac_on:
+        print("[OPERATIONAL] Entrando em ajuste de conforto")
+        state.update(menu_state="MENU_CONFORTO", last_menu_time=now)
+        update_comfort_led()
 
-        # === BOTÃO PRESSIONADO ===
-        if button_pin.value() == 1:
-            utime.sleep_ms(50)
-            press_time = utime.ticks_ms()
-            while button_pin.value() == 1:
-                elapsed = utime.ticks_diff(utime.ticks_ms(), press_time)
-                if elapsed > LONG_PRESS_DURATION:
-                    if state.menu_state == "BLOQUEADO":
-                        print("[BOTÃO] Desbloqueio por 5s")
-                        unlock_effect()
-                        with state.lock:
-                            state.menu_state = "OPERATIONAL"
-                            state.triac_on = True
-                    elif not state.triac_on:
-                        print("[BOTÃO] Saindo de standby")
-                        with state.lock:
-                            state.triac_on = True
-                            state.menu_state = "OPERATIONAL"
-                            # A percentagem volta a ser 100%, mas será modulada pela temperatura
-                            state.percentage = 100
-                        update_comfort_led()
-                    else:
-                        print("[BOTÃO] Entrando em standby")
-                        with state.lock:
-                            state.triac_on = False
-                            state.percentage = 0
-                            state.menu_state = "OPERATIONAL"  # mantém OPERATIONAL
-                    update_comfort_led()
-                    break  # evita processamento de clique curto
-                utime.sleep_ms(10)
-            else:
-                # Clique curto
-                release_time = utime.ticks_ms()
+    elif s.menu_state == "MENU_CONFORTO" and s.triac_on:
+        if s.comfort_mode in COMFORT_ORDER:
+            comfort_mode = COMFORT_ORDER[(COMFORT_ORDER.index(s.comfort_mode) + 1) % len(COMFORT_ORDER)]
+        else:
+            comfort_mode = COMFORT_ORDER[0]
+        print("[MENU_CONFORTO] Novo modo:", comfort_mode)
+        state.update(comfort_mode=comfort_mode, last_menu_time=now)
+        update_comfort_led()
 
-                if state.menu_state == "OPERATIONAL" and state.triac_on:
-                    print("[OPERATIONAL] Entrando em ajuste de conforto")
-                    state.menu_state = "MENU_CONFORTO"
-                    state.last_menu_time = release_time
+async def on_very_long_press():
+    print("[Botão] Reset Wi-Fi após 15s.")
+    config.reset_wifi_config()
+    await asyncio.sleep_ms(leds.flash((30, 0, 30), times=3, on_ms=300, off_ms=300))  # roxo
+    machine.reset()
 
-                elif state.menu_state == "MENU_CONFORTO" and state.triac_on:
-                    if state.comfort_mode == "TEMPERATE":
-                        state.comfort_mode = "MEDIUM"
-                    elif state.comfort_mode == "MEDIUM":
-                        state.comfort_mode = "WARM"
-                    else:
-                        state.comfort_mode = "TEMPERATE"
-                    print("[MENU_CONFORTO] Novo modo:", state.comfort_mode)
-                    state.last_menu_time = release_time
-                    update_comfort_led()
+async def menu_task():
+    """ Consome os gestos do botão (button.py) e aplica-os ao menu """
+    button.init()
+    while True:
+        timeout = None
+        if state.snapshot.menu_state == "MENU_CONFORTO":
+            timeout = max(0, MENU_TIMEOUT - utime.ticks_diff(utime.ticks_ms(), state.last_menu_time))
+        event = await button.next_event(timeout)
 
-        # === Timeout do menu de conforto ===
-        if state.menu_state == "MENU_CONFORTO":
-            if utime.ticks_diff(now, state.last_menu_time) > MENU_TIMEOUT:
+        if event is None:
+            # === Timeout do menu de conforto ===
+            if state.snapshot.menu_state == "MENU_CONFORTO":
                 print("[MENU_CONFORTO] Timeout – Voltando para OPERATIONAL")
-                state.menu_state = "OPERATIONAL"
+                state.update(menu_state="OPERATIONAL")
+                update_comfort_led()
+            continue
+
+        kind, clicks, t = event
+        mem_start = mem_profile.begin()
+        if kind == button.LONG:
+            on_long_press()
+        elif kind == button.VERY_LONG:
+            await on_very_long_press()
+        else:
+            # Multi-clique: cada clique conta como um clique simples (entra no menu e avança o modo)
+            for _ in range(clicks):
+                on_click(utime.ticks_ms())
+        mem_profile.end(mem_profile.loops, "menu", mem_start)
 
-        utime.sleep_ms(20)
\ No newline at end of file
+async def led_sync_task():
+    """ Atualiza o LED de estado quando o estado muda fora do botão (web, Wi-Fi) """
+    sub = state.subscribe(state.MODE_CHANGED | state.POWER_CHANGED)
+    update_comfort_led()
+    while True:
+        await sub.wait()
+        update_comfort_led()
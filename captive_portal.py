@@ -1,11 +1,12 @@
 import gc, sys, network, socket, uasyncio as asyncio, json, time, machine, os
 from machine import Pin
+import http_parser
+import config
 
 SERVER_IP = '10.0.0.1'
 SERVER_SUBNET = '255.255.255.0'
 IS_UASYNCIO_V3 = hasattr(asyncio, "__version__") and asyncio.__version__ >= (3,)
 HTML_FILE = "index.html"
-CONFIG_FILE = "wifi_config.json"
 RESET_PIN = 0  # GPIO0 (boot button)
 FAIL_FLAG_FILE = "wifi_fail.flag"
 
@@ -18,8 +19,7 @@ async def monitor_reset_button():
             pressed_time += 1
             if pressed_time > 5 * 10:
                 print("[DEBUG] → Botão pressionado por >5s. Apagando config Wi-Fi...")
-                if CONFIG_FILE in os.listdir():
-                    os.remove(CONFIG_FILE)
+                config.reset_wifi_config()
                 await asyncio.sleep(1)
                 machine.reset()
         else:
@@ -43,8 +43,7 @@ def scan_wifi():
     return [{"ssid": net[0].decode(), "rssi": net[3]} for net in sta.scan()]
 
 def save_config(data):
-    with open(CONFIG_FILE, "w") as f:
-        f.write(json.dumps(data))
+    config.save_wifi_config(data.get("ssid"), data.get("password", ""), data.get("hostname"))
 
 def clear_wifi_interfaces():
     ap = network.WLAN(network.AP_IF)
@@ -111,18 +110,17 @@ async def configure_wifi_from_http(data):
 
 async def handle_http(reader, writer):
     try:
-        req_line = await reader.readline()
-        print("[DEBUG] → Linha de requisição:", req_line)
-        if not req_line:
+        try:
+            # Mesmos prazos que o portal do wifi_manager
+            req = await http_parser.read_request(http_parser.LineReader(reader), 10000, 5000, 5000)
+        except http_parser.HTTPError as e:
+            print("[DEBUG] → Pedido inválido:", e)
+            await writer.awrite("HTTP/1.0 %d %s\r\n\r\n" % (e.status, e))
+            await writer.aclose()
+            return
+        if req is None:
             return
-        method, path, _ = req_line.decode().split()
-        headers = {}
-        while True:
-            line = await reader.readline()
-            if line == b'\r\n': break
-            parts = line.decode().split(":", 1)
-            if len(parts) == 2:
-                headers[parts[0].strip().lower()] = parts[1].strip()
+        method, path = req.method, req.path
 
         print(f"[DEBUG] → Método: {method}, Caminho: {path}")
 
@@ -131,11 +129,9 @@ async def handle_http(reader, writer):
             await writer.awrite("HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n" + res)
 
         elif path == "/configure" and method == "POST":
-            content_length = int(headers.get("content-length", 0))
-            print(f"[DEBUG] → Content-Length: {content_length}")
-            body = await reader.read(content_length)
-            print(f"[DEBUG] → Corpo recebido: {body}")
-            data = json.loads(body)
+            # O parser já leu exatamente Content-Length bytes, mesmo que venham em vários segmentos
+            print(f"[DEBUG] → Corpo recebido: {req.body}")
+            data = json.loads(req.body)
             try:
                 await writer.awrite("HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n")
                 if await configure_wifi_from_http(data):
@@ -166,8 +162,7 @@ async def handle_http(reader, writer):
                     sys.print_exception(e)
 
         elif path == "/reset":
-            if CONFIG_FILE in os.listdir():
-                os.remove(CONFIG_FILE)
+            config.reset_wifi_config()
             await writer.awrite("HTTP/1.0 200 OK\r\n\r\nConfiguração apagada. A reiniciar...")
             await asyncio.sleep(1)
             machine.reset()
@@ -192,6 +187,10 @@ async def handle_http(reader, writer):
     except Exception as e:
         print("[DEBUG] → Exceção em handle_http:")
         sys.print_exception(e)
+        try:
+            await writer.aclose()
+        except Exception:
+            pass
 
 async def dns_server():
     udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -1,22 +1,229 @@
 import json
 import os
+import struct
+import binascii
 
-CONFIG_FILE = "wifi_config.json"
+# Configuração persistente num único ficheiro binário (Wi-Fi e configurações
+# de regulação), lido uma vez no arranque e servido a partir de `_cache`.
+#
+#   cabeçalho: magia, versão do esquema, tamanho do conteúdo, CRC32 do conteúdo
+#   conteúdo:  flags | [configurações] | [Wi-Fi: ssid, password, hostname]
+#
+# Ficheiros de versões anteriores (wifi_config.json, settings.json) são
+# migrados na primeira leitura e apagados depois de gravado o novo.
 
-def load_wifi_config():
+CONFIG_FILE = "config.bin"
+TEMP_FILE = CONFIG_FILE + ".tmp"
+LEGACY_WIFI_FILE = "wifi_config.json"
+LEGACY_SETTINGS_FILE = "settings.json"
+
+MAGIC = b"HHCF"
+SCHEMA_VERSION = 1
+HEADER_FORMAT = "<4sHHI"
+HEADER_SIZE = 12
+
+FLAG_SETTINGS = 0x01
+FLAG_WIFI = 0x02
+
+# percentage, comfort_mode, sensor_resolution, sensor_interval_ms, regulation_mode,
+# limites (low, high) x 3 em centésimos de ºC, ganhos PID (kp, ki, kd) x 3
+SETTINGS_FORMAT = "<BBBIB6h9f"
+SETTINGS_SIZE = struct.calcsize(SETTINGS_FORMAT)
+COMFORT_MODES = ("TEMPERATE", "MEDIUM", "WARM")  # ordem fixa no ficheiro
+REGULATION_MODES = ("LINEAR", "PID")
+SETTINGS_KEYS = ("percentage", "comfort_mode", "online_temperature_thresholds", "sensor_resolution",
+                 "sensor_interval_ms", "probe_source", "regulation_mode", "pid_gains")
+
+_cache = None  # {"wifi": dict ou None, "settings": dict ou None}
+_stored = None  # conteúdo atual do ficheiro: gravações iguais são evitadas
+
+def _pack_str(buf, value):
+    data = value.encode()
+    if len(data) > 255:
+        raise ValueError("texto demasiado longo")
+    buf.append(len(data))
+    buf.extend(data)
+
+def _unpack_str(payload, pos):
+    n = payload[pos]
+    return bytes(payload[pos + 1:pos + 1 + n]).decode(), pos + 1 + n
+
+def _pack(cache):
+    settings = cache["settings"]
+    wifi = cache["wifi"]
+    payload = bytearray(1)
+    if settings is not None:
+        payload[0] |= FLAG_SETTINGS
+        limits = []
+        gains = []
+        for mode in COMFORT_MODES:
+            low, high = settings["online_temperature_thresholds"][mode]
+            limits.append(int(round(low * 100)))
+            limits.append(int(round(high * 100)))
+            gains.extend(settings["pid_gains"][mode])
+        payload.extend(struct.pack(SETTINGS_FORMAT,
+                                   settings["percentage"],
+                                   COMFORT_MODES.index(settings["comfort_mode"]),
+                                   settings["sensor_resolution"],
+                                   settings["sensor_interval_ms"],
+                                   REGULATION_MODES.index(settings["regulation_mode"]),
+                                   *(limits + gains)))
+        _pack_str(payload, settings["probe_source"])
+    if wifi is not None:
+        payload[0] |= FLAG_WIFI
+        _pack_str(payload, wifi["ssid"])
+        _pack_str(payload, wifi["password"])
+        _pack_str(payload, wifi["hostname"])
+    header = struct.pack(HEADER_FORMAT, MAGIC, SCHEMA_VERSION, len(payload), binascii.crc32(payload) & 0xFFFFFFFF)
+    return header + payload
+
+def _unpack_v1(payload):
+    flags = payload[0]
+    pos = 1
+    cache = {"settings": None, "wifi": None}
+    if flags & FLAG_SETTINGS:
+        values = struct.unpack_from(SETTINGS_FORMAT, payload, pos)
+        pos += SETTINGS_SIZE
+        limits = values[5:11]
+        gains = values[11:20]
+        probe_source, pos = _unpack_str(payload, pos)
+        cache["settings"] = {
+            "percentage": values[0],
+            "comfort_mode": COMFORT_MODES[values[1]],
+            "sensor_resolution": values[2],
+            "sensor_interval_ms": values[3],
+            "regulation_mode": REGULATION_MODES[values[4]],
+            "online_temperature_thresholds": {
+                mode: (limits[2 * i] / 100, limits[2 * i + 1] / 100) for i, mode in enumerate(COMFORT_MODES)
+            },
+            # float32: arredonda para não mostrar 0.0199999996 na API
+            "pid_gains": {
+                mode: tuple(round(g, 6) for g in gains[3 * i:3 * i + 3]) for i, mode in enumerate(COMFORT_MODES)
+            },
+            "probe_source": probe_source
+        }
+    if flags & FLAG_WIFI:
+        ssid, pos = _unpack_str(payload, pos)
+        password, pos = _unpack_str(payload, pos)
+        hostname, pos = _unpack_str(payload, pos)
+        cache["wifi"] = {"ssid": ssid, "password": password, "hostname": hostname}
+    return cache
+
+# Leitores por versão do esquema; uma versão nova acrescenta aqui o leitor da anterior
+_READERS = {1: _unpack_v1}
+
+def _parse(data):
+    """ Conteúdo do ficheiro -> cache; ValueError se estiver corrompido ou for de versão desconhecida """
+    if len(data) < HEADER_SIZE:
+        raise ValueError("ficheiro truncado")
+    magic, version, length, crc = struct.unpack_from(HEADER_FORMAT, data)
+    payload = memoryview(data)[HEADER_SIZE:]
+    if magic != MAGIC or len(payload) != length:
+        raise ValueError("formato inválido")
+    if binascii.crc32(payload) & 0xFFFFFFFF != crc:
+        raise ValueError("checksum inválido")
+    reader = _READERS.get(version)
+    if reader is None:
+        raise ValueError("versão de esquema desconhecida: %d" % version)
+    return reader(payload)
+
+def _read_json(filename):
     try:
-        with open(CONFIG_FILE, 'r') as f:
+        with open(filename, "r") as f:
             return json.load(f)
-    except:
+    except OSError:
         return None
+    except ValueError as e:
+        print("[CONFIG] Ficheiro antigo inválido:", filename, e)
+        return None
+
+def _migrate():
+    """ Esquema 0: dois ficheiros JSON separados """
+    cache = {"settings": None, "wifi": None}
+    wifi = _read_json(LEGACY_WIFI_FILE)
+    if wifi and "ssid" in wifi:
+        cache["wifi"] = {"ssid": wifi["ssid"], "password": wifi.get("password", ""),
+                         "hostname": wifi.get("hostname") or "esp32"}
+    settings = _read_json(LEGACY_SETTINGS_FILE)
+    if settings:
+        # Campos que ainda não existiam nas versões antigas ficam com os valores por omissão
+        import state
+        cache["settings"] = {k: settings.get(k, getattr(state, k)) for k in SETTINGS_KEYS}
+    return cache
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+def _write_atomic(data):
+    """ Escreve num ficheiro temporário e troca-o pelo definitivo: um corte de energia deixa o antigo ou o novo """
+    with open(TEMP_FILE, "wb") as f:
+        f.write(data)
+    try:
+        os.rename(TEMP_FILE, CONFIG_FILE)
+    except OSError:
+        # Sistemas de ficheiros em que o destino tem de deixar de existir (FAT)
+        _remove(CONFIG_FILE)
+        os.rename(TEMP_FILE, CONFIG_FILE)
+
+def load():
+    """ Lê a configuração uma única vez; chamadas seguintes devolvem a cópia em memória """
+    global _cache, _stored
+    if _cache is not None:
+        return _cache
+    try:
+        with open(CONFIG_FILE, "rb") as f:
+            data = f.read()
+        _cache = _parse(data)
+        _stored = data
+        return _cache
+    except OSError:
+        pass
+    except (ValueError, IndexError) as e:
+        print("[CONFIG] Configuração inválida, a recomeçar:", e)
+
+    _cache = _migrate()
+    if _cache["wifi"] is not None or _cache["settings"] is not None:
+        print("[CONFIG] A migrar ficheiros JSON para", CONFIG_FILE)
+        try:
+            commit()
+            _remove(LEGACY_WIFI_FILE)
+            _remove(LEGACY_SETTINGS_FILE)
+        except (OSError, ValueError, KeyError) as e:
+            print("[CONFIG] Erro na migração:", e)
+    return _cache
+
+def commit():
+    """ Grava a cópia em memória se difere do ficheiro. Devolve True se escreveu """
+    global _stored
+    data = _pack(load())
+    if data == _stored:
+        return False
+    _write_atomic(data)
+    _stored = data
+    return True
+
+def load_wifi_config():
+    return load()["wifi"]
 
 def save_wifi_config(ssid, password, hostname):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump({"ssid": ssid, "password": password, "hostname": hostname}, f)
+    load()["wifi"] = {"ssid": ssid, "password": password, "hostname": hostname or "esp32"}
+    commit()
     print("Sucesso a gravar")
 
 def reset_wifi_config():
+    load()["wifi"] = None
     try:
-        os.remove(CONFIG_FILE)
-    except:
-        pass
+        commit()
+    except OSError as e:
+        print("[CONFIG] Erro ao apagar configuração Wi-Fi:", e)
+
+def load_settings():
+    return load()["settings"]
+
+def save_settings(values):
+    """ Substitui as configurações de regulação; devolve False se nada mudou no ficheiro """
+    load()["settings"] = values
+    return commit()
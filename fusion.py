@@ -0,0 +1,146 @@
+import utime
+from array import array
+
+# Fusão das leituras DS18B20 e MLX90614 num filtro de Kalman escalar (nível
+# constante + ruído de processo). Cada sensor tem a sua variância de medida;
+# leituras fora de GATE desvios-padrão da inovação são rejeitadas. Todo o
+# estado vive em arrays pré-alocados: update() não aloca objetos por amostra.
+#
+# O DS18B20 é a referência. O MLX90614 mede a superfície e lê normalmente
+# uns graus ao lado: o filtro aprende esse desvio (IR - DS) e só funde o IR já
+# corrigido. Enquanto houver DS, as rejeições persistentes do IR re-aprendem o
+# desvio e nunca movem a estimativa; o IR só a conduz sozinho sem DS recente.
+
+SENSOR_DS = 0
+SENSOR_IR = 1
+
+PROCESS_NOISE = 0.0005   # ºC² por segundo: quanto a temperatura real pode variar
+GATE = 3.0               # rejeita |inovação| > GATE * sqrt(P + R)
+MAX_REJECTS = 5          # rejeições seguidas de um sensor que forçam re-inicialização
+MAX_AGE_MS = 60000       # sem medidas aceites há mais tempo: estimativa inválida
+OFFSET_GAIN = 0.05       # peso de cada leitura IR na média do desvio IR - DS
+
+# Variância de medida por sensor (ºC²): DS18B20 quantiza a 1/16 ºC e é estável;
+# o IR mede a superfície e tem picos de I2C e reflexos
+noise = array('f', [0.02, 0.25])
+
+_state = array('f', [0.0, 0.0])   # [estimativa, variância]
+_offset = array('f', [0.0])        # desvio aprendido IR - DS (ºC)
+_rejects = array('H', [0, 0])      # rejeições seguidas por sensor
+_rejected_total = array('L', [0, 0])
+_last_ms = 0
+_ds_ms = 0                         # última leitura DS aceite
+_initialized = False
+_has_ds = False                    # a estimativa assenta no DS (e não só no IR)
+_offset_known = False
+_last_ir = 0.0
+
+def reset(value, sensor):
+    global _initialized
+    _state[0] = value
+    _state[1] = noise[sensor]
+    _rejects[0] = 0
+    _rejects[1] = 0
+    _initialized = True
+
+def _ds_active(now_ms):
+    return _has_ds and utime.ticks_diff(now_ms, _ds_ms) <= MAX_AGE_MS
+
+def _predict(now_ms):
+    """ A incerteza cresce com o tempo desde a última medida """
+    dt = utime.ticks_diff(now_ms, _last_ms)
+    if dt > 0:
+        _state[1] += PROCESS_NOISE * dt / 1000
+
+def _correct(value, r, now_ms):
+    global _last_ms
+    s = _state[1] + r
+    k = _state[1] / s
+    _state[0] += k * (value - _state[0])
+    _state[1] *= 1 - k
+    _last_ms = now_ms
+
+def _gated(value, r):
+    innovation = value - _state[0]
+    return innovation * innovation > GATE * GATE * (_state[1] + r)
+
+def _update_ds(value, now_ms):
+    global _last_ms, _ds_ms, _has_ds, _offset_known
+    if not _ds_active(now_ms):
+        # Primeira leitura DS (ou DS de volta): a estimativa passa a assentar nele,
+        # e o desvio do IR sai da leitura IR mais recente
+        if _initialized and not _has_ds:
+            _offset[0] = _last_ir - value
+            _offset_known = True
+        reset(value, SENSOR_DS)
+        _last_ms = _ds_ms = now_ms
+        _has_ds = True
+        return True
+    _predict(now_ms)
+    if _gated(value, noise[SENSOR_DS]):
+        _rejects[SENSOR_DS] += 1
+        _rejected_total[SENSOR_DS] += 1
+        if _rejects[SENSOR_DS] < MAX_REJECTS:
+            return False
+        # Mudança real e persistente (ex.: sonda recolocada): recomeça a partir dela
+        reset(value, SENSOR_DS)
+        _last_ms = _ds_ms = now_ms
+        return True
+    _rejects[SENSOR_DS] = 0
+    _correct(value, noise[SENSOR_DS], now_ms)
+    _ds_ms = now_ms
+    return True
+
+def _update_ir(value, now_ms):
+    global _last_ms, _offset_known, _last_ir
+    _last_ir = value
+    if not _initialized:
+        # Sem DS: o IR é a única fonte (com o desvio já aprendido, se houver)
+        reset(value - _offset[0], SENSOR_IR)
+        _last_ms = now_ms
+        return True
+    ds = _ds_active(now_ms)
+    if ds and not _offset_known:
+        _offset[0] = value - _state[0]
+        _offset_known = True
+    corrected = value - _offset[0]
+    _predict(now_ms)
+    if _gated(corrected, noise[SENSOR_IR]):
+        _rejects[SENSOR_IR] += 1
+        _rejected_total[SENSOR_IR] += 1
+        if _rejects[SENSOR_IR] < MAX_REJECTS:
+            return False
+        _rejects[SENSOR_IR] = 0
+        if ds:
+            # O desvio mudou (superfície ou ângulo diferentes): re-aprende-o sem
+            # mexer na estimativa, que continua a ser a do DS
+            _offset[0] = value - _state[0]
+            return False
+        reset(corrected, SENSOR_IR)
+        _last_ms = now_ms
+        return True
+    _rejects[SENSOR_IR] = 0
+    if ds:
+        _offset[0] += OFFSET_GAIN * (value - _state[0] - _offset[0])
+    _correct(corrected, noise[SENSOR_IR], now_ms)
+    return True
+
+def update(sensor, value, now_ms):
+    """ Incorpora uma leitura; devolve False se foi rejeitada como outlier """
+    if sensor == SENSOR_DS:
+        return _update_ds(value, now_ms)
+    return _update_ir(value, now_ms)
+
+def estimate(now_ms):
+    """ (temperatura, variância) fundidas, ou (None, None) sem medidas recentes """
+    if not _initialized or utime.ticks_diff(now_ms, _last_ms) > MAX_AGE_MS:
+        return None, None
+    return _state[0], _state[1]
+
+def stats():
+    return {
+        "variance": _state[1] if _initialized else None,
+        "ir_offset": _offset[0] if _offset_known else None,
+        "rejected_ds": _rejected_total[SENSOR_DS],
+        "rejected_ir": _rejected_total[SENSOR_IR]
+    }
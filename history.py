@@ -0,0 +1,242 @@
+import struct
+import utime
+import _thread
+import uasyncio as asyncio
+
+# Histórico de temperatura e potência: registos binários de tamanho fixo numa
+# fila em RAM, despejados em blocos para um ficheiro circular na flash.
+#
+# Limites (seguros para meses de funcionamento):
+#   - 1 registo de 8 bytes por RECORD_INTERVAL_S (60 s)
+#   - escrita na flash a cada FLUSH_RECORDS registos (30 min, ~250 bytes)
+#   - ficheiro com no máximo FLASH_RECORDS registos (32 KB, ~2,8 dias)
+# Os tempos são segundos do relógio do dispositivo (utime.time()), acertado por
+# NTP quando há rede (wifi_manager.sync_clock). Sem relógio acertado (arranque
+# a partir de 2000) os registos ficam só na fila em RAM: quando o relógio é
+# acertado são deslocados para a hora certa e só então vão para a flash, que
+# assim nunca mistura arranques com tempos sobrepostos.
+
+HISTORY_FILE = "history.bin"
+RECORD_FORMAT = "<IhBB"       # tempo (s), temperatura (centésimos de ºC), potência efetiva (%), flags
+RECORD_SIZE = 8
+HEADER_FORMAT = "<4sHHII"     # magia, versão, tamanho do registo, capacidade, próxima posição
+HEADER_SIZE = 16
+MAGIC = b"HHST"
+VERSION = 1
+
+RECORD_INTERVAL_S = 60
+FLUSH_RECORDS = 30
+RAM_RECORDS = 64              # fila em RAM; se a flash falhar, perde-se o mais antigo
+FLASH_RECORDS = 4096
+MAX_POINTS = 200              # pontos devolvidos por /history, no máximo
+READ_CHUNK = 64               # registos lidos da flash de cada vez
+
+MIN_CLOCK_YEAR = 2024        # relógio abaixo deste ano ainda não foi acertado
+
+NO_TEMPERATURE = -32768
+FLAG_TRIAC_ON = 0x01
+
+_ram = bytearray(RAM_RECORDS * RECORD_SIZE)
+_ram_start = 0                # índice do registo mais antigo por despejar
+_ram_count = 0
+_last_record_s = None
+_lock = _thread.allocate_lock()
+
+stats = {"recorded": 0, "flushes": 0, "flush_errors": 0, "dropped": 0,
+         # O RTC sobrevive a um reset por software: pode já vir acertado
+         "clock_synced": utime.localtime()[0] >= MIN_CLOCK_YEAR}
+
+def record(now_s, temperature, power, triac_on):
+    """ Acrescenta um registo à fila em RAM """
+    global _ram_start, _ram_count
+    with _lock:
+        if _ram_count == RAM_RECORDS:
+            _ram_start = (_ram_start + 1) % RAM_RECORDS
+            _ram_count -= 1
+            stats["dropped"] += 1
+        slot = (_ram_start + _ram_count) % RAM_RECORDS
+        temp = NO_TEMPERATURE if temperature is None else int(round(temperature * 100))
+        struct.pack_into(RECORD_FORMAT, _ram, slot * RECORD_SIZE, now_s, temp,
+                         max(0, min(100, int(power + 0.5))), FLAG_TRIAC_ON if triac_on else 0)
+        _ram_count += 1
+        stats["recorded"] += 1
+
+def sample(temperature, power, triac_on):
+    """ Regista no máximo um ponto por RECORD_INTERVAL_S e despeja para a flash quando há blocos completos """
+    global _last_record_s
+    now_s = utime.time()
+    if _last_record_s is not None and 0 <= now_s - _last_record_s < RECORD_INTERVAL_S:
+        return
+    _last_record_s = now_s
+    record(now_s, temperature, power, triac_on)
+    if _ram_count >= FLUSH_RECORDS and stats["clock_synced"]:
+        flush()
+
+def clock_set(delta_s):
+    """
+    Chamada depois de o relógio ser acertado, que avançou `delta_s` segundos.
+    Na primeira vez os registos ainda em RAM passam para a hora certa.
+    """
+    global _last_record_s
+    with _lock:
+        if not stats["clock_synced"]:
+            for i in range(_ram_count):
+                offset = (_ram_start + i) % RAM_RECORDS * RECORD_SIZE
+                t = struct.unpack_from("<I", _ram, offset)[0]
+                struct.pack_into("<I", _ram, offset, t + delta_s)
+            if _last_record_s is not None:
+                _last_record_s += delta_s
+            stats["clock_synced"] = True
+
+def _read_header(f):
+    raw = f.read(HEADER_SIZE)
+    if len(raw) == HEADER_SIZE:
+        magic, version, size, capacity, head = struct.unpack(HEADER_FORMAT, raw)
+        if magic == MAGIC and version == VERSION and size == RECORD_SIZE and capacity == FLASH_RECORDS and head < capacity:
+            return head
+    return None
+
+def _open_store():
+    """ Abre (ou cria) o ficheiro circular; devolve (ficheiro, próxima posição) """
+    try:
+        f = open(HISTORY_FILE, "r+b")
+        head = _read_header(f)
+        if head is not None:
+            return f, head
+        f.close()
+    except OSError:
+        pass
+    # Ficheiro inexistente ou de outro formato: recomeça
+    f = open(HISTORY_FILE, "w+b")
+    f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_SIZE, FLASH_RECORDS, 0))
+    return f, 0
+
+def flush():
+    """ Escreve a fila em RAM no ficheiro circular (uma escrita por bloco) """
+    global _ram_start, _ram_count
+    with _lock:
+        if not _ram_count:
+            return
+        try:
+            f, head = _open_store()
+            try:
+                # Registos escritos sempre em sequência: o ficheiro cresce sem buracos até à capacidade
+                for i in range(_ram_count):
+                    slot = (_ram_start + i) % RAM_RECORDS
+                    f.seek(HEADER_SIZE + head * RECORD_SIZE)
+                    f.write(memoryview(_ram)[slot * RECORD_SIZE:(slot + 1) * RECORD_SIZE])
+                    head = (head + 1) % FLASH_RECORDS
+                f.seek(0)
+                f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_SIZE, FLASH_RECORDS, head))
+            finally:
+                f.close()
+            _ram_start = 0
+            _ram_count = 0
+            stats["flushes"] += 1
+        except OSError as e:
+            stats["flush_errors"] += 1
+            print("[HIST] Erro a gravar histórico:", e)
+
+class _Buckets:
+    """ Agregação de registos ordenados em intervalos de `step` segundos """
+    __slots__ = ("t_from", "t_to", "step", "points", "bucket", "full")
+
+    def __init__(self, t_from, t_to, step):
+        self.t_from = t_from
+        self.t_to = t_to
+        self.step = step
+        self.points = []
+        self.bucket = None
+        self.full = False
+
+    def add(self, t, temp, power, flags):
+        if self.full or t < self.t_from or t > self.t_to:
+            return
+        bucket = self.bucket
+        start = self.t_from + (t - self.t_from) // self.step * self.step
+        if bucket is None or bucket[0] != start:
+            if bucket is not None:
+                self.points.append(_finish(bucket))
+                if len(self.points) >= MAX_POINTS:
+                    self.bucket = None
+                    self.full = True
+                    return
+            # início, n, n com temperatura, t_min, t_max, soma t, soma potência, n ligado
+            bucket = self.bucket = [start, 0, 0, None, None, 0, 0, 0]
+        bucket[1] += 1
+        if temp != NO_TEMPERATURE:
+            bucket[2] += 1
+            bucket[3] = temp if bucket[3] is None else min(bucket[3], temp)
+            bucket[4] = temp if bucket[4] is None else max(bucket[4], temp)
+            bucket[5] += temp
+        bucket[6] += power
+        if flags & FLAG_TRIAC_ON:
+            bucket[7] += 1
+
+    def finish(self):
+        if self.bucket is not None:
+            self.points.append(_finish(self.bucket))
+            self.bucket = None
+        return self.points
+
+async def _add_flash(buckets):
+    """
+    Registos da flash, do mais antigo para o mais recente, em blocos de
+    READ_CHUNK: o lock só é tomado durante a leitura de cada bloco (o thread
+    do sensor continua a registar) e o ciclo asyncio corre entre blocos.
+    """
+    buf = bytearray(READ_CHUNK * RECORD_SIZE)
+    try:
+        f = open(HISTORY_FILE, "rb")
+    except OSError:
+        return
+    try:
+        with _lock:
+            head = _read_header(f)
+            if head is None:
+                return
+            stored = min((f.seek(0, 2) - HEADER_SIZE) // RECORD_SIZE, FLASH_RECORDS)
+        # Com o ficheiro cheio, o mais antigo está na posição `head`
+        pos = head if stored == FLASH_RECORDS else 0
+        left = stored
+        while left and not buckets.full:
+            # Leituras em blocos contíguos, partidos no fim do anel
+            n = min(left, READ_CHUNK, FLASH_RECORDS - pos)
+            mv = memoryview(buf)[:n * RECORD_SIZE]
+            with _lock:
+                f.seek(HEADER_SIZE + pos * RECORD_SIZE)
+                complete = f.readinto(mv) == len(mv)
+            if not complete:
+                break
+            for i in range(n):
+                buckets.add(*struct.unpack_from(RECORD_FORMAT, buf, i * RECORD_SIZE))
+            pos = (pos + n) % FLASH_RECORDS
+            left -= n
+            await asyncio.sleep_ms(0)
+    except OSError:
+        pass
+    finally:
+        f.close()
+
+async def query(t_from, t_to, step):
+    """
+    Agrega os registos em [t_from, t_to] em intervalos de `step` segundos.
+    Cada ponto: [início, t_min, t_max, t_média, potência média, fração com TRIAC ligado].
+    Um despejo para a flash durante a consulta pode deixar de fora ou repetir
+    os registos desse despejo; a consulta seguinte já os vê no sítio certo.
+    """
+    step = max(step, RECORD_INTERVAL_S, (t_to - t_from) // MAX_POINTS + 1)
+    buckets = _Buckets(t_from, t_to, step)
+    await _add_flash(buckets)
+    with _lock:
+        ram = [struct.unpack_from(RECORD_FORMAT, _ram, (_ram_start + i) % RAM_RECORDS * RECORD_SIZE)
+               for i in range(_ram_count)]
+    for r in ram:
+        buckets.add(*r)
+    return step, buckets.finish()
+
+def _finish(b):
+    start, n, n_temp, t_min, t_max, t_sum, p_sum, n_on = b
+    if n_temp:
+        return [start, t_min / 100, t_max / 100, round(t_sum / n_temp / 100, 2), round(p_sum / n, 1), round(n_on / n, 2)]
+    return [start, None, None, None, round(p_sum / n, 1), round(n_on / n, 2)]
@@ -0,0 +1,232 @@
+# Parser HTTP/1.1 incremental partilhado pelo servidor do dashboard e pelo portal
+# cativo: lê o pedido linha a linha do stream, respeita Content-Length (corpos
+# divididos em vários segmentos TCP), descodifica formulários URL-encoded e
+# indica se a ligação pode ser reutilizada (keep-alive / pipelining).
+#
+# O StreamReader.readline() do uasyncio não tem limite: uma só linha enorme
+# esgotaria o heap dentro dos prazos. Os pedidos são lidos através de
+# LineReader, que lê em blocos e recusa linhas acima de MAX_LINE.
+
+import uasyncio as asyncio
+
+MAX_HEADERS = 32
+MAX_LINE = 2048           # linha de pedido ou de cabeçalho, com o CRLF
+MAX_HEADER_BYTES = 4096   # todos os cabeçalhos de um pedido
+MAX_BODY = 4096
+READ_CHUNK = 256
+
+REASONS = {
+    101: "Switching Protocols",
+    200: "OK",
+    302: "Found",
+    303: "See Other",
+    400: "Bad Request",
+    404: "Not Found",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    414: "URI Too Long",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    501: "Not Implemented",
+    503: "Service Unavailable"
+}
+
+class HTTPError(Exception):
+    """ Pedido inválido: o servidor responde com `status` e fecha a ligação """
+    def __init__(self, status, message=None):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+
+class RequestTimeout(HTTPError):
+    """ Prazo esgotado; `idle` indica que a linha de pedido nunca chegou completa """
+    def __init__(self, idle, message=None):
+        super().__init__(408, message)
+        self.idle = idle
+
+async def _with_timeout(aw, timeout_ms, idle=False):
+    # Um único wait_for por fase do pedido (cada um cria uma tarefa no uasyncio)
+    if not timeout_ms:
+        return await aw
+    try:
+        return await asyncio.wait_for_ms(aw, timeout_ms)
+    except asyncio.TimeoutError:
+        raise RequestTimeout(idle)
+
+class LineReader:
+    """
+    Envolve o StreamReader de uma ligação (uma instância por ligação: os bytes
+    já lidos além da linha ficam no buffer para o pedido seguinte e para o
+    WebSocket). readline() levanta ValueError acima de `limit` bytes, como o
+    StreamReader do CPython; read() e readexactly() esvaziam o buffer primeiro.
+    """
+    __slots__ = ("stream", "buf")
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buf = b""
+
+    async def readline(self, limit=MAX_LINE):
+        """ Linha até '\n' inclusive; no fim do stream devolve o que restar (b"" se nada) """
+        while True:
+            i = self.buf.find(b"\n")
+            if 0 <= i < limit:
+                line = self.buf[:i + 1]
+                self.buf = self.buf[i + 1:]
+                return line
+            if i >= limit or len(self.buf) >= limit:
+                raise ValueError("linha acima de %d bytes" % limit)
+            chunk = await self.stream.read(READ_CHUNK)
+            if not chunk:
+                line = self.buf
+                self.buf = b""
+                return line
+            self.buf += chunk
+
+    async def read(self, n):
+        if self.buf:
+            data = self.buf[:n]
+            self.buf = self.buf[n:]
+            return data
+        return await self.stream.read(n)
+
+    async def readexactly(self, n):
+        if len(self.buf) >= n:
+            data = self.buf[:n]
+            self.buf = self.buf[n:]
+            return data
+        # O buffer só é consumido depois da leitura: um readexactly cancelado
+        # (prazo esgotado) não perde os bytes já recebidos
+        data = await self.stream.readexactly(n - len(self.buf))
+        data = self.buf + data
+        self.buf = b""
+        return data
+
+class Request:
+    __slots__ = ("method", "path", "query", "version", "headers", "body")
+
+    def __init__(self, method, path, query, version, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def form(self):
+        """ Campos de um corpo application/x-www-form-urlencoded """
+        return parse_form(self.body.decode())
+
+    def args(self):
+        """ Parâmetros da query string """
+        return parse_form(self.query)
+
+    def keep_alive(self):
+        conn = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return conn == "keep-alive"
+        return conn != "close"
+
+async def _read_headers(reader):
+    headers = {}
+    left = MAX_HEADER_BYTES
+    while True:
+        try:
+            line = await reader.readline(min(left, MAX_LINE))
+        except ValueError:
+            raise HTTPError(431)
+        if not line:
+            raise HTTPError(400, "ligação fechada a meio dos cabeçalhos")
+        if line in (b"\r\n", b"\n"):
+            return headers
+        left -= len(line)
+        if len(headers) >= MAX_HEADERS or left <= 0:
+            raise HTTPError(431)
+        name, sep, value = line.decode().partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+
+async def read_request(reader, idle_timeout_ms=None, header_timeout_ms=None, body_timeout_ms=None):
+    """
+    Lê o próximo pedido de `reader` (um LineReader, o mesmo em todos os pedidos
+    da ligação). Devolve None se o cliente fechou a ligação
+    entre pedidos; levanta HTTPError se o pedido for inválido e RequestTimeout
+    se um dos prazos (em ms, None = sem prazo) se esgotar:
+      idle_timeout_ms   - à espera da linha de pedido
+      header_timeout_ms - cabeçalhos, depois da linha de pedido
+      body_timeout_ms   - corpo completo (Content-Length)
+    """
+    try:
+        line = await _with_timeout(reader.readline(), idle_timeout_ms, True)
+        # Tolera linhas vazias entre pedidos (alguns clientes enviam CRLF extra)
+        while line in (b"\r\n", b"\n"):
+            line = await _with_timeout(reader.readline(), idle_timeout_ms, True)
+    except ValueError:
+        raise HTTPError(414)
+    if not line:
+        return None
+
+    parts = line.decode().split()
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        raise HTTPError(400)
+    method, target, version = parts
+    path, _, query = target.partition("?")
+
+    headers = await _with_timeout(_read_headers(reader), header_timeout_ms)
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(501, "Transfer-Encoding chunked não suportado")
+
+    body = b""
+    length = headers.get("content-length")
+    if length:
+        try:
+            length = int(length)
+        except ValueError:
+            raise HTTPError(400, "Content-Length inválido")
+        if length > MAX_BODY:
+            raise HTTPError(413)
+        if length > 0:
+            try:
+                body = await _with_timeout(reader.readexactly(length), body_timeout_ms)
+            except EOFError:
+                raise HTTPError(400, "corpo incompleto")
+    elif method == "POST":
+        # Sem Content-Length não há forma de saber onde acaba o corpo numa ligação persistente
+        raise HTTPError(411)
+
+    return Request(method, path, query, version, headers, body)
+
+def unquote(s):
+    """ Descodifica %XX e '+' de um valor URL-encoded (UTF-8) """
+    if "%" not in s and "+" not in s:
+        return s
+    parts = s.replace("+", " ").split("%")
+    res = bytearray(parts[0].encode())
+    for item in parts[1:]:
+        if len(item) >= 2:
+            try:
+                res.append(int(item[:2], 16))
+                res.extend(item[2:].encode())
+                continue
+            except ValueError:
+                pass
+        res.extend(b"%" + item.encode())
+    return bytes(res).decode()
+
+def parse_form(text):
+    params = {}
+    for pair in text.split("&"):
+        if pair:
+            k, _, v = pair.partition("=")
+            params[unquote(k)] = unquote(v)
+    return params
+
+def response_head(status, content_type=None, length=0, keep_alive=True, extra=""):
+    """ Linha de estado e cabeçalhos, incluindo a linha em branco final """
+    head = "HTTP/1.1 %d %s\r\n" % (status, REASONS.get(status, ""))
+    if content_type:
+        head += "Content-Type: %s\r\n" % content_type
+    head += "Content-Length: %d\r\n" % length
+    head += "Connection: keep-alive\r\n" if keep_alive else "Connection: close\r\n"
+    return head + extra + "\r\n"
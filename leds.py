@@ -0,0 +1,149 @@
+from machine import Pin
+import neopixel
+import utime
+import uasyncio as asyncio
+import metrics
+import mem_profile
+
+# Serviço de LEDs: único dono da barra NeoPixel. Os módulos pedem cores por
+# camada e run() compõe-nas, escrevendo no máximo uma vez por frame e só se
+# algum pixel mudou. As animações avançam dentro de run(): quem as pede não
+# espera. Os pedidos são atribuições simples e podem vir de qualquer thread.
+#
+# Camadas, da mais baixa para a mais alta (a mais alta com cor ganha):
+#   LAYER_POWER     barra de potência
+#   LAYER_STATUS    pixel de estado (modo de conforto, standby, bloqueio)
+#   LAYER_ANIMATION efeitos temporários (desbloqueio, Wi-Fi, ...)
+
+LED_PIN = 23
+NUM_LEDS = 8
+FRAME_MS = 20
+MEM_SAMPLE_FRAMES = 50  # contabilização de memória de um frame em cada 50 (ver mem_profile.py)
+
+LAYER_POWER = 0
+LAYER_STATUS = 1
+LAYER_ANIMATION = 2
+NUM_LAYERS = 3
+
+OFF = (0, 0, 0)
+
+np = neopixel.NeoPixel(Pin(LED_PIN), NUM_LEDS)
+np.fill(OFF)
+np.write()
+
+# None = transparente nessa camada
+_layers = [[None] * NUM_LEDS for _ in range(NUM_LAYERS)]
+_shown = [OFF] * NUM_LEDS
+_dirty = False
+_anims = {}  # pixel -> [frames, posição, ticks_ms do próximo frame, repetir]
+
+stats = {"frames": 0, "writes": 0}
+
+# O ciclo de frames acorda a cada FRAME_MS: o atraso face a isso mede o bloqueio do ciclo uasyncio
+loop_lag = metrics.Histogram("asyncio_loop_lag_ms", "Atraso do ciclo uasyncio face ao período de frame",
+                             (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+def set_pixel(layer, index, color):
+    """ Cor de um pixel numa camada (None para o libertar) """
+    global _dirty
+    if _layers[layer][index] != color:
+        _layers[layer][index] = color
+        _dirty = True
+
+def set_status(color):
+    set_pixel(LAYER_STATUS, 0, color)
+
+def clear(layer):
+    for i in range(NUM_LEDS):
+        set_pixel(layer, i, None)
+
+def play(frames, index=0, repeat=False):
+    """
+    Inicia uma animação no pixel `index`: `frames` é uma sequência de
+    (cor, duração em ms). Substitui a animação anterior desse pixel.
+    """
+    _anims[index] = [frames, -1, utime.ticks_ms(), repeat]
+
+def stop(index=0):
+    if _anims.pop(index, None) is not None:
+        set_pixel(LAYER_ANIMATION, index, None)
+
+def duration(frames):
+    return sum(ms for _, ms in frames)
+
+def blink_frames(color, times=4, on_ms=200, off_ms=200):
+    return ((color, on_ms), (OFF, off_ms)) * times
+
+def ramp_frames(start, end, steps, step_ms):
+    return tuple((tuple(int(a + (b - a) * i / steps) for a, b in zip(start, end)), step_ms)
+                 for i in range(steps + 1))
+
+def flash(color, times=4, on_ms=200, off_ms=200, index=0):
+    """ Pisca um pixel por cima das outras camadas; devolve a duração em ms """
+    frames = blink_frames(color, times, on_ms, off_ms)
+    play(frames, index)
+    return duration(frames)
+
+# Desbloqueio: vermelho -> verde e três piscas verdes (antes bloqueava ~1,2 s quem o chamava)
+UNLOCK = ramp_frames((10, 0, 0), (0, 40, 0), 40, 15) + blink_frames((0, 20, 0), 3, 100, 100)
+
+def _advance(now):
+    for index in list(_anims):
+        anim = _anims[index]
+        frames = anim[0]
+        if utime.ticks_diff(now, anim[2]) < 0:
+            continue
+        pos = anim[1] + 1
+        if pos >= len(frames):
+            if not anim[3]:
+                del _anims[index]
+                set_pixel(LAYER_ANIMATION, index, None)
+                continue
+            pos = 0
+        anim[1] = pos
+        anim[2] = utime.ticks_add(anim[2], frames[pos][1])
+        set_pixel(LAYER_ANIMATION, index, frames[pos][0])
+
+def render():
+    """ Compõe as camadas e escreve a barra se algum pixel mudou """
+    global _dirty
+    if not _dirty:
+        return False
+    _dirty = False
+    changed = False
+    for i in range(NUM_LEDS):
+        color = OFF
+        for layer in range(NUM_LAYERS - 1, -1, -1):
+            c = _layers[layer][i]
+            if c is not None:
+                color = c
+                break
+        if _shown[i] != color:
+            _shown[i] = color
+            np[i] = color
+            changed = True
+    if changed:
+        np.write()
+        stats["writes"] += 1
+    return changed
+
+async def run():
+    """ Ciclo de frames: avança animações e escreve as alterações """
+    frame_time = metrics.loop_duration.get("leds")
+    expected = utime.ticks_ms()
+    while True:
+        t0 = utime.ticks_us()
+        sampled = stats["frames"] % MEM_SAMPLE_FRAMES == 0
+        if sampled:
+            mem_start = mem_profile.begin()
+        now = utime.ticks_ms()
+        loop_lag.observe(max(0, utime.ticks_diff(now, expected)))
+        if _anims:
+            _advance(now)
+        render()
+        stats["frames"] += 1
+        frame_time.observe(utime.ticks_diff(utime.ticks_us(), t0))
+        if sampled:
+            mem_profile.end(mem_profile.loops, "leds", mem_start)
+        expected = utime.ticks_add(utime.ticks_ms(), FRAME_MS)
+        await asyncio.sleep_ms(FRAME_MS)
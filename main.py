@@ -1,40 +1,64 @@
+import boot_profile
 import _thread
-import time
 import uasyncio as asyncio
-import wifi_manager
-import triac_control
-import button_control
-import server
 import state
 import settings
+import leds
+import triac_control
+import button_control
 import temperature_sensor  # módulo que lê a temperatura do DS18B20
+import wifi_manager
+import mem_profile
+boot_profile.mark("imports")
+
+_server_started = False
+
+async def on_connected():
+    """ Primeira ligação: verifica OTA e arranca o servidor; religações não fazem nada """
+    global _server_started
+    if _server_started:
+        return
+    _server_started = True
+    boot_profile.mark("wifi")
+    try:
+        import ota_updater
+        ota_updater.update()
+    except Exception as e:
+        print(f"[OTA] Erro ao verificar atualizações: {e}")
+    boot_profile.mark("ota")
+
+    # Servidor (templates, WebSocket) só é carregado quando há rede
+    import server
+    asyncio.create_task(server.main_http_server())
+    boot_profile.mark("server_import")
+    boot_profile.report()
+    print("[ESP32] Sistema online!")
+
+async def run():
+    asyncio.create_task(leds.run())
+    if triac_control.TRIAC_MODE == "IRQ":
+        asyncio.create_task(triac_control.control_task())
+    # Botão por IRQ: os gestos são tratados numa tarefa, sem thread dedicado
+    asyncio.create_task(button_control.menu_task())
+    asyncio.create_task(button_control.led_sync_task())
+    asyncio.create_task(wifi_manager.wifi_task(on_connected))
+    if mem_profile.GC_INTERVAL_MS:
+        asyncio.create_task(mem_profile.gc_task())
+    while True:
+        await asyncio.sleep(3600)
 
 def main():
     settings.load_settings(state)
-    wifi_active = wifi_manager.connect_to_wifi()
-
-    # Verifica atualizações OTA se estiver ligado ao Wi-Fi
-    if wifi_active:
-        try:
-            import ota_updater
-            ota_updater.update()
-        except Exception as e:
-            print(f"[OTA] Erro ao verificar atualizações: {e}")
-
-    # Inicia as threads do TRIAC, botão e temperatura
-    _thread.start_new_thread(triac_control.triac_control_thread, ())
-    _thread.start_new_thread(button_control.button_control_thread, ())
+    boot_profile.mark("settings")
+
+    # TRIAC e temperatura não dependem da rede: arrancam já, em STANDALONE
+    if triac_control.TRIAC_MODE == "POLL":
+        _thread.start_new_thread(triac_control.triac_control_thread, ())
     _thread.start_new_thread(temperature_sensor.temperature_thread, ())
+    boot_profile.mark("threads")
+    print("[ESP32] Sistema iniciado; Wi-Fi em segundo plano.")
 
-    if wifi_active:
-        print("[ESP32] Sistema iniciado com Wi-Fi!")
-        asyncio.run(server.main_http_server())
-    else:
-        print("[ESP32] Sistema iniciado em modo standalone!")
-        while True:
-            time.sleep(1)
+    asyncio.run(run())
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,129 @@
+import gc
+import utime
+import uasyncio as asyncio
+
+# Diagnóstico do heap: memória alocada antes e depois de cada pedido HTTP e de
+# cada iteração dos ciclos principais, por nome (rota ou ciclo), mínimos de
+# memória livre e recolhas de lixo agendadas fora do caminho de tempo real.
+# Reportado em /debug/mem e, resumido, em /metrics.
+#
+# Os valores são aproximados: outro thread (temperatura) pode alocar durante a
+# medição, e uma recolha a meio dá uma diferença negativa, contada à parte em
+# `collected` e fora da soma. gc.mem_alloc() percorre a tabela de blocos do
+# heap, por isso os ciclos rápidos (LEDs) só são medidos de vez em quando.
+
+GC_INTERVAL_MS = 10000     # recolha agendada; 0 desliga (fica só a automática)
+GC_FREE_THRESHOLD = 16384  # recolhe antes do prazo se a memória livre descer abaixo disto
+GC_CHECK_MS = 1000
+
+# Campos de cada contabilização
+COUNT = 0        # medições
+BYTES = 1        # bytes alocados (soma das diferenças positivas)
+MAX_BYTES = 2    # maior alocação numa medição
+COLLECTED = 3    # medições com recolha a meio (diferença negativa)
+PEAK_ALLOC = 4   # maior gc.mem_alloc() no fim de uma medição
+
+routes = {}  # rota HTTP -> [COUNT, BYTES, MAX_BYTES, COLLECTED, PEAK_ALLOC]
+loops = {}   # ciclo -> idem
+
+heap = {
+    "low_water_free": None,  # menor gc.mem_free() observado
+    "high_water_alloc": 0,   # maior gc.mem_alloc() observado
+    "collections": 0,        # recolhas feitas por collect()
+    "freed": 0,              # bytes libertados por essas recolhas
+    "gc_last_us": 0,
+    "gc_max_us": 0
+}
+
+def _watermarks(alloc, free):
+    low = heap["low_water_free"]
+    if low is None or free < low:
+        heap["low_water_free"] = free
+    if alloc > heap["high_water_alloc"]:
+        heap["high_water_alloc"] = alloc
+
+def begin():
+    """ Início de uma medição: devolve a memória alocada agora """
+    return gc.mem_alloc()
+
+def end(table, name, start):
+    """ Fim de uma medição iniciada com begin(), contabilizada em table[name] """
+    alloc = gc.mem_alloc()
+    account = table.get(name)
+    if account is None:
+        account = table[name] = [0, 0, 0, 0, 0]
+    account[COUNT] += 1
+    delta = alloc - start
+    if delta < 0:
+        account[COLLECTED] += 1
+    else:
+        account[BYTES] += delta
+        if delta > account[MAX_BYTES]:
+            account[MAX_BYTES] = delta
+    if alloc > account[PEAK_ALLOC]:
+        account[PEAK_ALLOC] = alloc
+    _watermarks(alloc, gc.mem_free())
+
+def collect():
+    """ gc.collect() cronometrado; devolve os bytes libertados """
+    before = gc.mem_free()
+    t0 = utime.ticks_us()
+    gc.collect()
+    dt = utime.ticks_diff(utime.ticks_us(), t0)
+    freed = gc.mem_free() - before
+    heap["collections"] += 1
+    heap["freed"] += max(0, freed)
+    heap["gc_last_us"] = dt
+    if dt > heap["gc_max_us"]:
+        heap["gc_max_us"] = dt
+    return freed
+
+async def gc_task():
+    """
+    Recolhas agendadas no ciclo uasyncio: pequenas e regulares em vez de uma
+    recolha grande quando uma alocação falha (que pode calhar num pedido ou
+    atrasar as IRQs do TRIAC). Nunca corre nas IRQs nem no thread de disparo.
+    """
+    last = utime.ticks_ms()
+    while True:
+        await asyncio.sleep_ms(GC_CHECK_MS)
+        free = gc.mem_free()
+        _watermarks(gc.mem_alloc(), free)
+        if utime.ticks_diff(utime.ticks_ms(), last) >= GC_INTERVAL_MS or free < GC_FREE_THRESHOLD:
+            collect()
+            last = utime.ticks_ms()
+
+def _accounts(table):
+    out = {}
+    for name, a in table.items():
+        out[name] = {
+            "count": a[COUNT],
+            "bytes": a[BYTES],
+            "mean_bytes": a[BYTES] // (a[COUNT] - a[COLLECTED]) if a[COUNT] > a[COLLECTED] else 0,
+            "max_bytes": a[MAX_BYTES],
+            "collected": a[COLLECTED],
+            "peak_alloc": a[PEAK_ALLOC]
+        }
+    return out
+
+def report():
+    """ Estado do heap e contabilização por rota e por ciclo, para /debug/mem """
+    free = gc.mem_free()
+    alloc = gc.mem_alloc()
+    _watermarks(alloc, free)
+    return {
+        "free": free,
+        "alloc": alloc,
+        "low_water_free": heap["low_water_free"],
+        "high_water_alloc": heap["high_water_alloc"],
+        "gc": {
+            "interval_ms": GC_INTERVAL_MS,
+            "free_threshold": GC_FREE_THRESHOLD,
+            "collections": heap["collections"],
+            "freed": heap["freed"],
+            "last_us": heap["gc_last_us"],
+            "max_us": heap["gc_max_us"]
+        },
+        "routes": _accounts(routes),
+        "loops": _accounts(loops)
+    }
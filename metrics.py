@@ -0,0 +1,123 @@
+from array import array
+
+# Métricas de baixo custo exportadas em texto no formato do Prometheus (/metrics).
+# Os histogramas têm limites fixos e contagens em arrays pré-alocados: observe()
+# é uma procura linear e um incremento, e pode ser chamado de IRQs (soft) e de
+# threads. Só render() aloca, e só quando o servidor é consultado.
+#
+# Os inteiros pequenos do MicroPython vão até 2**30: acima disso cada conta
+# cria um inteiro longo no heap. A soma de um histograma cresce sem limite
+# (~5 ms por disparo, 100 por segundo, passa 2**30 em ~35 min), por isso fica
+# repartida em parte baixa (< SUM_WRAP) e número de voltas.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SUM_WRAP = 1 << 29  # observações até este valor não saem dos inteiros pequenos
+
+histograms = []  # por ordem de criação, para render()
+
+class Histogram:
+    __slots__ = ("name", "help", "labels", "bounds", "counts", "sums")
+
+    def __init__(self, name, help, bounds, labels=None, register=True):
+        self.name = name
+        self.help = help
+        self.labels = labels        # texto 'chave="valor"' ou None
+        self.bounds = array('l', bounds)
+        self.counts = array('L', [0] * (len(bounds) + 1))  # o último é +Inf
+        self.sums = array('l', [0, 0])  # [parte baixa, voltas de SUM_WRAP]
+        if register:
+            histograms.append(self)
+
+    def observe(self, value):
+        bounds = self.bounds
+        i = 0
+        n = len(bounds)
+        while i < n and value > bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        sums = self.sums
+        s = sums[0] + value
+        if s >= SUM_WRAP:
+            s -= SUM_WRAP
+            sums[1] += 1
+        sums[0] = s
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @property
+    def sum(self):
+        return self.sums[1] * SUM_WRAP + self.sums[0]
+
+    def render(self, out, header=True):
+        if header:
+            out.append("# HELP %s %s" % (self.name, self.help))
+            out.append("# TYPE %s histogram" % self.name)
+        prefix = self.labels + "," if self.labels else ""
+        suffix = "{" + self.labels + "}" if self.labels else ""
+        total = 0
+        for i in range(len(self.bounds)):
+            total += self.counts[i]
+            out.append('%s_bucket{%sle="%d"} %d' % (self.name, prefix, self.bounds[i], total))
+        total += self.counts[-1]
+        out.append('%s_bucket{%sle="+Inf"} %d' % (self.name, prefix, total))
+        out.append("%s_sum%s %d" % (self.name, suffix, self.sum))
+        out.append("%s_count%s %d" % (self.name, suffix, total))
+
+class HistogramFamily:
+    """ Histogramas com o mesmo nome e limites, um por valor de uma etiqueta (rota, ciclo...) """
+    __slots__ = ("name", "help", "label", "bounds", "children")
+
+    def __init__(self, name, help, label, bounds):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.bounds = bounds
+        self.children = {}
+        histograms.append(self)
+
+    def get(self, value):
+        """ Histograma da etiqueta `value`, criado na primeira utilização """
+        h = self.children.get(value)
+        if h is None:
+            h = self.children[value] = Histogram(self.name, self.help, self.bounds,
+                                                 '%s="%s"' % (self.label, value), register=False)
+        return h
+
+    def render(self, out):
+        out.append("# HELP %s %s" % (self.name, self.help))
+        out.append("# TYPE %s histogram" % self.name)
+        for h in self.children.values():
+            h.render(out, header=False)
+
+# Duração de uma iteração dos ciclos principais (só o trabalho, sem a espera)
+loop_duration = HistogramFamily("loop_duration_us", "Duração de uma iteração de um ciclo", "loop",
+                                (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000))
+
+def header(out, name, kind, help):
+    out.append("# HELP %s %s" % (name, help))
+    out.append("# TYPE %s %s" % (name, kind))
+
+def sample(out, name, kind, help, value, labels=None):
+    """
+    Acrescenta um contador ou gauge; valores None são omitidos. Com kind None
+    não escreve cabeçalho (séries seguintes de uma métrica com etiquetas).
+    """
+    if value is None:
+        return
+    if kind is not None:
+        header(out, name, kind, help)
+    if isinstance(value, bool):
+        value = int(value)
+    if labels:
+        out.append("%s{%s} %s" % (name, labels, value))
+    else:
+        out.append("%s %s" % (name, value))
+
+def render(out):
+    """ Acrescenta todos os histogramas registados a `out` (lista de linhas) """
+    for h in histograms:
+        h.render(out)
+    return out
@@ -0,0 +1,69 @@
+import math
+from array import array
+
+# Tabela de atrasos de disparo linearizada em potência:
+# delays[p] = atraso (us) após o zero-crossing que entrega p% da potência RMS.
+# A potência entregue com ângulo de disparo a (0..pi) numa carga resistiva é
+#   P(a) / Pmax = 1 - a/pi + sin(2a) / (2pi)
+# que não é linear em a; um atraso proporcional à percentagem dá demasiada
+# potência a meio da escala.
+
+TABLE_SIZE = 101
+HALF_PERIOD_US = 10000  # 50 Hz por omissão
+MIN_DELAY_US = 10       # 100%: dispara logo após o zero-crossing
+END_MARGIN_US = 300     # impulso de gate (200 us) + latência, antes do fim do semiciclo
+ZC_OFFSET_US = 0        # calibração: atraso do flanco do detetor face ao zero real
+
+delays = array('H', [0] * TABLE_SIZE)
+half_period_us = HALF_PERIOD_US  # semiciclo para o qual a tabela foi construída
+
+# Ângulo de cada percentagem como fração do semiciclo (x 65535); independente da
+# frequência, calculado uma única vez para que build() seja só aritmética inteira
+_angles = array('H', [0] * TABLE_SIZE)
+_built_for = None
+
+def power_fraction(alpha):
+    return 1 - alpha / math.pi + math.sin(2 * alpha) / (2 * math.pi)
+
+def _angle_for_power(fraction):
+    # P(a) é monótona decrescente em [0, pi]: bisseção
+    lo, hi = 0.0, math.pi
+    for _ in range(24):
+        mid = (lo + hi) / 2
+        if power_fraction(mid) > fraction:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+def _build_angles():
+    for i in range(TABLE_SIZE):
+        alpha = _angle_for_power(i / (TABLE_SIZE - 1))
+        _angles[i] = int(alpha / math.pi * 65535 + 0.5)
+
+def build(period_us=HALF_PERIOD_US, zc_offset_us=ZC_OFFSET_US):
+    """
+    Reconstrói a tabela para um semiciclo e calibração. Devolve False se a tabela
+    já corresponde a estes parâmetros (chamadas repetidas são baratas).
+    """
+    global _built_for, half_period_us
+    period_us = int(period_us)
+    key = (period_us, zc_offset_us)
+    if key == _built_for:
+        return False
+
+    max_delay = period_us - END_MARGIN_US
+    delays[0] = 0  # 0 = não disparar
+    for i in range(1, TABLE_SIZE):
+        d = ((_angles[i] * period_us) >> 16) - zc_offset_us
+        if d < MIN_DELAY_US:
+            d = MIN_DELAY_US
+        elif d > max_delay:
+            d = max_delay
+        delays[i] = d
+    half_period_us = period_us
+    _built_for = key
+    return True
+
+_build_angles()
+build()
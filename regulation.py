@@ -1,22 +1,136 @@
+import utime
 import state
 
+# Regulação PID em vírgula fixa: temperaturas em centésimos de ºC, potência em
+# centésimos de %, ganhos em Q10 (x1024). Só inteiros no cálculo de cada amostra.
+Q = 10
+MAX_ERROR_C = 2000       # erro limitado a ±20 ºC
+MAX_DT_MS = 30000        # amostras muito espaçadas (ex.: sensor em falha) não disparam o integral
+
+class PID:
+    """
+    PID com ação derivativa sobre a medida (sem pico ao mudar o setpoint) e
+    anti-windup por integração condicional: o integral não cresce enquanto a
+    saída está saturada no sentido do erro. O integral guarda o termo já
+    multiplicado por ki, em centésimos de % x 2^Q, para mudanças de ganho sem salto.
+    """
+    __slots__ = ("integral", "last_temp", "last_ms", "output")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.integral = 0
+        self.last_temp = None
+        self.last_ms = None
+        self.output = None
+
+    def hold(self):
+        """
+        Saída não aplicada (TRIAC desligado, bloqueado ou em menu): congela o
+        integral e esquece a última amostra, para a retoma não integrar nem
+        derivar sobre o intervalo parado
+        """
+        self.last_temp = None
+        self.last_ms = None
+        self.output = None
+
+    def step(self, setpoint_c, temp_c, max_out, gains_q, now_ms):
+        """ Nova saída (centésimos de %, 0..max_out) para uma amostra de temperatura """
+        kp, ki, kd = gains_q
+        error = max(-MAX_ERROR_C, min(MAX_ERROR_C, setpoint_c - temp_c))
+        dt_cs = 0
+        if self.last_ms is not None:
+            dt_cs = max(0, min(MAX_DT_MS, utime.ticks_diff(now_ms, self.last_ms))) // 10
+
+        p = kp * error >> Q
+        d = 0
+        if dt_cs and kd:
+            d = -(kd * (temp_c - self.last_temp) * 100 // dt_cs) >> Q
+
+        integral = self.integral + ki * error * dt_cs // 100
+        limit = max_out << Q
+        integral = max(0, min(limit, integral))
+        out = p + (integral >> Q) + d
+        # Anti-windup: só integra se isso não empurrar ainda mais uma saída saturada
+        if not ((out > max_out and error > 0) or (out < 0 and error < 0)):
+            self.integral = integral
+        else:
+            self.integral = max(0, min(limit, self.integral))
+            out = p + (self.integral >> Q) + d
+
+        self.last_temp = temp_c
+        self.last_ms = now_ms
+        self.output = max(0, min(max_out, out))
+        return self.output
+
+pid = PID()
+
+def gains_q(gains):
+    """ Ganhos (kp %/ºC, ki %/(ºC.s), kd %.s/ºC) convertidos para Q10 """
+    return tuple(int(g * (1 << Q) + 0.5) for g in gains)
+
+def setpoint(low, high):
+    """ No modo PID o alvo é o meio da faixa de conforto """
+    return (low + high) / 2
+
+def pid_update(temperature, now_ms):
+    """
+    Avança o PID com uma nova amostra de temperatura (chamado pelo thread do
+    sensor). Devolve a potência em %, ou None sem PID ativo ou sem leitura.
+    """
+    s = state.snapshot
+    if s.regulation_mode != "PID" or temperature is None:
+        pid.reset()
+        return None
+    if not s.triac_on or s.menu_state != "OPERATIONAL":
+        # O limite max_out (percentage) não é o que o atuador aplica: integrar
+        # aqui levava o integral à saturação e a sala a passar do alvo na retoma
+        pid.hold()
+        return None
+    low, high = s.thresholds(s.comfort_mode)
+    gains = s.pid_gains.get(s.comfort_mode, state.DEFAULT_PID_GAINS)
+    out = pid.step(int(setpoint(low, high) * 100), int(temperature * 100), s.percentage * 100,
+                   gains_q(gains), now_ms)
+    return out / 100
+
+# Tabelas da regulação linear por modo de conforto: limites em ºC para as
+# comparações, high em centésimos de ºC e declive 1/(high-low) em Q20 para a
+# rampa. Recompiladas só por rebuild_tables(), quando mudam os limites
+# (settings, /update_settings) ou o operating_mode.
+SLOPE_Q = 20
+_ROUND = 1 << (SLOPE_Q - 1)
+_tables = {}
+
+def rebuild_tables(snap=None):
+    """ Compila os limites em vigor para cada modo de conforto """
+    global _tables
+    s = snap or state.snapshot
+    tables = {}
+    for mode in state.DEFAULT_TEMPERATURE_THRESHOLDS:
+        low, high = s.thresholds(mode)
+        low_c = int(round(low * 100))
+        high_c = int(round(high * 100))
+        tables[mode] = (low_c / 100, high_c / 100, high_c, (1 << SLOPE_Q) // max(1, high_c - low_c))
+    _tables = tables  # troca numa só atribuição: os leitores nunca veem tabelas a meio
+
 def calc_effective_percentage(base_percentage, temperature, comfort_mode):
     """
     Calcula a potência efetiva com base na potência base, temperatura e modo de conforto.
-    
-    Se operating_mode é "ONLINE", usa os limites definidos em state.online_temperature_thresholds.
-    Caso contrário, usa os limites padrão.
+
+    Usa as tabelas compiladas por rebuild_tables() a partir dos limites em vigor
+    (online_temperature_thresholds em modo "ONLINE", os padrão caso contrário).
+    No modo PID devolve a última saída do controlador, limitada pela potência base.
     """
     # Se não houver leitura de temperatura, retorna a potência base
     if temperature is None:
         return base_percentage
 
-    if state.operating_mode == "ONLINE":
-        thresholds = state.online_temperature_thresholds.get(comfort_mode, (16, 18))
-    else:
-        thresholds = state.DEFAULT_TEMPERATURE_THRESHOLDS.get(comfort_mode, (16, 18))
-    
-    low, high = thresholds
+    s = state.snapshot
+    if s.pid_output is not None and s.regulation_mode == "PID":
+        return min(base_percentage, s.pid_output)
+
+    low, high, high_c, slope = _tables.get(comfort_mode) or _tables["TEMPERATE"]
 
     if temperature <= low:
         return base_percentage
@@ -24,5 +138,6 @@ def calc_effective_percentage(base_percentage, temperature, comfort_mode):
         return 0
     else:
         # Regulação linear: entre low e high, a potência diminui de base_percentage até 0
-        factor = 1 - ((temperature - low) / (high - low))
-        return base_percentage * factor
+        return (base_percentage * (high_c - int(temperature * 100)) * slope + _ROUND) >> SLOPE_Q
+
+rebuild_tables()
@@ -2,245 +2,436 @@ import uasyncio as asyncio
 import json
 import utime
 import state
-import machine
-from machine import Pin
-import neopixel
+import zero_cross
+import template
+import websocket
+import http_parser
+import temperature_sensor
+import fusion
+import history
+import settings
+import regulation
+from button_control import unlock_effect, update_comfort_led
 from regulation import calc_effective_percentage
+import boot_profile
+import leds
+import metrics
+import mem_profile
+import triac_control
 
-np = neopixel.NeoPixel(Pin(23), 8)
+DASHBOARD_FILE = "dashboard.html"
+# Eventos de estado que alteram algum campo de live_state()
+WS_EVENTS = state.MODE_CHANGED | state.POWER_CHANGED | state.TEMPERATURE_UPDATED | state.SETTINGS_CHANGED
+HISTORY_DEFAULT_S = 86400  # janela do /history sem parâmetros
+SETTINGS_CHECK_MS = 500    # verificação de configurações pendentes de gravação
 
-async def handle_client(reader, writer):
+# Admissão de ligações e prazos: poucos clientes lentos não podem esgotar o heap
+MAX_CONNECTIONS = 4        # ligações HTTP em curso; acima disto responde 503 de imediato
+MAX_WS_SESSIONS = 2        # sessões /ws abertas (contam à parte das ligações HTTP)
+IDLE_TIMEOUT_MS = 10000    # à espera de um pedido numa ligação persistente
+HEADER_TIMEOUT_MS = 5000   # linha de pedido + cabeçalhos
+BODY_TIMEOUT_MS = 5000     # corpo do pedido
+WRITE_TIMEOUT_MS = 5000    # cliente que não lê a resposta
+WS_PING_MS = 30000         # /ws calado: ping, e fecho se continuar calado outro tanto
+
+stats = {
+    "active": 0,
+    "ws_active": 0,
+    "accepted": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "idle_closed": 0
+}
+
+# Rotas contabilizadas pelo nome (as restantes contam como "other"). A duração
+# do /ws fica de fora do histograma: é uma sessão, não um pedido
+ROUTES = ("/", "/toggle_power", "/update_settings", "/status", "/history", "/metrics", "/debug/mem", "/ws")
+http_duration = metrics.HistogramFamily("http_request_duration_us", "Duração dos pedidos HTTP por rota", "route",
+                                        (500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000))
+
+BUSY_RESPONSE = http_parser.response_head(503, "text/plain", 4, False, "Retry-After: 1\r\n").encode() + b"Busy"
+
+def toggle_power():
+    s = state.snapshot
+    if s.menu_state == "BLOQUEADO":
+        unlock_effect()
+    state.update(menu_state="OPERATIONAL" if s.menu_state == "BLOQUEADO" else s.menu_state,
+                 triac_on=not s.triac_on)
+    update_comfort_led()
+
+def apply_settings(percentage=None, comfort_mode=None, thresholds=None,
+                   sensor_resolution=None, sensor_interval_ms=None, probe_source=None,
+                   regulation_mode=None, pid_gains=None):
+    """ Aplica e grava configurações vindas do formulário ou do WebSocket """
+    changes = {}
+    if percentage is not None:
+        changes["percentage"] = max(0, min(100, int(percentage)))
+    if comfort_mode is not None:
+        if comfort_mode not in state.DEFAULT_TEMPERATURE_THRESHOLDS:
+            raise ValueError("modo de conforto inválido: %s" % comfort_mode)
+        changes["comfort_mode"] = comfort_mode
+    if thresholds is not None:
+        # Novo dicionário de limites: o snapshot publicado nunca é alterado no lugar
+        merged = dict(state.online_temperature_thresholds)
+        for mode in thresholds:
+            if mode not in state.DEFAULT_TEMPERATURE_THRESHOLDS:
+                raise ValueError("modo de conforto inválido: %s" % mode)
+            low, high = thresholds[mode]
+            merged[mode] = (float(low), float(high))
+        changes["online_temperature_thresholds"] = merged
+    if sensor_resolution is not None:
+        sensor_resolution = int(sensor_resolution)
+        if sensor_resolution not in (9, 10, 11, 12):
+            raise ValueError("resolução inválida: %s" % sensor_resolution)
+        changes["sensor_resolution"] = sensor_resolution
+    if sensor_interval_ms is not None:
+        changes["sensor_interval_ms"] = max(100, min(600000, int(sensor_interval_ms)))
+    if probe_source is not None:
+        # Um agregado ou o id (16 dígitos hex) de uma sonda, mesmo que ainda não esteja ligada
+        if probe_source not in ("MIN", "MEAN", "MAX") and len(probe_source) != 16:
+            raise ValueError("fonte de temperatura inválida: %s" % probe_source)
+        changes["probe_source"] = probe_source
+    if regulation_mode is not None:
+        if regulation_mode not in ("LINEAR", "PID"):
+            raise ValueError("modo de regulação inválido: %s" % regulation_mode)
+        changes["regulation_mode"] = regulation_mode
+    if pid_gains is not None:
+        merged = dict(state.pid_gains)
+        for mode in pid_gains:
+            if mode not in state.DEFAULT_TEMPERATURE_THRESHOLDS:
+                raise ValueError("modo de conforto inválido: %s" % mode)
+            kp, ki, kd = pid_gains[mode]
+            if min(kp, ki, kd) < 0:
+                raise ValueError("ganhos PID negativos: %s" % mode)
+            merged[mode] = (float(kp), float(ki), float(kd))
+        changes["pid_gains"] = merged
+    if changes:
+        state.update(**changes)
+        if "online_temperature_thresholds" in changes:
+            regulation.rebuild_tables()
+        # A gravação fica para settings_writer(): alterações seguidas juntam-se numa escrita
+        settings.request_save()
+
+def live_state(s):
+    """ Campos enviados ao dashboard pelo WebSocket """
+    return {
+        "temperature": round(s.temperature, 2) if s.temperature is not None else None,
+        "percentage": s.percentage,
+        "effective_percentage": round(calc_effective_percentage(s.percentage, s.temperature, s.comfort_mode), 1),
+        "triac_on": s.triac_on,
+        "comfort_mode": s.comfort_mode,
+        "menu_state": s.menu_state
+    }
+
+def metrics_text():
+    """ Contadores, gauges e histogramas no formato de texto do Prometheus """
+    s = state.snapshot
+    out = []
+    sample = metrics.sample
+    counters = triac_control.counters
+    sample(out, "triac_fires_total", "counter", "Impulsos de gate enviados ao TRIAC", counters[triac_control.FIRES])
+    sample(out, "triac_missed_half_cycles_total", "counter", "Semiciclos com disparo pedido e sem impulso",
+           counters[triac_control.MISSED])
+    sample(out, "triac_late_fires_total", "counter",
+           "Disparos mais de %d us depois do programado" % triac_control.LATE_FIRE_US, counters[triac_control.LATE])
+    sample(out, "triac_table_rescales_total", "counter", "Reconstruções da tabela de atrasos", triac_control.rescales)
+    sample(out, "triac_fire_delay_us", "gauge", "Atraso de disparo programado (0 = sem disparo)", triac_control.fire_delay_us)
+    sample(out, "mains_frequency_hz", "gauge", "Frequência da rede medida", round(zero_cross.frequency_hz(), 3))
+    sample(out, "mains_half_cycles_total", "counter", "Semiciclos medidos", zero_cross.samples)
+    sample(out, "mains_rejected_edges_total", "counter", "Flancos espúrios do detetor", zero_cross.rejected)
+    sample(out, "mains_resyncs_total", "counter", "Intervalos longos entre zero-crossings", zero_cross.resyncs)
+    sample(out, "temperature_celsius", "gauge", "Temperatura usada na regulação", s.temperature)
+    sample(out, "heater_on", "gauge", "Aquecimento ligado", s.triac_on)
+    sample(out, "power_setpoint_percent", "gauge", "Potência pedida", s.percentage)
+    effective = calc_effective_percentage(s.percentage, s.temperature, s.comfort_mode) if s.triac_on else 0
+    sample(out, "power_effective_percent", "gauge", "Potência após a regulação", round(effective, 1))
+    for key in ("accepted", "rejected", "timeouts", "idle_closed"):
+        sample(out, "http_connections_%s_total" % key, "counter", "Ligações HTTP (%s)" % key, stats[key])
+    sample(out, "http_connections_active", "gauge", "Ligações HTTP em curso", stats["active"])
+    sample(out, "wifi_connected", "gauge", "Ligado ao Wi-Fi", state.wifi_status["state"] == "CONNECTED")
+    sample(out, "wifi_connects_total", "counter", "Ligações Wi-Fi estabelecidas", state.wifi_status["connects"])
+    sample(out, "wifi_drops_total", "counter", "Quedas da ligação Wi-Fi", state.wifi_status["drops"])
+    sample(out, "led_writes_total", "counter", "Escritas na barra de LEDs", leds.stats["writes"])
+    sample(out, "settings_writes_total", "counter", "Gravações das configurações na flash", settings.stats["written"])
+    mem = mem_profile.report()
+    sample(out, "heap_free_bytes", "gauge", "Memória livre no heap", mem["free"])
+    sample(out, "heap_alloc_bytes", "gauge", "Memória alocada no heap", mem["alloc"])
+    sample(out, "heap_low_water_free_bytes", "gauge", "Menor memória livre observada", mem["low_water_free"])
+    sample(out, "gc_collections_total", "counter", "Recolhas de lixo agendadas", mem["gc"]["collections"])
+    sample(out, "gc_pause_max_us", "gauge", "Maior pausa de uma recolha agendada", mem["gc"]["max_us"])
+    metrics.header(out, "http_request_alloc_bytes_total", "counter", "Memória alocada pelos pedidos por rota")
+    for route, account in mem_profile.routes.items():
+        sample(out, "http_request_alloc_bytes_total", None, None, account[mem_profile.BYTES], 'route="%s"' % route)
+    metrics.render(out)
+    out.append("")
+    return "\n".join(out)
+
+async def ws_commands(ws, sub):
+    """ Recebe comandos JSON do dashboard: {"cmd": "toggle_power"} ou {"cmd": "set", ...} """
     try:
-        request = await reader.read(1024)
-        request_str = request.decode()
-        headers, _, body = request_str.partition("\r\n\r\n")
-        lines = headers.splitlines()
-        first_line = lines[0] if lines else ""
-        parts = first_line.split(" ")
-        method = parts[0] if len(parts) > 0 else ""
-        path = parts[1] if len(parts) > 1 else "/"
-
-        if method == "GET" and path == "/":
-            with state.lock:
-                base_percentage = state.percentage
-                current_temperature = state.temperature if state.temperature is not None else "N/A"
-                comfort_mode = state.comfort_mode
-                triac_status = state.triac_on
-                effective_percentage = calc_effective_percentage(base_percentage, state.temperature, comfort_mode)
-
-                temperate_low, temperate_high = state.online_temperature_thresholds.get("TEMPERATE", state.DEFAULT_TEMPERATURE_THRESHOLDS["TEMPERATE"])
-                medium_low, medium_high = state.online_temperature_thresholds.get("MEDIUM", state.DEFAULT_TEMPERATURE_THRESHOLDS["MEDIUM"])
-                warm_low, warm_high = state.online_temperature_thresholds.get("WARM", state.DEFAULT_TEMPERATURE_THRESHOLDS["WARM"])
-
-                power_color = "#28a745" if triac_status else "#dc3545"
-                power_status = "Ligado" if triac_status else "Desligado"
-
-            html = f"""
-<html>
-  <head>
-    <meta charset="utf-8">
-    <meta http-equiv="refresh" content="30; url=/" >
-    <title>Halo Heat</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1">
-    <style>
-      body {{
-        background: linear-gradient(to right, #005AA7, #FFFDE4);
-        font-family: 'Segoe UI', sans-serif;
-        margin: 0;
-        padding: 0;
-      }}
-      .container {{
-        max-width: 500px;
-        margin: 40px auto;
-        padding: 30px;
-        background: white;
-        border-radius: 12px;
-        box-shadow: 0 8px 16px rgba(0,0,0,0.15);
-      }}
-      h1 {{
-        text-align: center;
-        color: #005AA7;
-        margin-bottom: 24px;
-      }}
-      .status {{
-        text-align: center;
-        margin-bottom: 20px;
-        font-size: 16px;
-        color: #333;
-      }}
-      .power-status {{
-        text-align: center;
-        font-weight: bold;
-        font-size: 18px;
-        color: {power_color};
-        margin-bottom: 20px;
-      }}
-      .field-group {{
-        margin-bottom: 20px;
-      }}
-      label {{
-        display: block;
-        margin-bottom: 6px;
-        font-weight: bold;
-        color: #444;
-      }}
-      input[type="number"], input[type="range"], select {{
-        width: 100%;
-        padding: 10px;
-        font-size: 16px;
-        border: 1px solid #ccc;
-        border-radius: 6px;
-        box-sizing: border-box;
-      }}
-      button {{
-        width: 100%;
-        padding: 12px;
-        font-size: 18px;
-        background-color: {power_color};
-        color: white;
-        border: none;
-        border-radius: 6px;
-        cursor: pointer;
-        transition: background-color 0.3s ease;
-      }}
-      button:hover {{
-        background-color: #003f7d;
-      }}
-      .button-circle {{
-        font-size: 24px;
-        width: 60px;
-        height: 60px;
-        border-radius: 50%;
-        padding: 10px;
-        margin: 10px auto 30px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        background-color: {power_color};
-        color: white;
-        border: none;
-        cursor: pointer;
-      }}
-    </style>
-  </head>
-  <body>
-    <div class="container">
-      <h1>Halo Heat</h1>
-      <div class="status">
-        <p>Temperatura Atual: {current_temperature} ºC</p>
-        <p>Potência configurada: {base_percentage}%</p>
-        <p>Potência efetiva: {effective_percentage:.1f}%</p>
-        <p>Modo de Conforto: {comfort_mode}</p>
-      </div>
-      <div class="power-status">{power_status}</div>
-      <div style="text-align:center;">
-        <form method="post" action="/toggle_power">
-          <button class="button-circle">⏻</button>
-        </form>
-      </div>
-      <form method="post" action="/update_settings">
-        <div class="field-group">
-          <label for="percentage">Potência Máxima (0–100):</label>
-          <input type="range" id="percentage" name="percentage" min="0" max="100" value="{base_percentage}" oninput="document.getElementById('percValue').innerText = this.value + '%'">
-          <span id="percValue">{base_percentage}%</span>
-        </div>
-        <div class="field-group">
-          <label for="comfort_mode">Modo de Conforto:</label>
-          <select id="comfort_mode" name="comfort_mode">
-            <option value="TEMPERATE" {"selected" if comfort_mode == "TEMPERATE" else ""}>TEMPERATE</option>
-            <option value="MEDIUM" {"selected" if comfort_mode == "MEDIUM" else ""}>MEDIUM</option>
-            <option value="WARM" {"selected" if comfort_mode == "WARM" else ""}>WARM</option>
-          </select>
-        </div>
-        <div class="field-group">
-          <h3>Limites para TEMPERATE</h3>
-          <label>Mínima (ºC):</label><input type="number" name="temperate_min" value="{temperate_low}" step="0.1" min="10" max="35">
-          <label>Máxima (ºC):</label><input type="number" name="temperate_max" value="{temperate_high}" step="0.1" min="10" max="35">
-        </div>
-        <div class="field-group">
-          <h3>Limites para MEDIUM</h3>
-          <label>Mínima (ºC):</label><input type="number" name="medium_min" value="{medium_low}" step="0.1" min="10" max="35">
-          <label>Máxima (ºC):</label><input type="number" name="medium_max" value="{medium_high}" step="0.1" min="10" max="35">
-        </div>
-        <div class="field-group">
-          <h3>Limites para WARM</h3>
-          <label>Mínima (ºC):</label><input type="number" name="warm_min" value="{warm_low}" step="0.1" min="10" max="35">
-          <label>Máxima (ºC):</label><input type="number" name="warm_max" value="{warm_high}" step="0.1" min="10" max="35">
-        </div>
-        <button type="submit">Atualizar Configurações</button>
-      </form>
-    </div>
-  </body>
-</html>
-"""
-
-            response = "HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nConnection: close\r\n\r\n" + html
-
-        elif method == "POST" and path == "/toggle_power":
-            with state.lock:
-                if state.menu_state == "BLOQUEADO":
-                    try:
-                        from button_control import unlock_effect
-                        unlock_effect()
-                    except:
-                        pass
-                    state.menu_state = "OPERATIONAL"
-                state.triac_on = not state.triac_on
-                if not state.triac_on:
-                    np[0] = (2, 0, 0)
-                else:
-                    if state.comfort_mode == "TEMPERATE":
-                        np[0] = (8, 7, 0)
-                    elif state.comfort_mode == "MEDIUM":
-                        np[0] = (15, 4, 0)
-                    elif state.comfort_mode == "WARM":
-                        np[0] = (15, 1, 0)
-                np.write()
-            response = "HTTP/1.1 303 See Other\r\nLocation: /\r\n\r\n"
-
-        elif method == "POST" and path == "/update_settings":
+        while True:
+            msg = await ws.recv()
+            if msg is None:
+                return
             try:
-                params = {}
-                for pair in body.split("&"):
-                    if "=" in pair:
-                        k, v = pair.split("=")
-                        params[k] = v
-
-                with state.lock:
-                    state.percentage = int(params.get("percentage", state.percentage))
-                    state.comfort_mode = params.get("comfort_mode", state.comfort_mode)
-                    state.online_temperature_thresholds["TEMPERATE"] = (float(params["temperate_min"]), float(params["temperate_max"]))
-                    state.online_temperature_thresholds["MEDIUM"] = (float(params["medium_min"]), float(params["medium_max"]))
-                    state.online_temperature_thresholds["WARM"] = (float(params["warm_min"]), float(params["warm_max"]))
-                import settings
-                settings.save_settings(state)
+                cmd = json.loads(msg)
+                if cmd.get("cmd") == "toggle_power":
+                    toggle_power()
+                elif cmd.get("cmd") == "set":
+                    apply_settings(cmd.get("percentage"), cmd.get("comfort_mode"), cmd.get("thresholds"),
+                                   cmd.get("sensor_resolution"), cmd.get("sensor_interval_ms"),
+                                   cmd.get("probe_source"), cmd.get("regulation_mode"), cmd.get("pid_gains"))
+                else:
+                    raise ValueError("comando desconhecido")
             except Exception as e:
-                print("Erro ao atualizar configs:", e)
-
-            response = "HTTP/1.1 303 See Other\r\nLocation: /\r\n\r\n"
-
-        elif method == "GET" and path == "/status":
-            with state.lock:
-                resp_data = {
-                    "triac_on": state.triac_on,
-                    "percentage": state.percentage,
-                    "comfort_mode": state.comfort_mode,
-                    "temperature": state.temperature,
-                    "online_thresholds": state.online_temperature_thresholds
-                }
-            response = "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + json.dumps(resp_data)
-
-        else:
-            response = "HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n\r\nNot Found"
-
-        writer.write(response.encode())
-        await writer.drain()
+                await ws.send(json.dumps({"error": str(e)}))
+    finally:
+        sub.wake()  # socket fechado: ws_session deixa de esperar por eventos
+
+async def ws_session(ws):
+    """ Envia só os campos que mudaram desde a última mensagem enquanto o socket estiver aberto """
+    sub = state.subscribe(WS_EVENTS)
+    rx = asyncio.create_task(ws_commands(ws, sub))
+    sent = {}
+    try:
+        while not ws.closed:
+            delta = {}
+            for k, v in live_state(state.snapshot).items():
+                if k not in sent or sent[k] != v:
+                    delta[k] = sent[k] = v
+            if delta:
+                await ws.send(json.dumps(delta))
+            await sub.wait()
+    finally:
+        state.unsubscribe(sub)
+        rx.cancel()
+
+async def send_response(writer, status, body=b"", content_type="text/plain", keep_alive=True, extra=""):
+    if isinstance(body, str):
+        body = body.encode()
+    writer.write(http_parser.response_head(status, content_type if body else None, len(body), keep_alive, extra).encode())
+    if body:
+        writer.write(body)
+    await asyncio.wait_for_ms(writer.drain(), WRITE_TIMEOUT_MS)
+
+async def handle_request(req, reader, writer, keep_alive):
+    """ Responde a um pedido. Devolve False se a ligação não deve ser reutilizada """
+    method = req.method
+    path = req.path
+
+    if method == "GET" and path == "/":
+        s = state.snapshot  # leitura consistente sem lock
+        comfort_mode = s.comfort_mode
+        triac_status = s.triac_on
+        effective_percentage = calc_effective_percentage(s.percentage, s.temperature, comfort_mode)
+
+        temperate_low, temperate_high = s.online_thresholds.get("TEMPERATE", state.DEFAULT_TEMPERATURE_THRESHOLDS["TEMPERATE"])
+        medium_low, medium_high = s.online_thresholds.get("MEDIUM", state.DEFAULT_TEMPERATURE_THRESHOLDS["MEDIUM"])
+        warm_low, warm_high = s.online_thresholds.get("WARM", state.DEFAULT_TEMPERATURE_THRESHOLDS["WARM"])
+
+        # Só os campos dinâmicos são formatados; o resto da página são segmentos constantes
+        page = template.get(DASHBOARD_FILE)
+        parts, length = page.render_fields({
+            "power_color": "#28a745" if triac_status else "#dc3545",
+            "power_status": "Ligado" if triac_status else "Desligado",
+            "temperature": s.temperature if s.temperature is not None else "N/A",
+            "percentage": s.percentage,
+            "effective_percentage": "%.1f" % effective_percentage,
+            "comfort_mode": comfort_mode,
+            "selected_temperate": "selected" if comfort_mode == "TEMPERATE" else "",
+            "selected_medium": "selected" if comfort_mode == "MEDIUM" else "",
+            "selected_warm": "selected" if comfort_mode == "WARM" else "",
+            "temperate_min": temperate_low,
+            "temperate_max": temperate_high,
+            "medium_min": medium_low,
+            "medium_max": medium_high,
+            "warm_min": warm_low,
+            "warm_max": warm_high
+        })
+        writer.write(http_parser.response_head(200, "text/html; charset=utf-8", length, keep_alive).encode())
+        await asyncio.wait_for_ms(page.write(writer, parts), WRITE_TIMEOUT_MS)
+
+    elif method == "POST" and path == "/toggle_power":
+        toggle_power()
+        await send_response(writer, 303, keep_alive=keep_alive, extra="Location: /\r\n")
+
+    elif method == "POST" and path == "/update_settings":
+        try:
+            params = req.form()
+            # Ganhos PID opcionais no formulário: temperate_kp, temperate_ki, temperate_kd, ...
+            pid_gains = {}
+            for mode in state.DEFAULT_TEMPERATURE_THRESHOLDS:
+                key = mode.lower()
+                if key + "_kp" in params:
+                    pid_gains[mode] = (float(params[key + "_kp"]), float(params.get(key + "_ki", 0)),
+                                       float(params.get(key + "_kd", 0)))
+            apply_settings(
+                percentage=int(params.get("percentage", state.percentage)),
+                comfort_mode=params.get("comfort_mode", state.comfort_mode),
+                thresholds={
+                    "TEMPERATE": (float(params["temperate_min"]), float(params["temperate_max"])),
+                    "MEDIUM": (float(params["medium_min"]), float(params["medium_max"])),
+                    "WARM": (float(params["warm_min"]), float(params["warm_max"]))
+                },
+                sensor_resolution=params.get("sensor_resolution"),
+                sensor_interval_ms=params.get("sensor_interval_ms"),
+                probe_source=params.get("probe_source"),
+                regulation_mode=params.get("regulation_mode"),
+                pid_gains=pid_gains or None)
+        except Exception as e:
+            print("Erro ao atualizar configs:", e)
+
+        await send_response(writer, 303, keep_alive=keep_alive, extra="Location: /\r\n")
+
+    elif method == "GET" and path == "/ws" and req.headers.get("upgrade", "").lower() == "websocket":
+        if stats["ws_active"] >= MAX_WS_SESSIONS:
+            stats["rejected"] += 1
+            await send_response(writer, 503, "Busy", keep_alive=False, extra="Retry-After: 5\r\n")
+            return False
+        await websocket.handshake(writer, req.headers.get("sec-websocket-key", ""))
+        # A sessão é de longa duração: passa a contar em ws_active e liberta a vaga HTTP
+        stats["active"] -= 1
+        stats["ws_active"] += 1
+        try:
+            await ws_session(websocket.WebSocket(reader, writer, WRITE_TIMEOUT_MS, WS_PING_MS))
+        finally:
+            stats["ws_active"] -= 1
+            stats["active"] += 1
+        return False
+
+    elif method == "GET" and path == "/status":
+        s = state.snapshot
+        resp_data = {
+            "triac_on": s.triac_on,
+            "percentage": s.percentage,
+            "comfort_mode": s.comfort_mode,
+            "temperature": s.temperature,
+            "online_thresholds": s.online_thresholds,
+            "regulation": {
+                "mode": s.regulation_mode,
+                "pid_gains": s.pid_gains,
+                "pid_output": s.pid_output
+            },
+            "sensor": {
+                "resolution": state.sensor_resolution,
+                "interval_ms": state.sensor_interval_ms,
+                "probe_source": state.probe_source,
+                "probes": temperature_sensor.probes_status(),
+                "bus_errors": temperature_sensor.stats["bus_errors"],
+                "temperature_ds": state.temperature_ds,
+                "temperature_ir": state.ir_temperature,
+                "temperature_variance": state.temperature_variance,
+                "fusion": fusion.stats()
+            },
+            "mains": zero_cross.stats(),
+            "history": history.stats,
+            "settings": settings.stats,
+            "http": stats,
+            "wifi": state.wifi_status,
+            "leds": leds.stats,
+            "boot": boot_profile.stages()
+        }
+        await send_response(writer, 200, json.dumps(resp_data), "application/json", keep_alive)
+
+    elif method == "GET" and path == "/metrics":
+        await send_response(writer, 200, metrics_text(), metrics.CONTENT_TYPE, keep_alive)
+
+    elif method == "GET" and path == "/debug/mem":
+        # /debug/mem?collect=1 faz uma recolha antes de reportar (e diz quanto libertou)
+        freed = mem_profile.collect() if req.args().get("collect") == "1" else None
+        resp_data = mem_profile.report()
+        resp_data["collected_now"] = freed
+        await send_response(writer, 200, json.dumps(resp_data), "application/json", keep_alive)
+
+    elif method == "GET" and path == "/history":
+        # /history?from=&to=&step= (segundos do relógio do dispositivo); por omissão as últimas 24 h
+        try:
+            args = req.args()
+            t_to = int(args.get("to", utime.time()))
+            t_from = int(args.get("from", t_to - HISTORY_DEFAULT_S))
+            step = int(args.get("step", 0))
+        except ValueError:
+            await send_response(writer, 400, "Bad Request", keep_alive=keep_alive)
+            return keep_alive
+        step, points = await history.query(t_from, t_to, step)
+        resp_data = {
+            "from": t_from,
+            "to": t_to,
+            "step": step,
+            "fields": ["t", "temp_min", "temp_max", "temp_mean", "power_mean", "on_ratio"],
+            "points": points,
+            # False: relógio por acertar, os tempos contam desde 2000 e só há os pontos em RAM
+            "clock_synced": history.stats["clock_synced"]
+        }
+        await send_response(writer, 200, json.dumps(resp_data), "application/json", keep_alive)
+
+    else:
+        await send_response(writer, 404, "Not Found", keep_alive=keep_alive)
+
+    return keep_alive
+
+async def reject_busy(writer):
+    stats["rejected"] += 1
+    try:
+        writer.write(BUSY_RESPONSE)
+        await asyncio.wait_for_ms(writer.drain(), 500)
+    except Exception:
+        pass
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def handle_client(reader, writer):
+    if stats["active"] >= MAX_CONNECTIONS:
+        await reject_busy(writer)
+        return
+    stats["active"] += 1
+    stats["accepted"] += 1
+    reader = http_parser.LineReader(reader)
+    try:
+        # Vários pedidos por ligação (keep-alive); pedidos em pipeline ficam no buffer do LineReader
+        while True:
+            try:
+                req = await http_parser.read_request(reader, IDLE_TIMEOUT_MS, HEADER_TIMEOUT_MS, BODY_TIMEOUT_MS)
+            except http_parser.RequestTimeout as e:
+                # Ligação persistente sem novos pedidos: fecho normal, sem resposta
+                if e.idle:
+                    stats["idle_closed"] += 1
+                else:
+                    stats["timeouts"] += 1
+                    await send_response(writer, 408, "Request Timeout", keep_alive=False)
+                break
+            except http_parser.HTTPError as e:
+                await send_response(writer, e.status, str(e), keep_alive=False)
+                break
+            if req is None:
+                break
+            route = req.path if req.path in ROUTES else "other"
+            mem_start = mem_profile.begin()
+            t0 = utime.ticks_us()
+            keep_alive = await handle_request(req, reader, writer, req.keep_alive())
+            if route != "/ws":
+                http_duration.get(route).observe(utime.ticks_diff(utime.ticks_us(), t0))
+            mem_profile.end(mem_profile.routes, route, mem_start)
+            if not keep_alive:
+                break
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
     except Exception as e:
         print("Erro ao processar request:", e)
     finally:
+        stats["active"] -= 1
+        writer.close()
         await writer.wait_closed()
 
+async def settings_writer():
+    """ Grava as configurações alteradas fora do caminho dos pedidos """
+    while True:
+        await asyncio.sleep_ms(SETTINGS_CHECK_MS)
+        settings.flush_due(state)
+
 async def main_http_server():
+    asyncio.create_task(settings_writer())
     server = await asyncio.start_server(handle_client, "0.0.0.0", 80)
     print("[HTTP] Servidor iniciado na porta 80")
     while True:
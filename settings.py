@@ -1,28 +1,67 @@
 # settings.py
-import json
+import utime
+import config
+import regulation
 
-SETTINGS_FILE = "settings.json"
+# Gravação adiada: várias alterações seguidas (sliders) resultam numa só escrita
+SAVE_DELAY_MS = 3000
+
+_dirty_since = None  # ticks_ms da primeira alteração ainda por gravar
+
+stats = {
+    "requested": 0,   # pedidos de gravação
+    "coalesced": 0,   # juntos a uma gravação já pendente
+    "unchanged": 0,   # conteúdo igual ao do ficheiro: nada escrito
+    "written": 0,     # escritas efetivas na flash
+    "errors": 0
+}
+
+def _values(state):
+    return {k: getattr(state, k) for k in config.SETTINGS_KEYS}
 
 def save_settings(state):
-    settings = {
-        "percentage": state.percentage,
-        "comfort_mode": state.comfort_mode,
-        "online_temperature_thresholds": state.online_temperature_thresholds
-    }
+    """ Grava já na configuração persistente (config.bin), se mudou. Devolve True se escreveu """
+    global _dirty_since
+    _dirty_since = None
     try:
-        with open(SETTINGS_FILE, "w") as f:
-            json.dump(settings, f)
-        print("Configurações salvas com sucesso!")
-    except Exception as e:
+        written = config.save_settings(_values(state))
+    except (OSError, ValueError) as e:
+        stats["errors"] += 1
         print("Erro ao salvar configurações:", e)
+        return False
+    if not written:
+        stats["unchanged"] += 1
+        return False
+    stats["written"] += 1
+    state.publish(state.SETTINGS_SAVED)
+    print("Configurações salvas com sucesso!")
+    return True
+
+def request_save():
+    """ Marca as configurações como alteradas; a gravação fica para flush_due() """
+    global _dirty_since
+    stats["requested"] += 1
+    if _dirty_since is None:
+        _dirty_since = utime.ticks_ms()
+    else:
+        stats["coalesced"] += 1
+
+def flush_due(state, now=None):
+    """ Grava se há alterações pendentes há mais de SAVE_DELAY_MS (chamado fora do caminho dos pedidos) """
+    if _dirty_since is None:
+        return False
+    if now is None:
+        now = utime.ticks_ms()
+    if utime.ticks_diff(now, _dirty_since) < SAVE_DELAY_MS:
+        return False
+    return save_settings(state)
 
 def load_settings(state):
-    try:
-        with open(SETTINGS_FILE, "r") as f:
-            settings = json.load(f)
-        state.percentage = settings.get("percentage", state.percentage)
-        state.comfort_mode = settings.get("comfort_mode", state.comfort_mode)
-        state.online_temperature_thresholds = settings.get("online_temperature_thresholds", state.online_temperature_thresholds)
-        print("Configurações carregadas:", settings)
-    except Exception as e:
-        print("Não foi possível carregar configurações. Usando valores padrão.", e)
+    """ Aplica as configurações da cópia em memória de config (lida uma vez no arranque) """
+    settings = config.load_settings()
+    if settings is None:
+        print("Sem configurações gravadas. Usando valores padrão.")
+        return
+    state.update(**{k: settings.get(k, getattr(state, k)) for k in config.SETTINGS_KEYS})
+    regulation.rebuild_tables()
+    print("Configurações carregadas:", settings)
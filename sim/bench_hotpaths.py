@@ -0,0 +1,330 @@
+# Micro-benchmarks dos caminhos quentes do firmware, com comparação contra uma
+# referência gravada. Corre no host (CPython, sobre os stand-ins de sim/) ou no
+# próprio ESP32, medindo com utime.ticks_us:
+#
+#   python sim/bench_hotpaths.py                 # compara com sim/bench_baseline.json
+#   python sim/bench_hotpaths.py --save          # grava a referência desta plataforma
+#   python sim/bench_hotpaths.py --only http.form --tolerance 0.2
+#
+#   # no dispositivo (copiar este ficheiro para a flash):
+#   >>> import bench_hotpaths; bench_hotpaths.run()
+#
+# Por caso: tempo por operação (us) e memória alocada por operação (bytes). No
+# dispositivo a memória é o aumento de gc.mem_alloc() com o GC desligado (tudo
+# o que foi alocado); no host é o pico do tracemalloc, porque o CPython liberta
+# os objetos de imediato. Os valores só se comparam com a referência da mesma
+# plataforma, e no host o tempo depende da máquina: gravar a referência onde
+# se vai comparar.
+#
+# A comparação de tempo usa `rel`: o tempo do caso dividido pelo de um ciclo
+# de calibração medido logo a seguir, mediana de REPEAT pares. Uma máquina
+# mais lenta ou ocupada atrasa os dois por igual; o que sobra é do código. Um
+# caso acima da tolerância é medido de novo (RETRIES) antes de ser assinalado.
+import sys
+import gc
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+if not MICROPYTHON:
+    import os
+    SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+    ROOT_DIR = os.path.dirname(SIM_DIR)
+    sys.path[:0] = [SIM_DIR, ROOT_DIR]
+    BASELINE_FILE = os.path.join(SIM_DIR, "bench_baseline.json")
+    import tracemalloc
+
+import utime
+import uasyncio as asyncio
+
+TARGET_US = 100000      # duração de cada medição de tempo
+REPEAT = 7              # repetições; us: a mais rápida, rel: a mediana
+ALLOC_CALLS = 20        # chamadas na medição de memória
+RETRIES = 2             # novas medições de um caso lento antes de o assinalar
+CAL_ITEMS = 64
+PLATFORM = "micropython" if MICROPYTHON else "cpython"
+
+# Pergunta DNS típica de deteção de portal cativo (connectivitycheck.gstatic.com, tipo A)
+DNS_QUERY = (b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+             b"\x11connectivitycheck\x07gstatic\x03com\x00\x00\x01\x00\x01")
+
+# Corpo do formulário do dashboard (/update_settings)
+SETTINGS_FORM = ("percentage=80&comfort_mode=MEDIUM&temperate_min=16.0&temperate_max=18.0"
+                 "&medium_min=18.5&medium_max=20.5&warm_min=21.0&warm_max=23.0"
+                 "&sensor_resolution=11&sensor_interval_ms=5000&probe_source=MEAN"
+                 "&regulation_mode=PID&medium_kp=25.0&medium_ki=0.02&medium_kd=0.0"
+                 "&hostname=casa%20de%20banho")
+
+# --- casos: cada um devolve (função, operações por chamada, assíncrona) ---
+
+def _temperatures():
+    return [14 + i * 0.37 for i in range(40)]  # abaixo, dentro e acima das faixas
+
+def case_regulation():
+    import state
+    import regulation
+    state.update(operating_mode="ONLINE", regulation_mode="LINEAR")
+    regulation.rebuild_tables()
+    calc = regulation.calc_effective_percentage
+    modes = ("TEMPERATE", "MEDIUM", "WARM")
+    args = [(t, modes[i % 3]) for i, t in enumerate(_temperatures())]
+
+    def call():
+        for t, mode in args:
+            calc(80, t, mode)
+    return call, len(args), False
+
+def case_triac_delay():
+    import state
+    import triac_control
+    state.update(menu_state="OPERATIONAL", triac_on=True, percentage=80)
+    snaps = []
+    for t in _temperatures():
+        state.update(temperature=t)
+        snaps.append(state.snapshot)
+    read_delay = triac_control.read_delay
+
+    def call():
+        for s in snaps:
+            read_delay(s)
+    return call, len(snaps), False
+
+class _NullWriter:
+    """ Socket que descarta o que recebe (só conta os bytes) """
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+
+    async def drain(self):
+        pass
+
+def case_dashboard():
+    import state
+    import http_parser
+    import server
+    state.update(temperature=19.25)
+    req = http_parser.Request("GET", "/", "", "HTTP/1.1", {}, b"")
+    writer = _NullWriter()
+
+    async def call():
+        await server.handle_request(req, None, writer, True)
+    return call, 1, True
+
+def case_form():
+    import http_parser
+    parse_form = http_parser.parse_form
+
+    def call():
+        parse_form(SETTINGS_FORM)
+    return call, 1, False
+
+def case_dns():
+    import wifi_manager
+    ip = bytes((10, 0, 0, 1))
+    dns_response = wifi_manager.dns_response
+
+    def call():
+        dns_response(DNS_QUERY, ip)
+    return call, 1, False
+
+def case_dns_captive_portal():
+    import captive_portal
+    DNSQuery = captive_portal.DNSQuery
+
+    def call():
+        DNSQuery(DNS_QUERY).response("10.0.0.1")
+    return call, 1, False
+
+CASES = (
+    ("regulation.calc", case_regulation),            # regulation.calc_effective_percentage
+    ("triac.read_delay", case_triac_delay),          # atraso de disparo a partir de um snapshot
+    ("server.get_dashboard", case_dashboard),        # GET / completo (template + cabeçalhos)
+    ("http.form", case_form),                        # corpo do /update_settings
+    ("dns.response", case_dns),                      # portal do wifi_manager
+    ("dns.captive_portal", case_dns_captive_portal)  # DNSQuery do captive_portal.py (antigo)
+)
+
+def calibration():
+    """ Ciclo de referência para `rel`: dicionário, strings e aritmética, como os casos """
+    keys = ["k%d" % i for i in range(CAL_ITEMS)]
+
+    def call():
+        d = {}
+        for i, k in enumerate(keys):
+            d[k] = i * 3 + 1
+        total = 0
+        for k in keys:
+            total += d[k]
+        return total
+    return call
+
+# --- medição ---
+
+async def _calls(fn, is_async, n):
+    if is_async:
+        for _ in range(n):
+            await fn()
+    else:
+        for _ in range(n):
+            fn()
+
+async def _time_us(fn, is_async, n):
+    t0 = utime.ticks_us()
+    await _calls(fn, is_async, n)
+    return utime.ticks_diff(utime.ticks_us(), t0)
+
+async def _alloc_bytes(fn, is_async):
+    if MICROPYTHON:
+        gc.collect()
+        gc.disable()
+        try:
+            a0 = gc.mem_alloc()
+            await _calls(fn, is_async, ALLOC_CALLS)
+            return (gc.mem_alloc() - a0) / ALLOC_CALLS
+        finally:
+            gc.enable()
+    tracemalloc.start()
+    try:
+        await _calls(fn, is_async, 1)
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await _calls(fn, is_async, 1)
+        return max(0, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+async def _calls_for_target(fn, is_async):
+    """ Número de chamadas para uma medição durar ~TARGET_US """
+    await _calls(fn, is_async, 3)  # aquecimento (caches, templates, tabelas)
+    n = 1
+    while True:
+        dt = await _time_us(fn, is_async, n)
+        if dt >= TARGET_US // 10 or n >= 1000000:
+            break
+        n *= 4
+    return max(1, int(n * TARGET_US / max(dt, 1)))
+
+async def _measure(fn, ops, is_async, cal):
+    n = await _calls_for_target(fn, is_async)
+    n_cal = await _calls_for_target(cal, False)
+    best = None
+    ratios = []
+    for _ in range(REPEAT):
+        dt = await _time_us(fn, is_async, n)
+        dt_cal = await _time_us(cal, False, n_cal)
+        if best is None or dt < best:
+            best = dt
+        ratios.append(dt * n_cal / max(dt_cal * n, 1))
+    ratios.sort()
+    alloc = await _alloc_bytes(fn, is_async)
+    return {"us": best / (n * ops), "rel": ratios[len(ratios) // 2] / ops, "bytes": alloc / ops}
+
+async def _run_all(names):
+    results = {}
+    cal = calibration()
+    for name, setup in CASES:
+        if names and name not in names:
+            continue
+        fn, ops, is_async = setup()
+        results[name] = await _measure(fn, ops, is_async, cal)
+        gc.collect()
+    return results
+
+def run(names=None):
+    """ Corre os casos (todos, ou os de `names`) e mostra-os; devolve {nome: {"us", "rel", "bytes"}} """
+    results = asyncio.run(_run_all(names))
+    print("%-22s %12s %10s %12s" % ("caso", "us/op", "rel", "bytes/op"))
+    for name in results:
+        r = results[name]
+        print("%-22s %12.3f %10.4f %12.1f" % (name, r["us"], r["rel"], r["bytes"]))
+    return results
+
+# --- referência (host) ---
+
+def time_ratio(result, ref):
+    """ Tempo atual / referência: por `rel` se a referência o tiver, senão em us """
+    if ref.get("rel"):
+        return result["rel"] / ref["rel"]
+    return result["us"] / ref["us"] if ref["us"] else 1.0
+
+def compare(results, baseline, tolerance, mem_tolerance):
+    """ Linhas de comparação e número de regressões face à referência """
+    regressions = 0
+    lines = []
+    for name, r in results.items():
+        ref = baseline.get(name)
+        if ref is None:
+            lines.append(f"{name:<22} {'(sem referência)':>40}")
+            continue
+        ratio = time_ratio(r, ref)
+        extra_bytes = r["bytes"] - ref["bytes"]
+        # Memória: tolera ruído de poucas dezenas de bytes (alinhamento, caches internas)
+        slow = ratio > 1 + tolerance
+        heavier = extra_bytes > max(32, ref["bytes"] * mem_tolerance)
+        flag = "REGRESSÃO" if slow or heavier else "ok"
+        regressions += slow or heavier
+        lines.append(f"{name:<22} {ref['us']:10.3f} -> {r['us']:<10.3f} {ratio:5.2f}x "
+                     f"{ref['bytes']:8.1f} -> {r['bytes']:<8.1f} {flag}")
+    return lines, regressions
+
+def main():
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos quentes do firmware")
+    parser.add_argument("--only", action="append", help="corre só este caso (repetível)")
+    parser.add_argument("--save", action="store_true", help="grava os resultados como referência")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    # O tempo no host varia com a carga da máquina; a memória alocada é determinística
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="aumento relativo do tempo (rel) aceite antes de assinalar regressão")
+    parser.add_argument("--mem-tolerance", type=float, default=0.1,
+                        help="aumento relativo da memória alocada aceite")
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)  # dashboard.html é lido do diretório atual, como no dispositivo
+    results = run(args.only)
+
+    try:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    except OSError:
+        stored = {}
+    if args.save:
+        stored.setdefault(PLATFORM, {}).update(
+            {name: {"us": round(r["us"], 4), "rel": round(r["rel"], 5), "bytes": round(r["bytes"], 1)}
+             for name, r in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("Referência gravada em", args.baseline)
+        return 0
+
+    baseline = stored.get(PLATFORM)
+    if not baseline:
+        print("Sem referência para", PLATFORM, "- gravar com --save")
+        return 0
+    # Uma rajada de carga na máquina pode atrasar um caso inteiro: antes de o
+    # assinalar, mede-o de novo e fica a melhor das medições
+    for _ in range(RETRIES):
+        slow = [name for name, r in results.items()
+                if name in baseline and time_ratio(r, baseline[name]) > 1 + args.tolerance]
+        if not slow:
+            break
+        print("A medir de novo:", ", ".join(slow))
+        again = asyncio.run(_run_all(slow))
+        for name, r in again.items():
+            if time_ratio(r, baseline[name]) < time_ratio(results[name], baseline[name]):
+                results[name] = r
+    print()
+    print(f"{'caso':<22} {'us/op (ref -> atual)':>28} {'bytes/op (ref -> atual)':>26}")
+    lines, regressions = compare(results, baseline, args.tolerance, args.mem_tolerance)
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"\n{regressions} regressão(ões) acima da tolerância")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# Mede pedidos por segundo do servidor HTTP do dashboard no host, com e sem
+# keep-alive, e com pedidos em pipeline numa única ligação.
+#
+#   python sim/bench_http.py --requests 500 --path /status
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+sys.path[:0] = [SIM_DIR, ROOT_DIR]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return head.split(b" ", 2)[1]
+
+
+def request_bytes(path, keep_alive):
+    conn = "keep-alive" if keep_alive else "close"
+    return f"GET {path} HTTP/1.1\r\nHost: halo\r\nConnection: {conn}\r\n\r\n".encode()
+
+
+async def run_close(port, path, n):
+    req = request_bytes(path, False)
+    for _ in range(n):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(req)
+        await read_response(reader)
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run_keep_alive(port, path, n):
+    req = request_bytes(path, True)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(n):
+        writer.write(req)
+        await read_response(reader)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_pipelined(port, path, n, depth=8):
+    req = request_bytes(path, True)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    done = 0
+    while done < n:
+        batch = min(depth, n - done)
+        writer.write(req * batch)
+        for _ in range(batch):
+            await read_response(reader)
+        done += batch
+    writer.close()
+    await writer.wait_closed()
+
+
+async def main(args):
+    os.chdir(ROOT_DIR)  # dashboard.html é lido do diretório atual, como no dispositivo
+    import server
+    srv = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+
+    print(f"{'modo':>12} {'pedidos':>8} {'req/s':>10}")
+    for name, fn in (("close", run_close), ("keep-alive", run_keep_alive), ("pipeline", run_pipelined)):
+        t0 = time.perf_counter()
+        await fn(port, args.path, args.requests)
+        dt = time.perf_counter() - t0
+        print(f"{name:>12} {args.requests:>8} {args.requests / dt:>10.0f}")
+    await asyncio.sleep(0.1)  # deixa os handlers fecharem as últimas ligações
+    srv.close()
+    await srv.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pedidos/s do servidor HTTP com e sem keep-alive")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--path", default="/status")
+    asyncio.run(main(parser.parse_args()))
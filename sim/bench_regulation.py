@@ -0,0 +1,68 @@
+# Mede no host o custo por chamada de calc_effective_percentage: a versão
+# anterior (limites lidos do snapshot e divisão em vírgula flutuante a cada
+# chamada) contra as tabelas compiladas por modo de conforto.
+#
+#   python sim/bench_regulation.py --calls 200000
+import argparse
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+sys.path[:0] = [SIM_DIR, ROOT_DIR]
+
+import state
+import regulation
+
+
+def legacy_calc(base_percentage, temperature, comfort_mode):
+    """ calc_effective_percentage antes das tabelas compiladas (referência) """
+    if temperature is None:
+        return base_percentage
+    s = state.snapshot
+    if s.regulation_mode == "PID" and s.pid_output is not None:
+        return min(base_percentage, s.pid_output)
+    low, high = s.thresholds(comfort_mode)
+    if temperature <= low:
+        return base_percentage
+    elif temperature >= high:
+        return 0
+    else:
+        factor = 1 - ((temperature - low) / (high - low))
+        return base_percentage * factor
+
+
+def per_call_ns(fn, temps, calls):
+    modes = ("TEMPERATE", "MEDIUM", "WARM")
+    n = len(temps)
+    start = time.perf_counter_ns()
+    for i in range(calls):
+        fn(80, temps[i % n], modes[i % 3])
+    return (time.perf_counter_ns() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por chamada da regulação linear")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--mode", choices=("STANDALONE", "ONLINE"), default="ONLINE")
+    args = parser.parse_args()
+
+    state.update(operating_mode=args.mode)
+    regulation.rebuild_tables()
+    temps = [14 + i * 0.013 for i in range(1200)]  # 14 a 29,6 ºC: abaixo, dentro e acima das faixas
+
+    # As duas versões têm de concordar (a nova arredonda à % inteira e ao centésimo de ºC)
+    worst = max(abs(regulation.calc_effective_percentage(80, t, m) - legacy_calc(80, t, m))
+                for t in temps for m in ("TEMPERATE", "MEDIUM", "WARM"))
+
+    results = [("anterior (float)", per_call_ns(legacy_calc, temps, args.calls)),
+               ("tabelas (inteiros)", per_call_ns(regulation.calc_effective_percentage, temps, args.calls))]
+    for name, ns in results:
+        print(f"{name:>20}: {ns:8.1f} ns/chamada")
+    print(f"{'ganho':>20}: {results[0][1] / results[1][1]:8.2f}x")
+    print(f"{'diferença máxima':>20}: {worst:8.2f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Mede no host o custo de CPU e a precisão de disparo do triac_control.
+#
+#   python sim/bench_triac.py                 # compara IRQ e POLL
+#   python sim/bench_triac.py --mode IRQ --hz 60 --percentage 30
+#
+# Cada modo corre num processo separado (o controlo nunca termina).
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+
+
+def _percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_mode(mode, seconds, hz, percentage):
+    sys.path[:0] = [SIM_DIR, ROOT_DIR]
+    # O intervalo por omissão do GIL (5 ms) esconde impulsos de 400 us à espera ativa
+    sys.setswitchinterval(0.00005)
+    import _thread
+    import state
+    state.update(temperature=None, menu_state="OPERATIONAL", triac_on=True, percentage=percentage)
+
+    import triac_control
+    from mains import ZeroCrossSource
+    triac_control.TRIAC_MODE = mode
+
+    fires = []
+    triac_control.triac_trigger_pin.sim_watch(lambda pin, v, t: v and fires.append(t))
+    source = ZeroCrossSource(triac_control.zero_cross_pin, hz=hz)
+    source.start()
+    if mode == "IRQ":
+        # No firmware control_task() corre no ciclo uasyncio principal; aqui tem um ciclo próprio
+        import uasyncio as asyncio
+        ident = _thread.start_new_thread(asyncio.run, (triac_control.control_task(),))
+    else:
+        ident = _thread.start_new_thread(triac_control.triac_control_thread, ())
+    thread_clock = time.pthread_getcpuclockid(ident)
+
+    time.sleep(0.5)  # aquecimento
+    expected = triac_control.read_delay() + (10 if mode == "POLL" else 0)
+    n_edges, n_fires = len(source.edges), len(fires)
+    cpu0, tcpu0, wall0 = time.process_time(), time.clock_gettime(thread_clock), time.perf_counter()
+    time.sleep(seconds)
+    cpu1, tcpu1, wall1 = time.process_time(), time.clock_gettime(thread_clock), time.perf_counter()
+    edges = source.edges[n_edges:]
+    window_fires = fires[n_fires:]
+
+    errors = []
+    i = 0
+    for f in window_fires:
+        while i + 1 < len(edges) and edges[i + 1] <= f:
+            i += 1
+        if edges and edges[i] <= f:
+            errors.append(f - edges[i] - expected)
+    wall = wall1 - wall0
+    import zero_cross
+    mains = zero_cross.stats()
+    abs_errors = [abs(e) for e in errors]
+    return {
+        "mode": mode,
+        "half_cycles": len(edges),
+        "fires": len(window_fires),
+        "missed": max(0, len(edges) - len(window_fires)),
+        "mains_hz": float(mains["hz"]),
+        "zc_jitter_us": float(mains["jitter_us"] or 0),
+        "delay_us": expected,
+        "err_mean_us": sum(errors) / len(errors) if errors else 0,
+        "err_p50_us": _percentile(abs_errors, 50),
+        "err_p99_us": _percentile(abs_errors, 99),
+        "err_max_us": max(abs_errors) if abs_errors else 0,
+        "cpu_process_pct": 100 * (cpu1 - cpu0) / wall,
+        "cpu_control_thread_pct": 100 * (tcpu1 - tcpu0) / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo de CPU e precisão de disparo do TRIAC")
+    parser.add_argument("--mode", choices=("IRQ", "POLL", "both"), default="both")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--hz", type=float, default=50)
+    parser.add_argument("--percentage", type=int, default=50)
+    parser.add_argument("--raw", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode != "both":
+        result = run_mode(args.mode, args.seconds, args.hz, args.percentage)
+        if args.raw:
+            print(repr(result))
+        else:
+            for k, v in result.items():
+                print(f"{k:>24}: {v:.1f}" if isinstance(v, float) else f"{k:>24}: {v}")
+        os._exit(0)
+
+    results = []
+    for mode in ("IRQ", "POLL"):
+        cmd = [sys.executable, __file__, "--mode", mode, "--seconds", str(args.seconds),
+               "--hz", str(args.hz), "--percentage", str(args.percentage), "--raw"]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(ast.literal_eval(out.strip().splitlines()[-1]))
+
+    keys = list(results[0])
+    print(f"{'':>24}" + "".join(f"{r['mode']:>12}" for r in results))
+    for k in keys[1:]:
+        row = f"{k:>24}"
+        for r in results:
+            v = r[k]
+            row += f"{v:>12.1f}" if isinstance(v, float) else f"{v:>12}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Placa simulada: liga os stand-ins do MicroPython (machine, network, onewire,
+# ds18x20, neopixel, uasyncio) a uma rede elétrica virtual, ao modelo térmico
+# da divisão e às sondas, e arranca o firmware (main.py) em CPython.
+#
+#   board = Board(hz=50, time_scale=60)
+#   board.boot()            # main.main() num thread, com a "flash" num diretório temporário
+#   board.unlock()          # pressão longa no botão
+#   board.http_get("/status")
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+for _path in (ROOT_DIR, SIM_DIR):
+    if _path in sys.path:
+        sys.path.remove(_path)
+sys.path[:0] = [SIM_DIR, ROOT_DIR]  # stand-ins primeiro
+
+import machine  # noqa: E402
+import network  # noqa: E402
+import onewire  # noqa: E402
+import ds18x20  # noqa: E402
+import uasyncio  # noqa: E402
+from mains import ZeroCrossSource  # noqa: E402
+from mlx90614 import SimMLX90614, ADDRESS as MLX_ADDRESS  # noqa: E402
+from room import Room  # noqa: E402
+
+# Ligações do firmware (triac_control, temperature_sensor, button)
+ZERO_CROSS_PIN = 27
+TRIAC_PIN = 14
+DS18B20_PIN = 25
+BUTTON_PIN = 26
+I2C_BUS = 0
+
+FLASH_FILES = ("dashboard.html",)  # ficheiros de dados que o firmware lê do diretório atual
+
+
+class Board:
+    def __init__(self, hz=50, outdoor=10.0, initial=None, time_scale=60.0, probes=2, noise=0.05,
+                 wifi=True, ssid="halo-sim", password="halo-sim", http_port=8080, flash_dir=None,
+                 conversion_scale=1.0):
+        self.room = Room(outdoor, initial, time_scale=time_scale, half_period_us=1000000 / (2 * hz))
+        self.zero_cross = ZeroCrossSource(machine.Pin(ZERO_CROSS_PIN), hz=hz)
+        self.room.attach(machine.Pin(ZERO_CROSS_PIN), machine.Pin(TRIAC_PIN))
+
+        bus = onewire.OneWire(machine.Pin(DS18B20_PIN))
+        self.probes = []
+        for serial in range(1, probes + 1):
+            probe = ds18x20.SimDS18B20(serial, self.room.temperature, noise)
+            bus.sim_attach(probe)
+            self.probes.append(probe)
+        self.ir = SimMLX90614(self.room.temperature, offset=0.2, noise=2 * noise)
+        machine.I2C(I2C_BUS).sim_attach(MLX_ADDRESS, self.ir)
+
+        self.wifi = wifi
+        self.ssid = ssid
+        self.password = password
+        network.sim_add_network(ssid, password)
+        self.http_port = http_port
+        uasyncio.PORT_MAP[80] = http_port
+
+        self.flash_dir = flash_dir or tempfile.mkdtemp(prefix="halo-flash-")
+        self.thread = None
+        self.error = None
+        # Divide o tempo de conversão do DS18B20 (sonda simulada e tabela do
+        # firmware): com o tempo acelerado, o intervalo entre amostras pode
+        # descer na mesma proporção sem ficar preso à conversão real
+        self.conversion_scale = conversion_scale
+
+    def _scale_conversion(self):
+        import temperature_sensor
+        for bits, (config, ms) in list(temperature_sensor.RESOLUTIONS.items()):
+            temperature_sensor.RESOLUTIONS[bits] = (config, max(1, int(ms / self.conversion_scale)))
+        for config, ms in list(ds18x20.CONVERSION_MS.items()):
+            ds18x20.CONVERSION_MS[config] = max(1, int(ms / self.conversion_scale))
+
+    def boot(self):
+        """ Arranca o firmware num thread (main.main() nunca termina) """
+        for name in FLASH_FILES:
+            target = os.path.join(self.flash_dir, name)
+            if not os.path.exists(target):
+                shutil.copy(os.path.join(ROOT_DIR, name), target)
+        os.chdir(self.flash_dir)
+        if self.wifi:
+            import config
+            if config.load_wifi_config() is None:
+                config.save_wifi_config(self.ssid, self.password, "halo-sim")
+        self.zero_cross.start()
+        import main
+        if self.conversion_scale != 1:
+            self._scale_conversion()  # antes de o thread do sensor criar o driver
+        self.thread = threading.Thread(target=self._run, args=(main,), daemon=True)
+        self.thread.start()
+
+    def _run(self, main):
+        try:
+            main.main()
+        except machine.SimulatedReset:
+            print("[SIM] machine.reset()")
+        except BaseException as e:
+            self.error = e
+            raise
+
+    # --- estímulos ---
+
+    def press(self, ms):
+        """ Pressiona o botão durante `ms` (sem bloquear quem chama) """
+        pin = machine.Pin(BUTTON_PIN)
+
+        def run():
+            pin.sim_drive(1)
+            time.sleep(ms / 1000)
+            pin.sim_drive(0)
+        threading.Thread(target=run, daemon=True).start()
+
+    def unlock(self):
+        """ Pressão longa: desbloqueia o aquecimento depois do arranque """
+        import button
+        self.press(button.LONG_MS + 200)
+
+    def drop_wifi(self):
+        network.WLAN(network.STA_IF).sim_drop()
+
+    def http_request(self, method, path, form=None, timeout=5):
+        """ Pedido ao servidor do firmware pelo loopback; devolve (código, corpo) """
+        conn = http.client.HTTPConnection("127.0.0.1", self.http_port, timeout=timeout)
+        try:
+            body = None
+            headers = {}
+            if form is not None:
+                body = urllib.parse.urlencode(form)
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            conn.request(method, path, body, headers)
+            resp = conn.getresponse()
+            return resp.status, resp.read()
+        finally:
+            conn.close()
+
+    def http_get(self, path, timeout=5):
+        return self.http_request("GET", path, timeout=timeout)
@@ -0,0 +1,91 @@
+# Stand-in do módulo `ds18x20` do MicroPython e sonda DS18B20 simulada.
+# A sonda tem scratchpad real (resolução, CRC, valor de reset de 85 ºC) e lê a
+# temperatura de uma função, tipicamente o modelo térmico do simulador.
+import random
+import time
+
+from onewire import OneWire
+
+
+class DS18X20:
+    # Como o driver do micropython-lib, cada transação começa com reset(True):
+    # num barramento sem dispositivos levanta onewire.OneWireError
+    def __init__(self, onewire):
+        self.ow = onewire
+
+    def scan(self):
+        return [rom for rom in self.ow.scan() if rom[0] in (0x10, 0x22, 0x28)]
+
+    def convert_temp(self):
+        self.ow.reset(True)
+        for dev in self.ow.devices.values():
+            dev.convert()
+
+    def read_scratch(self, rom):
+        self.ow.reset(True)
+        dev = self.ow.devices.get(bytes(rom))
+        # Sonda ausente: o barramento lê 0xFF e o CRC falha, como no dispositivo
+        buf = dev.scratchpad() if dev is not None else bytearray(b"\xff" * 9)
+        if OneWire.crc8(buf):
+            raise Exception("CRC error")
+        return buf
+
+    def write_scratch(self, rom, buf):
+        self.ow.reset(True)
+        dev = self.ow.devices.get(bytes(rom))
+        if dev is not None:
+            dev.write(buf)
+
+    def read_temp(self, rom):
+        buf = self.read_scratch(rom)
+        t = buf[1] << 8 | buf[0]
+        if t & 0x8000:
+            t -= 0x10000
+        return t / 16
+
+
+# --- extensões do simulador ---
+
+CONVERSION_MS = {0x1F: 94, 0x3F: 188, 0x5F: 375, 0x7F: 750}
+
+
+def make_rom(serial):
+    rom = bytearray(8)
+    rom[0] = 0x28
+    rom[1:7] = serial.to_bytes(6, "little")
+    rom[7] = OneWire.crc8(rom[:7])
+    return bytes(rom)
+
+
+class SimDS18B20:
+    def __init__(self, serial, temperature, noise=0.0):
+        self.rom = make_rom(serial)
+        self.temperature = temperature  # função sem argumentos -> ºC
+        self.noise = noise
+        self.th, self.tl, self.config = 0x4B, 0x46, 0x7F
+        self.raw = 0x0550                # 85 ºC até à primeira conversão
+        self._converted_at = None
+        self._pending = None
+
+    def convert(self):
+        t = self.temperature() + random.gauss(0, self.noise) if self.noise else self.temperature()
+        self._pending = int(round(t * 16)) & 0xFFFF
+        self._converted_at = time.monotonic()
+
+    def _resolve(self):
+        # O resultado só fica no scratchpad depois do tempo de conversão da resolução atual
+        if self._pending is None:
+            return
+        if time.monotonic() - self._converted_at >= CONVERSION_MS[self.config] / 1000:
+            bits = {0x1F: 9, 0x3F: 10, 0x5F: 11, 0x7F: 12}[self.config]
+            self.raw = self._pending & ~((1 << (12 - bits)) - 1) & 0xFFFF
+            self._pending = None
+
+    def scratchpad(self):
+        self._resolve()
+        buf = bytearray((self.raw & 0xFF, self.raw >> 8, self.th, self.tl, self.config, 0xFF, 0x0C, 0x10, 0))
+        buf[8] = OneWire.crc8(buf[:8])
+        return buf
+
+    def write(self, buf):
+        self.th, self.tl, self.config = buf[0], buf[1], buf[2]
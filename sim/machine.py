@@ -0,0 +1,181 @@
+# Stand-in do módulo `machine` do MicroPython para correr o firmware em CPython.
+# Só implementa o necessário ao firmware; os métodos `sim_*` são extensões do
+# simulador (não existem no dispositivo) para injetar sinais e observar saídas.
+import threading
+import time
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    # Estado por número de pino: Pin(27) criado em dois módulos é o mesmo pino físico
+    _levels = {}
+    _handlers = {}
+    _watchers = {}
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self.id = pin_id
+        self.mode = mode
+        if pin_id not in Pin._levels:
+            # Entrada com pull-up fica a 1 em repouso (ex.: botão BOOT)
+            Pin._levels[pin_id] = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            Pin._levels[pin_id] = 1 if value else 0
+
+    def __repr__(self):
+        return "Pin(%s)" % self.id
+
+    def value(self, v=None):
+        if v is None:
+            return Pin._levels[self.id]
+        self.sim_drive(v)
+
+    def on(self):
+        self.sim_drive(1)
+
+    def off(self):
+        self.sim_drive(0)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        if handler is None:
+            Pin._handlers.pop(self.id, None)
+        else:
+            Pin._handlers[self.id] = (handler, trigger)
+
+    # --- extensões do simulador ---
+
+    def sim_drive(self, v):
+        """ Muda o nível do pino, chamando a IRQ e os observadores no thread atual """
+        v = 1 if v else 0
+        old = Pin._levels[self.id]
+        Pin._levels[self.id] = v
+        if old == v:
+            return
+        for cb in Pin._watchers.get(self.id, ()):
+            cb(self, v, _now_us())
+        entry = Pin._handlers.get(self.id)
+        if entry:
+            handler, trigger = entry
+            if (v and trigger & Pin.IRQ_RISING) or (not v and trigger & Pin.IRQ_FALLING):
+                handler(self)
+
+    def sim_watch(self, callback):
+        """ Regista callback(pin, value, t_us) chamado em cada mudança de nível """
+        Pin._watchers.setdefault(self.id, []).append(callback)
+
+    @classmethod
+    def sim_reset(cls):
+        cls._levels.clear()
+        cls._handlers.clear()
+        cls._watchers.clear()
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, timer_id=-1, **kwargs):
+        self.id = timer_id
+        self._cond = threading.Condition()
+        self._deadline = None
+        self._period_s = 0
+        self._mode = Timer.ONE_SHOT
+        self._callback = None
+        self._thread = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        if freq is not None and freq > 0:
+            period_s = 1 / freq
+        else:
+            period_s = period / 1000
+        with self._cond:
+            self._mode = mode
+            self._period_s = period_s
+            self._callback = callback
+            self._deadline = time.perf_counter() + period_s
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def deinit(self):
+        with self._cond:
+            self._deadline = None
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._deadline is None:
+                    self._cond.wait()
+                remaining = self._deadline - time.perf_counter()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                callback = self._callback
+                if self._mode == Timer.PERIODIC:
+                    self._deadline += self._period_s
+                else:
+                    self._deadline = None
+            if callback:
+                callback(self)
+
+
+class I2C:
+    _buses = {}  # bus_id -> {endereço: dispositivo}; o mesmo id é o mesmo barramento
+
+    def __init__(self, bus_id, scl=None, sda=None, freq=400000):
+        self.bus_id = bus_id
+        self._devices = I2C._buses.setdefault(bus_id, {})
+
+    def scan(self):
+        return sorted(self._devices)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        dev = self._devices.get(addr)
+        if dev is None:
+            raise OSError(19)  # ENODEV
+        return dev.readfrom_mem(memaddr, nbytes)
+
+    # --- extensões do simulador ---
+
+    def sim_attach(self, addr, device):
+        self._devices[addr] = device
+
+    def sim_detach(self, addr):
+        self._devices.pop(addr, None)
+
+    @classmethod
+    def sim_reset(cls):
+        cls._buses.clear()
+
+
+class SimulatedReset(SystemExit):
+    pass
+
+
+def reset():
+    raise SimulatedReset()
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def unique_id():
+    return b"\x24\x0a\xc4\x00\x00\x01"
@@ -0,0 +1,44 @@
+# Fonte virtual de zero-crossing: gera o impulso do detetor no pino do ESP32.
+# O flanco descendente (fim do impulso) é a referência usada pelo firmware.
+import threading
+import time
+
+
+class ZeroCrossSource:
+    def __init__(self, pin, hz=50, pulse_us=400):
+        self.pin = pin
+        self.hz = hz
+        self.pulse_us = pulse_us
+        self.edges = []          # instantes (us, perf_counter) dos flancos descendentes
+        self._running = False
+        self._thread = None
+
+    @property
+    def half_period_us(self):
+        return 1000000 / (2 * self.hz)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+
+    def _sleep_until(self, t_ns):
+        remaining = t_ns - time.perf_counter_ns()
+        if remaining > 0:
+            time.sleep(remaining / 1e9)
+
+    def _run(self):
+        next_edge = time.perf_counter_ns() + int(self.half_period_us * 1000)
+        while self._running:
+            self._sleep_until(next_edge - self.pulse_us * 1000)
+            self.pin.sim_drive(1)
+            self._sleep_until(next_edge)
+            self.edges.append(time.perf_counter_ns() // 1000)
+            self.pin.sim_drive(0)
+            # Recalcula a cada ciclo para acompanhar mudanças de `hz` durante a simulação
+            next_edge += int(self.half_period_us * 1000)
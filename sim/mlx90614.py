@@ -0,0 +1,49 @@
+# Termómetro de infravermelhos MLX90614 (GY-906) simulado, para ligar a um
+# machine.I2C do simulador com `i2c.sim_attach(ADDRESS, SimMLX90614(...))`.
+#
+# Registos RAM lidos pelo firmware: 0x06 (Ta, ambiente do sensor) e 0x07
+# (Tobj1, objeto visado), em unidades de 0.02 K. Cada leitura devolve LSB,
+# MSB e PEC (CRC-8 SMBus), como o dispositivo real.
+import random
+
+ADDRESS = 0x5A
+REG_TA = 0x06
+REG_TOBJ1 = 0x07
+REG_TOBJ2 = 0x08
+
+
+def pec(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class SimMLX90614:
+    def __init__(self, temperature, ambient=None, offset=0.0, noise=0.0, address=ADDRESS):
+        self.temperature = temperature      # função sem argumentos -> ºC do objeto
+        self.ambient = ambient or temperature
+        self.offset = offset                # erro sistemático (emissividade, campo de visão)
+        self.noise = noise
+        self.address = address
+        self.reads = 0
+
+    def _raw(self, celsius):
+        return max(0, min(0x7FFF, int(round((celsius + 273.15) / 0.02))))
+
+    def readfrom_mem(self, memaddr, nbytes):
+        self.reads += 1
+        if memaddr == REG_TA:
+            t = self.ambient()
+        elif memaddr in (REG_TOBJ1, REG_TOBJ2):
+            t = self.temperature() + self.offset
+            if self.noise:
+                t += random.gauss(0, self.noise)
+        else:
+            raise OSError(5)  # EIO: registo não implementado
+        raw = self._raw(t)
+        data = bytes((raw & 0xFF, raw >> 8))
+        crc = pec(bytes((self.address << 1, memaddr, self.address << 1 | 1)) + data)
+        return (data + bytes((crc,)))[:nbytes]
@@ -0,0 +1,28 @@
+# Stand-in do módulo `neopixel` do MicroPython: guarda as cores e conta as escritas.
+
+
+class NeoPixel:
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.buf = [(0,) * bpp for _ in range(n)]
+        self.shown = list(self.buf)
+        self.writes = 0
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, value):
+        self.buf[index] = tuple(value)
+
+    def __getitem__(self, index):
+        return self.buf[index]
+
+    def fill(self, value):
+        for i in range(self.n):
+            self.buf[i] = tuple(value)
+
+    def write(self):
+        self.shown = list(self.buf)
+        self.writes += 1
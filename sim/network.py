@@ -0,0 +1,122 @@
+# Stand-in do módulo `network` do MicroPython sobre a interface de loopback.
+# As redes visíveis são registadas com `sim_add_network`; uma ligação bem
+# sucedida demora `CONNECT_DELAY_S` e fica com o IP 127.0.0.1, pelo que os
+# servidores do firmware ficam acessíveis no host (com as portas de
+# uasyncio.PORT_MAP). `sim_drop` simula a perda de sinal.
+import time
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_WRONG_PASSWORD = 202
+STAT_NO_AP_FOUND = 201
+STAT_GOT_IP = 1010
+
+CONNECT_DELAY_S = 1.5
+LOOPBACK = ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
+
+_networks = {}  # ssid -> password
+
+
+class WLAN:
+    _interfaces = {}  # uma instância por interface, como no dispositivo
+
+    def __new__(cls, interface_id=STA_IF):
+        wlan = cls._interfaces.get(interface_id)
+        if wlan is None:
+            wlan = super().__new__(cls)
+            wlan._init(interface_id)
+            cls._interfaces[interface_id] = wlan
+        return wlan
+
+    def _init(self, interface_id):
+        self.interface_id = interface_id
+        self._active = False
+        self._config = {"essid": "", "password": "", "dhcp_hostname": "esp32",
+                        "mac": b"\x24\x0a\xc4\x00\x00\x01"}
+        self._ifconfig = ("0.0.0.0",) * 4
+        self._status = STAT_IDLE
+        self._ssid = None
+        self._up_at = None
+        self.connects = 0
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if self._active and self.interface_id == AP_IF:
+            self._ifconfig = LOOPBACK
+        if not self._active:
+            self.disconnect()
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config[args[0]]
+        self._config.update(kwargs)
+
+    def ifconfig(self, config=None):
+        if config is None:
+            return self._ifconfig
+        self._ifconfig = tuple(config)
+
+    def connect(self, ssid, password=None):
+        if not self._active:
+            raise OSError("Wifi Not Started")
+        self.connects += 1
+        self._ssid = ssid
+        self._up_at = None
+        if ssid not in _networks:
+            self._status = STAT_NO_AP_FOUND
+        elif _networks[ssid] != password:
+            self._status = STAT_WRONG_PASSWORD
+        else:
+            self._status = STAT_CONNECTING
+            self._up_at = time.monotonic() + CONNECT_DELAY_S
+
+    def disconnect(self):
+        self._status = STAT_IDLE
+        self._up_at = None
+        if self.interface_id == STA_IF:
+            self._ifconfig = ("0.0.0.0",) * 4
+
+    def status(self, param=None):
+        if self._status == STAT_CONNECTING and time.monotonic() >= self._up_at:
+            if self._ssid in _networks:
+                self._status = STAT_GOT_IP
+                self._ifconfig = LOOPBACK
+            else:
+                self._status = STAT_NO_AP_FOUND
+        return self._status
+
+    def isconnected(self):
+        if self.interface_id == AP_IF:
+            return self._active
+        return self.status() == STAT_GOT_IP
+
+    def scan(self):
+        return [(ssid.encode(), b"\x00" * 6, 6, -50, 3, False) for ssid in _networks]
+
+    # --- extensões do simulador ---
+
+    def sim_drop(self):
+        """ Perda de ligação (o firmware vê isconnected() a False) """
+        self.disconnect()
+
+
+def sim_add_network(ssid, password):
+    _networks[ssid] = password
+
+
+def sim_remove_network(ssid):
+    """ A rede desaparece: quem estava ligado a ela perde a ligação """
+    _networks.pop(ssid, None)
+    for wlan in WLAN._interfaces.values():
+        if wlan._ssid == ssid:
+            wlan.sim_drop()
+
+
+def sim_reset():
+    _networks.clear()
+    WLAN._interfaces.clear()
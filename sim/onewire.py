@@ -0,0 +1,47 @@
+# Stand-in do módulo `onewire` do MicroPython: barramento virtual por pino, ao
+# qual se ligam dispositivos simulados com `sim_attach`/`sim_detach`.
+
+
+class OneWireError(Exception):
+    pass
+
+
+class OneWire:
+    _buses = {}  # pin.id -> {rom: dispositivo}; o mesmo pino é o mesmo barramento
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.devices = OneWire._buses.setdefault(pin.id, {})
+
+    def scan(self):
+        return [bytearray(rom) for rom in self.devices]
+
+    def reset(self, required=False):
+        present = bool(self.devices)
+        if required and not present:
+            raise OneWireError
+        return present
+
+    @staticmethod
+    def crc8(data):
+        crc = 0
+        for byte in data:
+            for _ in range(8):
+                mix = (crc ^ byte) & 1
+                crc >>= 1
+                if mix:
+                    crc ^= 0x8C
+                byte >>= 1
+        return crc
+
+    # --- extensões do simulador ---
+
+    def sim_attach(self, device):
+        self.devices[bytes(device.rom)] = device
+
+    def sim_detach(self, device):
+        self.devices.pop(bytes(device.rom), None)
+
+    @classmethod
+    def sim_reset(cls):
+        cls._buses.clear()
@@ -0,0 +1,95 @@
+# Modelo térmico de uma divisão aquecida pela carga do TRIAC.
+#
+# Um só nó térmico (ar + superfícies) com capacidade C e perdas UA para o
+# exterior à temperatura `outdoor`:
+#
+#   C dT/dt = P_max * duty - UA * (T - outdoor)
+#
+# `duty` é a fração de potência entregue, medida nos próprios pinos: em cada
+# semiciclo (entre flancos do zero-crossing), o atraso do impulso de gate dá o
+# ângulo de disparo e phase_table.power_fraction() a potência; semiciclos sem
+# disparo contam 0. Entre duas consultas a potência média é constante, e a
+# solução exata (exponencial) mantém o modelo estável com qualquer passo.
+#
+# `time_scale` acelera o tempo do modelo face ao relógio real (60 = um minuto
+# de divisão por segundo), para ver a regulação em segundos de simulação.
+import math
+import threading
+import time
+
+import phase_table
+
+
+class Room:
+    def __init__(self, outdoor=10.0, initial=None, heater_w=2000.0, ua_w_per_k=60.0,
+                 capacity_j_per_k=180000.0, time_scale=1.0, half_period_us=10000):
+        self.outdoor = outdoor
+        self.heater_w = heater_w
+        self.ua = ua_w_per_k
+        self.capacity = capacity_j_per_k
+        self.time_scale = time_scale
+        self.half_period_us = half_period_us
+        self._t = outdoor if initial is None else initial
+        self._lock = threading.Lock()
+        self._last = time.perf_counter()
+        self._sim_s = 0.0
+        self._zc_us = None
+        self._fraction = 0.0      # potência do semiciclo em curso
+        self._energy = 0.0        # soma das frações dos semiciclos fechados
+        self._half_cycles = 0
+        self.duty = 0.0           # potência média no último intervalo
+        self.fires = 0
+
+    @property
+    def tau_s(self):
+        return self.capacity / self.ua
+
+    def attach(self, zero_cross_pin, triac_pin):
+        """ Mede a potência entregue a partir dos pinos do detetor e do gate """
+        zero_cross_pin.sim_watch(self._on_zero_cross)
+        triac_pin.sim_watch(self._on_gate)
+
+    def _on_zero_cross(self, pin, value, t_us):
+        if value:
+            return  # a referência é o flanco descendente, como no firmware
+        with self._lock:
+            if self._zc_us is not None:
+                self.half_period_us = t_us - self._zc_us
+                self._energy += self._fraction
+                self._half_cycles += 1
+            self._zc_us = t_us
+            self._fraction = 0.0
+
+    def _on_gate(self, pin, value, t_us):
+        if not value or self._zc_us is None:
+            return
+        with self._lock:
+            # Um TRIAC disparado conduz até ao zero seguinte: conta o primeiro impulso
+            if self._fraction == 0.0:
+                alpha = math.pi * min(1.0, (t_us - self._zc_us) / self.half_period_us)
+                self._fraction = phase_table.power_fraction(alpha)
+                self.fires += 1
+
+    def _advance(self):
+        now = time.perf_counter()
+        dt = (now - self._last) * self.time_scale
+        self._last = now
+        if self._half_cycles:
+            self.duty = self._energy / self._half_cycles
+        else:
+            self.duty = 0.0
+        self._energy = 0.0
+        self._half_cycles = 0
+        target = self.outdoor + self.heater_w * self.duty / self.ua
+        self._t = target + (self._t - target) * math.exp(-dt / self.tau_s)
+        self._sim_s += dt
+
+    def temperature(self):
+        with self._lock:
+            self._advance()
+            return self._t
+
+    @property
+    def sim_seconds(self):
+        """ Tempo decorrido no modelo (s), desde a criação """
+        return self._sim_s
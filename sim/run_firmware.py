@@ -0,0 +1,108 @@
+# Arranca o firmware completo no host, sobre a placa simulada (board.py), e
+# mostra a evolução da divisão e da regulação.
+#
+#   python sim/run_firmware.py --seconds 30 --time-scale 30
+#   python sim/run_firmware.py --hz 60 --outdoor 5 --no-wifi
+#
+# Com o tempo acelerado, o intervalo entre amostras de temperatura e o tempo
+# de conversão do DS18B20 são reduzidos na mesma proporção, para que cada
+# amostra cubra o mesmo tempo de modelo que no dispositivo e a divisão não mude
+# mais entre amostras: a fusão rejeitaria os saltos como outliers. Os restantes
+# prazos do firmware correm em tempo real.
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from board import Board  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Firmware completo sobre hardware simulado")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--time-scale", type=float, default=30, help="segundos de modelo por segundo real")
+    parser.add_argument("--hz", type=float, default=50)
+    parser.add_argument("--outdoor", type=float, default=10.0)
+    parser.add_argument("--initial", type=float, default=None, help="temperatura inicial da divisão")
+    parser.add_argument("--percentage", type=int, default=100, help="potência pedida pelo dashboard")
+    parser.add_argument("--comfort", choices=("TEMPERATE", "MEDIUM", "WARM"), default="MEDIUM")
+    parser.add_argument("--regulation", choices=("LINEAR", "PID"), default="LINEAR")
+    parser.add_argument("--report", type=float, default=2, help="intervalo entre linhas (s)")
+    parser.add_argument("--port", type=int, default=8080, help="porta do host para a porta 80 do firmware")
+    parser.add_argument("--no-wifi", action="store_true", help="sem rede configurada (portal em AP)")
+    parser.add_argument("--trace-mem", action="store_true",
+                        help="gc.mem_alloc() a partir do tracemalloc (mais lento; sem isto o heap parece vazio)")
+    args = parser.parse_args()
+    if args.trace_mem:
+        import tracemalloc
+        tracemalloc.start()
+
+    board = Board(hz=args.hz, outdoor=args.outdoor, initial=args.initial, time_scale=args.time_scale,
+                  wifi=not args.no_wifi, http_port=args.port, conversion_scale=args.time_scale)
+    print("[SIM] flash em", board.flash_dir)
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    board.boot()
+    time.sleep(0.5)
+    board.unlock()
+
+    import state
+    import leds
+    import temperature_sensor
+    from regulation import calc_effective_percentage
+
+    conversion_ms = temperature_sensor.RESOLUTIONS[state.sensor_resolution][1]
+    interval_ms = max(conversion_ms, int(state.sensor_interval_ms / args.time_scale))
+
+    # Configuração pelo formulário do dashboard, como um utilizador; sem rede, diretamente no estado
+    deadline = time.perf_counter() + 10
+    while not args.no_wifi and state.wifi_status["state"] != "CONNECTED" and time.perf_counter() < deadline:
+        time.sleep(0.1)
+    time.sleep(0.2)  # servidor arranca logo a seguir à ligação
+    if state.wifi_status["state"] == "CONNECTED":
+        form = {"percentage": args.percentage, "comfort_mode": args.comfort, "regulation_mode": args.regulation,
+                "sensor_interval_ms": interval_ms}
+        for mode, (low, high) in state.online_temperature_thresholds.items():
+            form[mode.lower() + "_min"] = low
+            form[mode.lower() + "_max"] = high
+        code, _ = board.http_request("POST", "/update_settings", form)
+        print("[SIM] POST /update_settings ->", code)
+    else:
+        state.update(percentage=args.percentage, comfort_mode=args.comfort, regulation_mode=args.regulation,
+                     sensor_interval_ms=interval_ms)
+
+    print(f"{'t (s)':>6} {'modelo':>7} {'divisão':>8} {'firmware':>9} {'efetiva':>8} {'entregue':>9}  estado")
+    next_report = time.perf_counter()
+    end = wall0 + args.seconds
+    while time.perf_counter() < end and board.thread.is_alive():
+        now = time.perf_counter()
+        if now >= next_report:
+            next_report += args.report
+            s = state.snapshot
+            room_t = board.room.temperature()
+            effective = calc_effective_percentage(s.percentage, s.temperature, s.comfort_mode) if s.triac_on else 0
+            fw_t = f"{s.temperature:.2f}" if s.temperature is not None else "-"
+            print(f"{now - wall0:6.1f} {board.room.sim_seconds / 60:6.1f}m {room_t:8.2f} {fw_t:>9} "
+                  f"{effective:7.1f}% {100 * board.room.duty:8.1f}%  "
+                  f"{s.menu_state}/{s.operating_mode}/{state.wifi_status['state']}")
+        time.sleep(0.05)
+
+    wall = time.perf_counter() - wall0
+    cpu = time.process_time() - cpu0
+    print()
+    print(f"[SIM] CPU do processo: {100 * cpu / wall:.1f}%  semiciclos: {len(board.zero_cross.edges)}  "
+          f"disparos: {board.room.fires}  escritas LED: {leds.stats['writes']}")
+    if board.error is not None:
+        print("[SIM] firmware terminou com erro:", repr(board.error))
+    if state.wifi_status["state"] == "CONNECTED":
+        t0 = time.perf_counter()
+        code, body = board.http_get("/status")
+        dt = (time.perf_counter() - t0) * 1000
+        status = json.loads(body) if code == 200 else {}
+        print(f"[SIM] GET /status -> {code} em {dt:.1f} ms; sondas: {len(status['sensor']['probes'])}")
+    os._exit(0)  # os threads do firmware nunca terminam
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Stand-in do `uasyncio` do MicroPython sobre o asyncio do CPython.
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+from asyncio import StreamWriter, sleep, wait_for
+
+
+async def sleep_ms(ms):
+    await sleep(ms / 1000)
+
+
+def wait_for_ms(aw, timeout):
+    return wait_for(aw, timeout / 1000)
+
+
+# Portas do dispositivo remapeadas no host (a 80 exige privilégios); ver network.py
+PORT_MAP = {}
+
+
+async def start_server(callback, host, port, backlog=5):
+    return await _asyncio.start_server(callback, host, PORT_MAP.get(port, port), backlog=backlog)
+
+
+async def _awrite(self, buf, off=0, sz=-1):
+    if isinstance(buf, str):
+        buf = buf.encode()
+    if sz == -1:
+        sz = len(buf) - off
+    self.write(buf[off:off + sz])
+    await self.drain()
+
+
+async def _aclose(self):
+    self.close()
+    try:
+        await self.wait_closed()
+    except OSError:
+        pass
+
+
+# Métodos dos streams do uasyncio que não existem no asyncio
+StreamWriter.awrite = _awrite
+StreamWriter.aclose = _aclose
+
+__version__ = (3, 0, 0)
+
+
+class ThreadSafeFlag:
+    """ Como o ThreadSafeFlag do uasyncio: set() pode vir de uma IRQ (aqui, de outro thread) """
+
+    def __init__(self):
+        self._loop = None
+        self._event = None
+        self._pending = False
+
+    def set(self):
+        if self._loop is None:
+            self._pending = True
+        else:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self):
+        if self._event is not None:
+            self._event.clear()
+        self._pending = False
+
+    async def wait(self):
+        if self._event is None:
+            self._loop = get_running_loop()
+            self._event = Event()
+            if self._pending:
+                self._event.set()
+        await self._event.wait()
+        self._event.clear()
@@ -0,0 +1,90 @@
+# Stand-in do módulo `utime` do MicroPython (ticks com a mesma aritmética modular).
+# Como no dispositivo, os ticks contam a partir do "reset" (import deste módulo).
+import gc
+import time as _time
+import tracemalloc
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+_EPOCH_NS = _time.perf_counter_ns()
+
+
+def ticks_us():
+    return ((_time.perf_counter_ns() - _EPOCH_NS) // 1000) & _TICKS_MAX
+
+
+def ticks_ms():
+    return ((_time.perf_counter_ns() - _EPOCH_NS) // 1000000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep(seconds):
+    _time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    if ms > 0:
+        _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    if us > 0:
+        _time.sleep(us / 1000000)
+
+
+def time():
+    return int(_time.time())
+
+
+def localtime(secs=None):
+    return _time.localtime(secs)[:8]
+
+
+# --- extensões do `gc` do MicroPython ---
+# Todos os módulos do firmware importam `utime` antes de consultar a memória
+# (boot_profile, mem_profile), por isso o `gc` do CPython é completado aqui.
+# Sem tracemalloc ativo o heap parece vazio; com ele, a memória alocada é a
+# rastreada pelo CPython, várias vezes maior do que no dispositivo (objetos
+# maiores): servem as diferenças, não os absolutos.
+
+HEAP_BYTES = 110000  # heap típico de um ESP32 sem PSRAM
+TRACED_HEAP_BYTES = 64 * 1024 * 1024  # heap aparente com tracemalloc ativo
+_gc_threshold = -1
+
+
+def _mem_alloc():
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return 0
+
+
+def _mem_free():
+    if tracemalloc.is_tracing():
+        return max(0, TRACED_HEAP_BYTES - _mem_alloc())
+    return HEAP_BYTES
+
+
+def _threshold(amount=None):
+    global _gc_threshold
+    if amount is None:
+        return _gc_threshold
+    _gc_threshold = amount
+
+
+if not hasattr(gc, "mem_free"):
+    gc.mem_alloc = _mem_alloc
+    gc.mem_free = _mem_free
+    gc.threshold = _threshold
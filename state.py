@@ -1,5 +1,6 @@
 import _thread
-lock = _thread.allocate_lock()
+import uasyncio as asyncio
+lock = _thread.allocate_lock()  # serializa apenas os escritores (ver update())
 
 operating_mode = "STANDALONE"      # ou "ONLINE"
 menu_state = "BLOQUEADO"         # "OPERATIONAL", "MENU_AJUSTE", "MENU_TRIAC", "MENU_CONFORTO"
@@ -8,8 +9,13 @@ percentage = 0
 triac_on = True
 triac_click_count = 0
 comfort_mode = "TEMPERATE"         # "TEMPERATE", "MEDIUM", "WARM"
+temperature = None
+temperature_variance = None        # variância (ºC²) da estimativa fundida (ver fusion.py)
 temperature_ds = None
 ir_temperature = None
+sensor_resolution = 12             # bits do DS18B20: 9, 10, 11 ou 12 (94 a 750 ms por conversão)
+sensor_interval_ms = 5000          # intervalo entre leituras de temperatura
+probe_source = "MEAN"              # sondas DS18B20 usadas na regulação: "MIN", "MEAN", "MAX" ou id (hex) de uma sonda
 # Limites padrão (para standalone)
 DEFAULT_TEMPERATURE_THRESHOLDS = {
     "TEMPERATE": (16, 18),
@@ -18,8 +24,169 @@ DEFAULT_TEMPERATURE_THRESHOLDS = {
 }
 
 # Limites para uso no modo ONLINE (modificáveis via API)
+# Nunca alterar o dicionário no lugar: publicar um novo com update()
 online_temperature_thresholds = {
     "TEMPERATE": (16, 18),
     "MEDIUM": (18, 20),
     "WARM": (20, 22)
 }
+
+# Estado da ligação Wi-Fi (ver wifi_manager.py); só o wifi_manager escreve, fora do snapshot
+wifi_status = {
+    "state": "IDLE",
+    "ip": None,
+    "attempts": 0,     # tentativas de ligação
+    "connects": 0,     # ligações bem sucedidas
+    "drops": 0         # quedas de uma ligação estabelecida
+}
+
+# Regulação: "LINEAR" (rampa entre os limites, por omissão) ou "PID" (ver regulation.py)
+regulation_mode = "LINEAR"
+pid_output = None                  # última saída do PID em %, atualizada a cada amostra de temperatura
+
+# Ganhos PID por modo de conforto: (kp %/ºC, ki %/(ºC.s), kd %.s/ºC); mesma regra dos limites
+DEFAULT_PID_GAINS = (25.0, 0.02, 0.0)
+pid_gains = {
+    "TEMPERATE": DEFAULT_PID_GAINS,
+    "MEDIUM": DEFAULT_PID_GAINS,
+    "WARM": DEFAULT_PID_GAINS
+}
+
+class Snapshot:
+    """
+    Cópia imutável (por convenção) do estado partilhado. Os leitores usam a
+    referência atual em `state.snapshot` sem lock; cada update() publica uma
+    nova instância com `version` incrementada.
+    """
+    __slots__ = ("version", "operating_mode", "menu_state", "percentage", "triac_on",
+                 "comfort_mode", "temperature", "online_thresholds", "regulation_mode",
+                 "pid_gains", "pid_output")
+
+    def __init__(self, version):
+        self.version = version
+        self.operating_mode = operating_mode
+        self.menu_state = menu_state
+        self.percentage = percentage
+        self.triac_on = triac_on
+        self.comfort_mode = comfort_mode
+        self.temperature = temperature
+        self.online_thresholds = online_temperature_thresholds
+        self.regulation_mode = regulation_mode
+        self.pid_gains = pid_gains
+        self.pid_output = pid_output
+
+    def thresholds(self, mode):
+        """ Limites (low, high) em vigor para o modo de conforto dado """
+        if self.operating_mode == "ONLINE":
+            return self.online_thresholds.get(mode, (16, 18))
+        return DEFAULT_TEMPERATURE_THRESHOLDS.get(mode, (16, 18))
+
+snapshot = Snapshot(0)
+
+# Eventos de alteração de estado (bits, combináveis numa máscara)
+MODE_CHANGED = 0x01          # operating_mode, menu_state, comfort_mode
+POWER_CHANGED = 0x02         # triac_on, percentage
+TEMPERATURE_UPDATED = 0x04   # nova estimativa de temperatura / saída do PID
+SETTINGS_CHANGED = 0x08      # limites, ganhos, modo de regulação, sensores
+SETTINGS_SAVED = 0x10        # configurações gravadas na flash (publicado por settings.py)
+ALL_EVENTS = 0x1F
+WOKEN = 0x8000               # não é publicado: só Subscription.wake() o entrega
+
+_FIELD_EVENTS = {
+    "operating_mode": MODE_CHANGED,
+    "menu_state": MODE_CHANGED,
+    "comfort_mode": MODE_CHANGED,
+    "triac_on": POWER_CHANGED,
+    "percentage": POWER_CHANGED,
+    "temperature": TEMPERATURE_UPDATED,
+    "temperature_variance": TEMPERATURE_UPDATED,
+    "temperature_ds": TEMPERATURE_UPDATED,
+    "ir_temperature": TEMPERATURE_UPDATED,
+    "pid_output": TEMPERATURE_UPDATED,
+    "last_menu_time": 0,
+    "triac_click_count": 0
+}
+
+class Subscription:
+    """
+    Consumidor do barramento de eventos. Os eventos ainda não lidos ficam
+    acumulados numa máscara (`pending`): um consumidor lento recebe as
+    alterações juntas, nunca uma fila a crescer, e lê o estado em `snapshot`.
+    """
+    __slots__ = ("mask", "pending", "flag")
+
+    def __init__(self, mask):
+        self.mask = mask
+        self.pending = 0
+        self.flag = asyncio.ThreadSafeFlag()
+
+    def poll(self):
+        """ Eventos pendentes (0 se nenhum), sem esperar """
+        with lock:
+            events = self.pending
+            self.pending = 0
+        return events
+
+    async def wait(self):
+        """
+        Espera pelo próximo conjunto de eventos (para tarefas uasyncio). Depois
+        de wake() devolve WOKEN (com os eventos que houver): o consumidor deve
+        rever as suas condições de saída.
+        """
+        while True:
+            events = self.poll()
+            if events:
+                return events
+            await self.flag.wait()
+
+    def wake(self):
+        """ Acorda wait() sem evento (por exemplo, para o consumidor terminar) """
+        with lock:
+            self.pending |= WOKEN
+        self.flag.set()
+
+_subscribers = []
+
+def subscribe(mask=ALL_EVENTS):
+    sub = Subscription(mask)
+    with lock:
+        _subscribers.append(sub)
+    return sub
+
+def unsubscribe(sub):
+    with lock:
+        if sub in _subscribers:
+            _subscribers.remove(sub)
+
+def _notify(events):
+    # Chamado com `lock` adquirido; sem alocações, pode vir de qualquer thread
+    for sub in _subscribers:
+        hit = events & sub.mask
+        if hit:
+            sub.pending |= hit
+            sub.flag.set()
+
+def publish(events):
+    """ Publica eventos que não resultam de update() (por exemplo, SETTINGS_SAVED) """
+    with lock:
+        _notify(events)
+
+def update(**changes):
+    """
+    Altera variáveis de estado, publica um novo snapshot numa única atribuição
+    e notifica os subscritores dos eventos correspondentes.
+    Não chamar com `lock` adquirido.
+    """
+    global snapshot
+    with lock:
+        g = globals()
+        events = 0
+        for name in changes:
+            if name not in g:
+                raise AttributeError(name)
+            if g[name] != changes[name]:
+                events |= _FIELD_EVENTS.get(name, SETTINGS_CHANGED)
+            g[name] = changes[name]
+        snapshot = Snapshot(snapshot.version + 1)
+        if events:
+            _notify(events)
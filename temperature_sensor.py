@@ -1,7 +1,31 @@
 import utime
+import binascii
+from array import array
 import ds18x20, onewire
 from machine import Pin, I2C
 import state
+import fusion
+import history
+import regulation
+import metrics
+import mem_profile
+
+# Resolução do DS18B20: bits -> (byte de configuração, tempo máximo de conversão em ms)
+RESOLUTIONS = {
+    9: (0x1F, 94),
+    10: (0x3F, 188),
+    11: (0x5F, 375),
+    12: (0x7F, 750)
+}
+MIN_SLEEP_MS = 10
+
+# Várias sondas no mesmo barramento (chão, ar, retorno): uma conversão em broadcast por ciclo
+ROM_CACHE_FILE = "ds_roms.bin"  # ROMs conhecidas (8 bytes cada): o arranque dispensa o scan
+RESCAN_INTERVAL_MS = 60000      # novo scan periódico para detetar sondas ligadas/desligadas
+MAX_FAILURES = 3                # leituras falhadas seguidas até a sonda sair do agregado
+RING_SIZE = 8
+POWER_ON_RAW = 0x0550           # 85 ºC: valor de reset, a conversão não chegou a correr
+PROBE_SOURCES = ("MIN", "MEAN", "MAX")  # ou o id (hex) de uma sonda
 
 def read_ir_temperature(i2c):
     try:
@@ -11,47 +35,268 @@ def read_ir_temperature(i2c):
     except:
         return None
 
+class Probe:
+    """ Uma sonda DS18B20 com as últimas leituras em centésimos de grau """
+    __slots__ = ("rom", "id", "ring", "index", "count", "failures", "last")
+
+    def __init__(self, rom):
+        self.rom = rom
+        self.id = binascii.hexlify(rom).decode()
+        self.ring = array('h', [0] * RING_SIZE)
+        self.index = 0
+        self.count = 0
+        self.failures = 0
+        self.last = None
+
+    def add(self, temp):
+        self.ring[self.index] = int(temp * 100)
+        self.index = (self.index + 1) % RING_SIZE
+        if self.count < RING_SIZE:
+            self.count += 1
+        self.failures = 0
+        self.last = temp
+
+    def fail(self):
+        self.failures += 1
+        if self.failures >= MAX_FAILURES:
+            self.last = None
+
+    def mean(self):
+        if not self.count:
+            return None
+        return sum(self.ring[i] for i in range(self.count)) / (100 * self.count)
+
+    def status(self):
+        return {"id": self.id, "temperature": self.last, "mean": self.mean(), "failures": self.failures}
+
+def load_rom_cache():
+    try:
+        with open(ROM_CACHE_FILE, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    return [bytes(data[i:i + 8]) for i in range(0, len(data) - 7, 8)]
+
+def save_rom_cache(roms):
+    try:
+        with open(ROM_CACHE_FILE, "wb") as f:
+            for rom in roms:
+                f.write(rom)
+    except OSError as e:
+        print("[TEMP] Erro a gravar cache de ROMs:", e)
+
+def aggregate(probes, source):
+    """ Temperatura que alimenta a regulação, segundo state.probe_source """
+    values = [p.last for p in probes if p.last is not None]
+    if not values:
+        return None
+    if source == "MIN":
+        return min(values)
+    if source == "MAX":
+        return max(values)
+    if source == "MEAN":
+        return sum(values) / len(values)
+    for p in probes:
+        if p.id == source:
+            return p.last
+    return sum(values) / len(values)  # sonda escolhida ausente: usa a média
+
+probes = []  # sondas atuais, lidas também pelo /status
+stats = {"bus_errors": 0}  # falhas do barramento 1-Wire (conversão ou scan)
+
+def probes_status():
+    return [p.status() for p in probes]
+
+def rescan(ds_sensor, driver):
+    """ Atualiza a lista de sondas mantendo o histórico das que continuam presentes """
+    global probes
+    roms = [bytes(r) for r in ds_sensor.scan()]
+    known = {p.rom: p for p in probes}
+    changed = len(roms) != len(probes) or any(r not in known for r in roms)
+    probes = [known.get(r) or Probe(r) for r in roms]
+    driver.roms = roms
+    if changed:
+        print("[TEMP] Sondas DS18B20:", [p.id for p in probes])
+        driver.set_resolution(driver.resolution)
+        save_rom_cache(roms)
+
+class DS18B20Driver:
+    """
+    Conversão não bloqueante: start() dispara a conversão e regista o instante,
+    ready() diz quando o resultado pode ser lido, read() recolhe-o. Entre as
+    duas chamadas o thread fica livre para outras leituras. ready() só conta o
+    tempo, sem falar com o barramento; uma falha no start() fica contada em
+    stats e o ciclo termina sem leituras DS (`converted` False), voltando a
+    tentar no intervalo seguinte.
+    """
+    def __init__(self, sensor, roms, resolution=12):
+        self.sensor = sensor
+        self.roms = roms
+        self.resolution = None
+        self.conversion_ms = RESOLUTIONS[12][1]
+        self.started = None  # ticks_ms do início da conversão em curso
+        self.converted = False  # a conversão em curso foi aceite pelo barramento
+        self.set_resolution(resolution)
+
+    def set_resolution(self, bits):
+        config, conversion_ms = RESOLUTIONS[bits]
+        for rom in self.roms:
+            try:
+                scratch = self.sensor.read_scratch(rom)
+                # TH e TL mantêm-se; só muda o registo de configuração
+                self.sensor.write_scratch(rom, bytearray((scratch[2], scratch[3], config)))
+            except Exception as e:
+                print("[TEMP] Sonda sem resposta ao configurar resolução:", e)
+        self.resolution = bits
+        self.conversion_ms = conversion_ms
+
+    def start(self, now):
+        # Sem sondas não há conversão (o reset num barramento vazio levanta
+        # OneWireError), mas o ciclo corre na mesma para o IR ser fundido
+        self.started = now
+        self.converted = False
+        if not self.roms:
+            return
+        try:
+            self.sensor.convert_temp()
+            self.converted = True
+        except (onewire.OneWireError, OSError) as e:
+            stats["bus_errors"] += 1
+            print("[TEMP] Erro 1-Wire ao iniciar conversão:", e)
+
+    @property
+    def busy(self):
+        return self.started is not None
+
+    def due_in(self, now):
+        """ ms até o resultado da conversão em curso estar disponível """
+        return self.conversion_ms - utime.ticks_diff(now, self.started)
+
+    def ready(self, now):
+        return self.busy and self.due_in(now) <= 0
+
+    def read(self, rom):
+        """ Temperatura (ºC) de uma sonda, ignorando os bits indefinidos abaixo da resolução """
+        scratch = self.sensor.read_scratch(rom)
+        raw = scratch[1] << 8 | scratch[0]
+        if raw == POWER_ON_RAW:
+            raise ValueError("conversão não efetuada")
+        if raw & 0x8000:
+            raw -= 0x10000
+        raw &= ~((1 << (12 - self.resolution)) - 1)
+        return raw / 16
+
+    def finish(self):
+        self.started = None
+        self.converted = False
+
 def temperature_thread():
-    # DS18B20
+    global probes
+    # DS18B20: ROMs da cache evitam o scan no arranque; o scan periódico trata do resto
     ds_pin = Pin(25)  # pino de dados
     ow = onewire.OneWire(ds_pin)
     ds_sensor = ds18x20.DS18X20(ow)
-    roms = ds_sensor.scan()
-
-    if not roms:
-        print("DS18B20 não encontrado!")
+    roms = load_rom_cache()
+    if roms:
+        print("DS18B20 da cache:", roms)
     else:
-        print("DS18B20 encontrado:", roms)
+        try:
+            roms = [bytes(r) for r in ds_sensor.scan()]
+        except (onewire.OneWireError, OSError) as e:
+            stats["bus_errors"] += 1
+            print("[TEMP] Erro no scan 1-Wire:", e)
+            roms = []
+        if roms:
+            print("DS18B20 encontrado:", roms)
+            save_rom_cache(roms)
+        else:
+            print("DS18B20 não encontrado!")
+    probes = [Probe(r) for r in roms]
 
     # GY-906 IR sensor (MLX90614)
     i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=100000)
 
+    driver = DS18B20Driver(ds_sensor, roms, state.sensor_resolution)
+    next_sample = utime.ticks_ms()
+    last_scan = next_sample
+    temp_ir = None
+
+    loop_time = metrics.loop_duration.get("temperature")
     while True:
-        # Lê DS18B20
-        ds_sensor.convert_temp()
-        utime.sleep_ms(750)
-        temp_ds = None
-        if roms:
-            temp_ds = ds_sensor.read_temp(roms[0])
+        t0 = utime.ticks_us()
+        mem_start = mem_profile.begin()
+        now = utime.ticks_ms()
 
-        # Lê MLX90614
-        temp_ir = read_ir_temperature(i2c)
+        if driver.ready(now):
+            # Uma conversão em broadcast serviu todas as sondas: lê cada uma
+            for p in probes:
+                if not driver.converted:
+                    p.fail()  # sem conversão o scratchpad tem o valor antigo
+                    continue
+                try:
+                    p.add(driver.read(p.rom))
+                except Exception as e:
+                    p.fail()
+                    print(f"[TEMP] Erro a ler sonda {p.id}:", e)
+            driver.finish()
+            temp_ds = aggregate(probes, state.probe_source)
 
-        # Calcula média se possível
-        with state.lock:
-            if temp_ds is not None:
-                state.temperature_ds = temp_ds
+            # Fusão ponderada pela confiança de cada sensor (outliers rejeitados)
             if temp_ir is not None:
-                state.ir_temperature = temp_ir
-
-            if temp_ds is not None and temp_ir is not None:
-                state.temperature = (temp_ds + temp_ir) / 2
-            elif temp_ds is not None:
-                state.temperature = temp_ds
-            elif temp_ir is not None:
-                state.temperature = temp_ir
-            else:
-                state.temperature = None
-
-        print(f"[TEMP] DS: {temp_ds}, IR: {temp_ir}, Média: {state.temperature}")
-        utime.sleep(5)
+                fusion.update(fusion.SENSOR_IR, temp_ir, now)
+            if temp_ds is not None:
+                fusion.update(fusion.SENSOR_DS, temp_ds, now)
+            temperature, variance = fusion.estimate(now)
+            if temperature is not None:
+                temperature = round(temperature, 2)
+                variance = round(variance, 4)
+
+            state.update(
+                pid_output=regulation.pid_update(temperature, now),
+                temperature_ds=temp_ds if temp_ds is not None else state.temperature_ds,
+                ir_temperature=temp_ir if temp_ir is not None else state.ir_temperature,
+                temperature=temperature,
+                temperature_variance=variance
+            )
+
+            # Histórico: no máximo um registo por minuto, gravado na flash em blocos
+            s = state.snapshot
+            power = regulation.calc_effective_percentage(s.percentage, temperature, s.comfort_mode) if s.triac_on else 0
+            history.sample(temperature, power, s.triac_on)
+
+            print(f"[TEMP] DS: {temp_ds}, IR: {temp_ir}, Fundida: {temperature} (var {variance})")
+
+        elif not driver.busy and utime.ticks_diff(now, next_sample) >= 0:
+            # Scan periódico, ou antecipado se alguma sonda deixou de responder
+            since_scan = utime.ticks_diff(now, last_scan)
+            lost = not probes or any(p.last is None and p.failures for p in probes)
+            if since_scan >= RESCAN_INTERVAL_MS or (lost and since_scan >= RESCAN_INTERVAL_MS // 6):
+                last_scan = now
+                try:
+                    rescan(ds_sensor, driver)
+                except Exception as e:
+                    stats["bus_errors"] += 1
+                    print("[TEMP] Erro no scan 1-Wire:", e)
+            # Mudança de resolução pedida pela API: aplicada entre conversões
+            if state.sensor_resolution != driver.resolution:
+                driver.set_resolution(state.sensor_resolution)
+                print(f"[TEMP] Resolução DS18B20: {driver.resolution} bits ({driver.conversion_ms} ms)")
+            # Uma falha no barramento não interrompe o ciclo: o IR continua, o scan trata do resto
+            driver.start(now)
+            # O MLX90614 é lido enquanto o DS18B20 converte
+            temp_ir = read_ir_temperature(i2c)
+            interval = max(state.sensor_interval_ms, driver.conversion_ms)
+            next_sample = utime.ticks_add(next_sample, interval)
+            if utime.ticks_diff(next_sample, now) <= 0:
+                next_sample = utime.ticks_add(now, interval)
+
+        loop_time.observe(utime.ticks_diff(utime.ticks_us(), t0))
+        mem_profile.end(mem_profile.loops, "temperature", mem_start)
+
+        # Dorme só até ao próximo evento (fim da conversão ou próxima amostra)
+        now = utime.ticks_ms()
+        if driver.busy:
+            wait = driver.due_in(now)
+        else:
+            wait = utime.ticks_diff(next_sample, now)
+        utime.sleep_ms(max(MIN_SLEEP_MS, wait))
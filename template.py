@@ -0,0 +1,49 @@
+# Templates HTML pré-divididos: o texto é partido uma única vez em segmentos
+# constantes (bytes) separados por campos {{nome}}. Cada resposta escreve os
+# segmentos e os valores diretamente no socket, sem montar a página inteira.
+
+class Template:
+    def __init__(self, text):
+        self.segments = []   # bytes constantes; len(segments) == len(fields) + 1
+        self.fields = []     # nome do campo entre cada par de segmentos
+        pos = 0
+        while True:
+            start = text.find("{{", pos)
+            if start < 0:
+                break
+            end = text.find("}}", start)
+            if end < 0:
+                raise ValueError("campo por fechar na posição %d" % start)
+            self.segments.append(text[pos:start].encode())
+            self.fields.append(text[start + 2:end].strip())
+            pos = end + 2
+        self.segments.append(text[pos:].encode())
+        self.static_len = sum(len(seg) for seg in self.segments)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            return cls(f.read())
+
+    def render_fields(self, values):
+        """ Codifica os valores dinâmicos; devolve (lista de bytes, tamanho total) """
+        parts = [str(values[name]).encode() for name in self.fields]
+        return parts, self.static_len + sum(len(p) for p in parts)
+
+    async def write(self, writer, parts):
+        """ Escreve a página, segmento a segmento, com os valores de render_fields() """
+        segments = self.segments
+        for i in range(len(parts)):
+            writer.write(segments[i])
+            writer.write(parts[i])
+        writer.write(segments[-1])
+        await writer.drain()
+
+_cache = {}
+
+def get(filename):
+    """ Template carregado do ficheiro na primeira utilização e mantido em memória """
+    t = _cache.get(filename)
+    if t is None:
+        t = _cache[filename] = Template.load(filename)
+    return t
@@ -1,16 +1,55 @@
 import utime
-import _thread
-from machine import Pin
-import neopixel
+from array import array
+import uasyncio as asyncio
+from machine import Pin, Timer
 import state
+import phase_table
+import zero_cross
 from regulation import calc_effective_percentage  # Função comum
 
-# Configuração dos pinos e LEDs
+import leds
+import boot_profile
+import metrics
+import mem_profile
+
+# Configuração dos pinos
 zero_cross_pin = Pin(27, Pin.IN)
 triac_trigger_pin = Pin(14, Pin.OUT)
-led_pin = 23
-num_leds = 8
-np = neopixel.NeoPixel(Pin(led_pin), num_leds)
+
+# Modo de disparo:
+#   "IRQ"  - IRQ no zero-crossing arma um Timer one-shot com o atraso pré-calculado;
+#            o atraso é recalculado por control_task() quando o estado muda
+#   "POLL" - espera ativa pelo zero-crossing num thread (comportamento original, ocupa um core)
+TRIAC_MODE = "IRQ"
+FIRING_TIMER_ID = 0
+RESCALE_CHECK_MS = 1000  # verificação da frequência da rede no modo IRQ
+# Eventos de estado que mudam o atraso de disparo
+CONTROL_EVENTS = state.MODE_CHANGED | state.POWER_CHANGED | state.TEMPERATURE_UPDATED | state.SETTINGS_CHANGED
+RESCALE_THRESHOLD_US = 20  # desvio do semiciclo medido que obriga a reescalar a tabela
+RESCALE_CONFIRM = 3        # verificações seguidas fora da banda antes de reescalar (ignora o jitter)
+LATE_FIRE_US = 500         # disparo mais atrasado do que isto face ao programado conta como tardio
+
+# Estado partilhado com as IRQs (apenas atribuições simples, sem alocações)
+fire_delay_us = 0       # atraso atual; 0 = não disparar
+_fire_freq = 0          # frequência equivalente ao atraso (Timer one-shot); 0 = não disparar
+_fire_timer = None
+_zc_us = 0              # ticks_us do último zero-crossing válido
+_armed = False          # disparo pedido no semiciclo em curso
+_fired = False          # e já efetuado
+_out_of_band = 0        # verificações seguidas com o semiciclo fora da banda
+rescales = 0            # reconstruções da tabela de atrasos
+
+# Instrumentação (/metrics): contadores e histogramas escritos nas IRQs
+counters = array('L', [0, 0, 0])  # disparos, semiciclos perdidos, disparos tardios
+FIRES = 0
+MISSED = 1
+LATE = 2
+fire_latency = metrics.Histogram(
+    "triac_fire_latency_us", "Tempo entre o zero-crossing e o impulso de gate",
+    (500, 1000, 2000, 3000, 4000, 5000, 6000, 7000, 8000, 9000, 10000))
+fire_lateness = metrics.Histogram(
+    "triac_fire_lateness_us", "Atraso do impulso de gate face ao atraso programado",
+    (20, 50, 100, 200, 500, 1000, 2000, 5000))
 
 def trigger_triac():
     triac_trigger_pin.on()
@@ -18,18 +57,119 @@ def trigger_triac():
     triac_trigger_pin.off()
 
 def update_leds(perc):
-    num_active_leds = round((perc / 100) * num_leds)
-    for i in range(num_leds):
-        if i < num_active_leds:
-            np[i] = (0, 3, 0)
-        else:
-            np[i] = (0, 0, 0)
-    np.write()
+    """ Barra de potência na camada mais baixa do serviço de LEDs """
+    num_active_leds = round((perc / 100) * leds.NUM_LEDS)
+    for i in range(leds.NUM_LEDS):
+        leds.set_pixel(leds.LAYER_POWER, i, (0, 3, 0) if i < num_active_leds else None)
 
-def triac_control_thread():
+def compute_delay(effective_percentage, triac_on_local):
+    """ Atraso de disparo (us) após o zero-crossing; 0 se o TRIAC não deve disparar """
+    if effective_percentage <= 0 or not triac_on_local:
+        return 0
+    elif effective_percentage >= 100:
+        return phase_table.delays[100]
+    # Tabela linearizada em potência (ver phase_table.py)
+    return phase_table.delays[int(effective_percentage + 0.5)]
+
+def read_delay(snap=None):
+    """ Devolve o atraso de disparo para um snapshot do estado (por omissão, o atual) """
+    s = snap or state.snapshot  # referência única: leitura consistente e sem lock
+    if s.menu_state != "OPERATIONAL":
+        return 0
+
+    # Calcula a potência efetiva usando a função comum
+    effective_percentage = calc_effective_percentage(s.percentage, s.temperature, s.comfort_mode)
+    return compute_delay(effective_percentage, s.triac_on)
+
+def set_fire_delay(delay):
+    """ Publica um novo atraso para as IRQs (o handler só lê _fire_freq) """
+    global fire_delay_us, _fire_freq
+    fire_delay_us = delay
+    _fire_freq = 1000000 / delay if delay > 0 else 0
+
+def _record_fire(now_us, delay):
+    global _fired
+    _fired = True
+    latency = utime.ticks_diff(now_us, _zc_us)
+    counters[FIRES] += 1
+    fire_latency.observe(latency)
+    lateness = latency - delay
+    fire_lateness.observe(lateness)
+    if lateness > LATE_FIRE_US:
+        counters[LATE] += 1
+
+def _on_fire_timer(timer):
+    now = utime.ticks_us()
+    trigger_triac()
+    _record_fire(now, fire_delay_us)
+
+def rescale_table():
+    """ Reescala a tabela de atrasos se a frequência da rede medida mudou em
+    RESCALE_CONFIRM verificações seguidas. Devolve True se mudou """
+    global _out_of_band, rescales
+    period = zero_cross.half_period_us()
+    if abs(period - phase_table.half_period_us) <= RESCALE_THRESHOLD_US:
+        _out_of_band = 0
+        return False
+    _out_of_band += 1
+    if _out_of_band < RESCALE_CONFIRM:
+        return False
+    _out_of_band = 0
+    rescales += 1
+    return phase_table.build(period)
+
+def _on_zero_cross(pin):
+    global _zc_us, _armed, _fired
+    now = utime.ticks_us()
+    # Flancos espúrios (ruído, ressaltos) não armam o disparo
+    if zero_cross.on_edge(now):
+        if _armed and not _fired:
+            counters[MISSED] += 1  # o Timer não chegou a disparar no semiciclo anterior
+        _zc_us = now
+        freq = _fire_freq
+        _armed = freq != 0
+        _fired = False
+        if freq:
+            _fire_timer.init(mode=Timer.ONE_SHOT, freq=freq, callback=_on_fire_timer)
+
+def _refresh_delay():
+    delay = read_delay()
+    if delay != fire_delay_us:
+        set_fire_delay(delay)
+
+async def control_task():
+    """ Modo IRQ: o disparo é feito pelas IRQs; aqui só se recalcula o atraso quando o estado muda """
+    global _fire_timer
+    sub = state.subscribe(CONTROL_EVENTS)
+    _fire_timer = Timer(FIRING_TIMER_ID)
+    zero_cross_pin.irq(handler=_on_zero_cross, trigger=Pin.IRQ_FALLING)
+    boot_profile.mark("triac_ready")
+    _refresh_delay()
+    # A verificação da rede tem prazo próprio: com amostragem rápida os eventos
+    # de temperatura chegam sempre antes do timeout e nunca a deixariam correr
+    rescale_at = utime.ticks_add(utime.ticks_ms(), RESCALE_CHECK_MS)
+    while True:
+        wait = utime.ticks_diff(rescale_at, utime.ticks_ms())
+        if wait > 0:
+            try:
+                await asyncio.wait_for_ms(sub.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        mem_start = mem_profile.begin()
+        now = utime.ticks_ms()
+        if utime.ticks_diff(now, rescale_at) >= 0:
+            rescale_at = utime.ticks_add(now, RESCALE_CHECK_MS)
+            rescale_table()
+        _refresh_delay()
+        mem_profile.end(mem_profile.loops, "triac_control", mem_start)
+
+def _poll_control_loop():
+    global _zc_us
+    half_cycles = 0
     while True:
         # Enquanto não estiver no estado operacional (por exemplo, em menus), suspende o disparo
-        if state.menu_state != "OPERATIONAL":
+        if state.snapshot.menu_state != "OPERATIONAL":
+            _zc_us = 0  # semiciclos suspensos não contam como perdidos
             utime.sleep_ms(50)
             continue
 
@@ -38,28 +178,31 @@ def triac_control_thread():
             pass
         while zero_cross_pin.value() == 1:
             pass
+        now = utime.ticks_us()
+        if not zero_cross.on_edge(now):
+            continue
+        # Semiciclos inteiros sem ver o flanco (thread sem CPU) foram perdidos
+        half = phase_table.half_period_us
+        gap = utime.ticks_diff(now, _zc_us)
+        if _zc_us and gap > half + half // 2:
+            counters[MISSED] += (gap + half // 2) // half - 1
+        _zc_us = now
         utime.sleep_us(10)
 
-        with state.lock:
-            base_percentage = state.percentage
-            current_temperature = state.temperature
-            comfort_mode = state.comfort_mode
-            triac_on_local = state.triac_on
-
-        # Calcula a potência efetiva usando a função comum
-        effective_percentage = calc_effective_percentage(base_percentage, current_temperature, comfort_mode)
-        #print(effective_percentage)
-        
-        # Cálculo do delay (exemplo simplificado)
-        if effective_percentage <= 0 or not triac_on_local:
-            delay = -1
-        elif effective_percentage >= 100:
-            delay = 10
-        else:
-            delay = int((100 - effective_percentage) * 100)
-
-        #print(f"[TRIAC] Base: {base_percentage}%, Effective: {effective_percentage:.1f}%, Temp: {current_temperature}, Delay: {delay} us")
+        half_cycles += 1
+        if half_cycles >= 50:
+            half_cycles = 0
+            rescale_table()
+
+        delay = read_delay()
+        #print(f"[TRIAC] Delay: {delay} us")
         if delay > 0:
             utime.sleep_us(delay)
+            now = utime.ticks_us()
             trigger_triac()
+            _record_fire(now, delay)
 
+def triac_control_thread():
+    """ Modo POLL (o modo IRQ corre em control_task()) """
+    boot_profile.mark("triac_ready")
+    _poll_control_loop()
@@ -0,0 +1,128 @@
+# WebSocket mínimo (RFC 6455) sobre os streams do uasyncio: só frames de texto
+# curtos, sem fragmentação nem extensões. Suficiente para o canal do dashboard.
+import binascii
+import hashlib
+import struct
+import uasyncio as asyncio
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_PAYLOAD = 512  # comandos do dashboard são pequenos
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+def accept_key(key):
+    digest = hashlib.sha1(key.encode() + GUID).digest()
+    return binascii.b2a_base64(digest).strip()
+
+async def handshake(writer, key):
+    writer.write(b"HTTP/1.1 101 Switching Protocols\r\n"
+                 b"Upgrade: websocket\r\n"
+                 b"Connection: Upgrade\r\n"
+                 b"Sec-WebSocket-Accept: " + accept_key(key) + b"\r\n\r\n")
+    await writer.drain()
+
+class WebSocket:
+    """
+    Prazos (ms, None = sem prazo): `write_timeout_ms` por frame enviado (cliente
+    que não lê); `ping_ms` de silêncio na receção até enviar um ping, e outro
+    tanto sem resposta até dar a ligação por morta (cliente meio-aberto, por
+    exemplo um telemóvel que adormeceu).
+    """
+    def __init__(self, reader, writer, write_timeout_ms=None, ping_ms=None):
+        self.reader = reader
+        self.writer = writer
+        self.write_timeout_ms = write_timeout_ms
+        self.ping_ms = ping_ms
+        self.closed = False
+
+    async def _write_frame(self, opcode, payload=b""):
+        n = len(payload)
+        if n < 126:
+            header = struct.pack("!BB", 0x80 | opcode, n)
+        else:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        # Um único write por frame: envios de tarefas diferentes não se intercalam
+        self.writer.write(header + payload)
+        if self.write_timeout_ms:
+            await asyncio.wait_for_ms(self.writer.drain(), self.write_timeout_ms)
+        else:
+            await self.writer.drain()
+
+    async def _send_frame(self, opcode, payload=b""):
+        if self.closed:
+            return
+        try:
+            await self._write_frame(opcode, payload)
+        except (OSError, asyncio.TimeoutError):
+            self.closed = True
+
+    async def send(self, text):
+        await self._send_frame(OP_TEXT, text.encode())
+
+    async def close(self, code=1000):
+        if not self.closed:
+            self.closed = True
+            try:
+                await self._write_frame(OP_CLOSE, struct.pack("!H", code))
+            except (OSError, asyncio.TimeoutError):
+                pass
+
+    async def _read(self, n, timeout_ms):
+        if timeout_ms:
+            return await asyncio.wait_for_ms(self.reader.readexactly(n), timeout_ms)
+        return await self.reader.readexactly(n)
+
+    async def _read_head(self):
+        """ Dois primeiros bytes de um frame; com ping_ms, sonda o cliente quando está calado """
+        pinged = False
+        while True:
+            try:
+                return await self._read(2, self.ping_ms)
+            except asyncio.TimeoutError:
+                if pinged:
+                    raise
+            pinged = True
+            await self._send_frame(OP_PING)
+            if self.closed:
+                raise OSError("ping falhou")
+
+    async def recv(self):
+        """ Próxima mensagem de texto; None quando a ligação fecha """
+        while not self.closed:
+            try:
+                head = await self._read_head()
+                # O resto do frame vem logo a seguir: o mesmo prazo que uma escrita
+                timeout = self.write_timeout_ms
+                opcode = head[0] & 0x0F
+                n = head[1] & 0x7F
+                if n == 126:
+                    n = struct.unpack("!H", await self._read(2, timeout))[0]
+                elif n == 127:
+                    n = struct.unpack("!Q", await self._read(8, timeout))[0]
+                if n > MAX_PAYLOAD:
+                    await self.close(1009)  # mensagem demasiado grande
+                    return None
+                mask = await self._read(4, timeout) if head[1] & 0x80 else None
+                payload = bytearray(await self._read(n, timeout)) if n else bytearray()
+            except (OSError, EOFError, asyncio.TimeoutError):
+                self.closed = True
+                return None
+
+            if mask:
+                for i in range(n):
+                    payload[i] ^= mask[i & 3]
+
+            if opcode == OP_TEXT:
+                return payload.decode()
+            elif opcode == OP_PING:
+                await self._send_frame(OP_PONG, bytes(payload))
+            elif opcode == OP_CLOSE:
+                await self.close()
+                return None
+            # OP_PONG, binário e continuações são ignorados
+        return None
@@ -1,335 +1,316 @@
-import time
+import utime
+import _thread
 import network
 import socket
-import machine
-from machine import Pin
+import uasyncio as asyncio
 import config
-import neopixel
 import state
-
-# Parâmetros
-timeout_botao = 1.5  # tempo de botão pressionado para forçar standalone
-timeout_wifi = 40
-
-button_pin = Pin(26, Pin.IN, Pin.PULL_DOWN)
-led_pin = 23
-num_leds = 8
-np = neopixel.NeoPixel(Pin(led_pin), num_leds)
-for i in range(num_leds):
-    np[i] = (0, 0, 0)
-np.write()
-
-state.triac_on = False
-
-def fade_led(index, color, delay=0.01, steps=50):
-    r, g, b = color
-    min_brightness = 0.05
-    max_brightness = 0.7
-
-    for i in range(steps + 1):
-        factor = min_brightness + (i / steps) * (max_brightness - min_brightness)
-        np[index] = (int(r * factor), int(g * factor), int(b * factor))
-        np.write()
-        time.sleep(delay)
-
-    for i in range(steps, -1, -1):
-        factor = min_brightness + (i / steps) * (max_brightness - min_brightness)
-        np[index] = (int(r * factor), int(g * factor), int(b * factor))
-        np.write()
-        time.sleep(delay)
-
-
-def check_abort_button(timeout=timeout_botao):
-    start = time.ticks_ms()
-    blink_state = False
-    blink_interval = 300
-    last_blink = time.ticks_ms()
-
-    while button_pin.value() == 1:
-        elapsed = time.ticks_diff(time.ticks_ms(), start)
-
-        if elapsed >= 15000:
-            print("[Botão] Reset Wi-Fi após 15s.")
-            config.reset_wifi_config()
-            for _ in range(3):
-                np[0] = (30, 0, 30)  # roxo
-                np.write()
-                time.sleep(0.3)
-                np[0] = (0, 0, 0)
-                np.write()
-                time.sleep(0.3)
-            machine.reset()
-            return False
-
-        elif elapsed >= timeout * 1000:
-            if time.ticks_diff(time.ticks_ms(), last_blink) > blink_interval:
-                blink_state = not blink_state
-                np[0] = (20, 0, 0) if blink_state else (0, 0, 0)
-                np.write()
-                last_blink = time.ticks_ms()
-
-        time.sleep(0.05)
-
-    elapsed = time.ticks_diff(time.ticks_ms(), start)
-    if elapsed >= timeout * 1000:
-        print("[Botão] Abort solicitado via botão.")
-        for _ in range(4):
-            np[0] = (20, 0, 0)
-            np.write()
-            time.sleep(0.2)
-            np[0] = (0, 0, 0)
-            np.write()
-            time.sleep(0.2)
-        return True
-
-    return False
-
-
-def start_access_point():
-    import _thread
-
-    ap = network.WLAN(network.AP_IF)
-    ap.active(True)
-    ap.config(essid="ESP32_Setup", password="12345678")
-    ap.ifconfig(('10.0.0.1', '255.255.255.0', '10.0.0.1', '10.0.0.1'))
-    print("[Wi-Fi] Access Point iniciado. Aguardando ligação em http://10.0.0.1")
-
-    def dns_server():
-        import socket
-        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp.bind(("0.0.0.0", 53))
-        while True:
+import regulation
+import http_parser
+import leds
+import mem_profile
+import history
+
+# Ligação Wi-Fi como tarefa asyncio com estados explícitos. O aquecimento não
+# espera pela rede: o dispositivo arranca em STANDALONE e passa a ONLINE (e
+# volta) sempre que a ligação sobe ou cai, sem reiniciar.
+#
+#   IDLE        sem configuração e sem portal ativo (standalone)
+#   AP          portal de configuração em 10.0.0.1, até AP_TIMEOUT_S
+#   CONNECTING  station.connect() em curso, até CONNECT_TIMEOUT_S
+#   CONNECTED   ligado; verificação periódica da ligação
+#   BACKOFF     espera antes de nova tentativa (intervalo duplica até RETRY_MAX_S)
+
+CONNECT_TIMEOUT_S = 40
+AP_TIMEOUT_S = 300
+RETRY_MIN_S = 5
+RETRY_MAX_S = 300
+POLL_MS = 250                # verificação do estado da ligação
+NTP_RESYNC_S = 86400         # novo acerto do relógio enquanto ligado (deriva do RTC)
+NTP_TIMEOUT_S = 1            # timeout do socket UDP do ntptime
+NTP_WAIT_MS = 10000          # espera máxima pelo thread do acerto (inclui o DNS)
+AP_IP = "10.0.0.1"
+
+
+state.update(triac_on=False)
+
+status = state.wifi_status
+
+PORTAL_HTML = """<html>
+  <head>
+    <meta charset="UTF-8">
+    <title>Configurar Wi-Fi</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <style>
+      body {
+        background: linear-gradient(to right, #005AA7, #FFFDE4);
+        font-family: 'Segoe UI', sans-serif;
+        margin: 0;
+        padding: 0;
+      }
+      .container {
+        max-width: 400px;
+        margin: 60px auto;
+        background: white;
+        padding: 30px;
+        border-radius: 12px;
+        box-shadow: 0 8px 16px rgba(0,0,0,0.2);
+      }
+      h1 {
+        text-align: center;
+        color: #005AA7;
+        margin-bottom: 24px;
+      }
+      label {
+        font-weight: bold;
+        display: block;
+        margin: 12px 0 6px;
+        color: #333;
+      }
+      input {
+        width: 100%;
+        padding: 10px;
+        font-size: 16px;
+        border: 1px solid #ccc;
+        border-radius: 6px;
+        box-sizing: border-box;
+      }
+      button {
+        margin-top: 20px;
+        width: 100%;
+        padding: 12px;
+        background-color: #005AA7;
+        color: white;
+        font-size: 18px;
+        border: none;
+        border-radius: 6px;
+        cursor: pointer;
+        transition: background-color 0.3s ease;
+      }
+      button:hover {
+        background-color: #003f7d;
+      }
+      .footer {
+        text-align: center;
+        font-size: 14px;
+        color: #666;
+        margin-top: 20px;
+      }
+    </style>
+  </head>
+  <body>
+    <div class="container">
+      <h1>Configurar Wi-Fi</h1>
+      <form method="post" action="/configure">
+        <label for="ssid">Nome da Rede (SSID):</label>
+        <input type="text" name="ssid" required>
+
+        <label for="password">Password:</label>
+        <input type="password" name="password" required>
+
+        <label for="hostname">Hostname:</label>
+        <input type="text" name="hostname" placeholder="esp32" required>
+
+        <button type="submit">Guardar e Ligar</button>
+      </form>
+      <div class="footer">Halo Heat &copy; 2025</div>
+    </div>
+  </body>
+</html>
+"""
+
+def set_operating_mode(operating_mode, menu_state=None):
+    """ Muda o modo de operação e recompila as tabelas de regulação (limites diferentes) """
+    if menu_state is None:
+        state.update(operating_mode=operating_mode)
+    else:
+        state.update(operating_mode=operating_mode, menu_state=menu_state)
+    regulation.rebuild_tables()
+
+def _set_status(name):
+    if status["state"] != name:
+        print(f"[Wi-Fi] {status['state']} -> {name}")
+        status["state"] = name
+
+def dns_response(query, ip):
+    """ Resposta a uma pergunta DNS com um único registo A para `ip` (4 bytes) """
+    return (
+        query[:2] + b'\x81\x80' + query[4:6]*2 +
+        b'\x00\x00\x00\x00' + query[12:] +
+        b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04' + ip
+    )
+
+async def _dns_server(ap):
+    """ Responde a qualquer domínio com o IP do portal (deteção de portal cativo) """
+    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp.setblocking(False)
+    udp.bind(("0.0.0.0", 53))
+    ip = bytes(map(int, AP_IP.split('.')))
+    try:
+        while ap.active():
             try:
                 data, addr = udp.recvfrom(512)
-                # Resposta padrão para qualquer domínio
-                dns_response = (
-                    data[:2] + b'\x81\x80' + data[4:6]*2 +
-                    b'\x00\x00\x00\x00' + data[12:] +
-                    b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04' +
-                    bytes(map(int, ap.ifconfig()[0].split('.')))
-                )
-                udp.sendto(dns_response, addr)
-            except Exception as e:
+            except OSError:
+                await asyncio.sleep_ms(100)
+                continue
+            try:
+                udp.sendto(dns_response(data, ip), addr)
+            except OSError as e:
                 print("[DNS] Erro:", e)
+    finally:
+        udp.close()
 
-    _thread.start_new_thread(dns_server, ())
-
-    addr = socket.getaddrinfo('0.0.0.0', 80)[0][-1]
-    s = socket.socket()
-    s.bind(addr)
-    s.listen(5)
-    s.settimeout(1)
-
-    start_time = time.time()
-    while time.time() - start_time < timeout_wifi:
-        fade_led(0, (0, 0, 40), delay=0.01, steps=50)
-        if check_abort_button():
-            print("[AP] Abort manual. Entrando em modo standalone.")
-            s.close()
-            ap.active(False)
-            state.operating_mode = "STANDALONE"
-            state.menu_state = "OPERATIONAL"
-            np[0] = (50, 0, 0)
-            np.write()
-            return False
+async def _run_portal():
+    """ Portal de configuração; devolve True se foi gravada uma configuração nova """
+    ap = network.WLAN(network.AP_IF)
+    ap.active(True)
+    ap.config(essid="ESP32_Setup", password="12345678")
+    ap.ifconfig((AP_IP, '255.255.255.0', AP_IP, AP_IP))
+    print("[Wi-Fi] Access Point iniciado. Aguardando ligação em http://" + AP_IP)
+    configured = asyncio.Event()
 
+    async def handle(reader, writer):
+        mem_start = mem_profile.begin()
         try:
-            conn, addr = s.accept()
-            request = conn.recv(1024).decode('utf-8')
-            print(f"[AP] Conexão recebida de {addr}")
-            print("Request:", request)
-
-            if "POST /configure" in request:
-                body = request.split('\r\n\r\n')[1]
-                params = dict(x.split('=') for x in body.split('&'))
-                data = {
-                    "ssid": params["ssid"],
-                    "password": params["password"],
-                    "hostname": params["hostname"]
-                }
-                config.save_wifi_config(data['ssid'], data['password'], data['hostname'])
-                response = "HTTP/1.1 200 OK\nContent-Type: application/json\n\n{\"status\": \"success\", \"message\": \"Configuração salva. Reiniciando...\"}"
-                conn.send(response)
-                conn.close()
-                time.sleep(2)
-                machine.reset()
-
-            elif (
-                "generate_204" in request or
-                "hotspot-detect.html" in request or
-                "connecttest.txt" in request or
-                "ncsi.txt" in request or
-                "captive.apple.com" in request or
-                "GET / HTTP" in request or
-                "Host:" in request
-            ):
-                html = """
-                <html>
-                  <head>
-                    <meta charset="UTF-8">
-                    <title>Configurar Wi-Fi</title>
-                    <meta name="viewport" content="width=device-width, initial-scale=1">
-                    <style>
-                      body {
-                        background: linear-gradient(to right, #005AA7, #FFFDE4);
-                        font-family: 'Segoe UI', sans-serif;
-                        margin: 0;
-                        padding: 0;
-                      }
-                      .container {
-                        max-width: 400px;
-                        margin: 60px auto;
-                        background: white;
-                        padding: 30px;
-                        border-radius: 12px;
-                        box-shadow: 0 8px 16px rgba(0,0,0,0.2);
-                      }
-                      h1 {
-                        text-align: center;
-                        color: #005AA7;
-                        margin-bottom: 24px;
-                      }
-                      label {
-                        font-weight: bold;
-                        display: block;
-                        margin: 12px 0 6px;
-                        color: #333;
-                      }
-                      input {
-                        width: 100%;
-                        padding: 10px;
-                        font-size: 16px;
-                        border: 1px solid #ccc;
-                        border-radius: 6px;
-                        box-sizing: border-box;
-                      }
-                      button {
-                        margin-top: 20px;
-                        width: 100%;
-                        padding: 12px;
-                        background-color: #005AA7;
-                        color: white;
-                        font-size: 18px;
-                        border: none;
-                        border-radius: 6px;
-                        cursor: pointer;
-                        transition: background-color 0.3s ease;
-                      }
-                      button:hover {
-                        background-color: #003f7d;
-                      }
-                      .footer {
-                        text-align: center;
-                        font-size: 14px;
-                        color: #666;
-                        margin-top: 20px;
-                      }
-                    </style>
-                  </head>
-                  <body>
-                    <div class="container">
-                      <h1>Configurar Wi-Fi</h1>
-                      <form method="post" action="/configure">
-                        <label for="ssid">Nome da Rede (SSID):</label>
-                        <input type="text" name="ssid" required>
-
-                        <label for="password">Password:</label>
-                        <input type="password" name="password" required>
-
-                        <label for="hostname">Hostname:</label>
-                        <input type="text" name="hostname" placeholder="esp32" required>
-
-                        <button type="submit">Guardar e Ligar</button>
-                      </form>
-                      <div class="footer">Halo Heat &copy; 2025</div>
-                    </div>
-                  </body>
-                </html>
-                """
-
-                response = "HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n" + html
-                conn.send(response)
-                conn.close()
-
+            req = await http_parser.read_request(http_parser.LineReader(reader), 10000, 5000, 5000)
+            if req is None:
+                return
+            if req.method == "POST" and req.path == "/configure":
+                # SSID/password com espaços ou símbolos chegam URL-encoded
+                params = req.form()
+                config.save_wifi_config(params["ssid"], params["password"], params.get("hostname"))
+                body = '{"status": "success", "message": "Configuração salva. A ligar..."}'.encode()
+                writer.write(http_parser.response_head(200, "application/json", len(body), False).encode() + body)
+                configured.set()
             else:
-                response = "HTTP/1.1 302 Found\r\nLocation: /\r\n\r\n"
-                conn.send(response)
-                conn.close()
-
-        except OSError:
-            continue
-
-
-
-
-    print("[AP] Tempo esgotado. Nenhuma ligação efetuada.")
-    s.close()
-    ap.active(False)
-    state.operating_mode = "STANDALONE"
-    state.menu_state = "BLOQUEADO"
-    return False
-
-
-def connect_to_wifi():
-    config_data = config.load_wifi_config()
-
-    if not config_data:
-        print("[Wi-Fi] Nenhuma configuração encontrada. Iniciando modo configuração (AP)...")
-        if not start_access_point():
-            print("[Wi-Fi] Nenhuma ligação efetuada. Entrando em modo standalone.")
-            state.operating_mode = "STANDALONE"
-            state.menu_state = "BLOQUEADO"
-            fade_led(0, (50, 0, 0), delay=0.01, steps=50)
-            return False
-
-    ssid = config_data["ssid"]
-    password = config_data["password"]
-    hostname = config_data["hostname"]
-    print("[Wi-Fi] Dados da configuração encontrados:")
-    print(ssid, password, hostname)
-
-    station = network.WLAN(network.STA_IF)
-    time.sleep(1)
+                # Qualquer outro pedido (generate_204, hotspot-detect.html, ...) recebe o formulário
+                body = PORTAL_HTML.encode()
+                writer.write(http_parser.response_head(200, "text/html; charset=utf-8", len(body), False).encode() + body)
+            await writer.drain()
+        except (OSError, KeyError, http_parser.HTTPError, http_parser.RequestTimeout) as e:
+            print("[AP] Pedido inválido:", e)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+            mem_profile.end(mem_profile.routes, "portal", mem_start)
+
+    server = await asyncio.start_server(handle, "0.0.0.0", 80)
+    dns = asyncio.create_task(_dns_server(ap))
+    leds.flash((0, 0, 40), times=2)
+    try:
+        await asyncio.wait_for(configured.wait(), AP_TIMEOUT_S)
+        await asyncio.sleep(1)  # deixa a resposta sair antes de desligar o AP
+        return True
+    except asyncio.TimeoutError:
+        print("[AP] Tempo esgotado. Nenhuma configuração recebida.")
+        return False
+    finally:
+        server.close()
+        await server.wait_closed()
+        ap.active(False)
+        dns.cancel()
+
+async def _connect(station, cfg):
+    """ Uma tentativa de ligação; devolve True se ficou ligado dentro do prazo """
+    status["attempts"] += 1
     station.active(True)
-    station.config(dhcp_hostname=hostname)
-    station.connect(ssid, password)
-    print(f"[Wi-Fi] Conectando-se à rede '{ssid}'...")
-
-    start_time = time.time()
+    station.config(dhcp_hostname=cfg["hostname"])
+    station.connect(cfg["ssid"], cfg["password"])
+    print(f"[Wi-Fi] Conectando-se à rede '{cfg['ssid']}'...")
+    start = utime.ticks_ms()
     while not station.isconnected():
-        fade_led(0, (0, 50, 0), delay=0.01, steps=50)
-        if check_abort_button():
-            print("[Wi-Fi] Aborto manual. Entrando em modo standalone.")
-            state.operating_mode = "STANDALONE"
-            state.menu_state = "OPERATIONAL"
-            np[0] = (50, 0, 0)
-            np.write()
-            return False
-
-        if time.time() - start_time > timeout_wifi:
-            print("[Wi-Fi] Falha ao conectar. Entrando em modo standalone.")
-            for _ in range(4):
-                np[0] = (20, 0, 0)
-                np.write()
-                time.sleep(0.2)
-                np[0] = (0, 0, 0)
-                np.write()
-                time.sleep(0.2)
-            station.active(False)
-            state.operating_mode = "STANDALONE"
-            state.menu_state = "BLOQUEADO"
+        if utime.ticks_diff(utime.ticks_ms(), start) > CONNECT_TIMEOUT_S * 1000:
+            station.disconnect()
             return False
+        await asyncio.sleep_ms(POLL_MS)
+    return True
+
+_ntp_busy = False
+
+def _set_clock(ntptime, result, done):
+    # Corre num thread: o DNS e o pedido UDP bloqueiam e não podem parar o ciclo asyncio
+    global _ntp_busy
+    try:
+        before = utime.time()
+        ntptime.settime()
+        history.clock_set(utime.time() - before)
+        result[0] = True
+    except (OSError, OverflowError) as e:
+        print("[Wi-Fi] Falha ao acertar o relógio:", e)
+    finally:
+        _ntp_busy = False
+        done.set()
+
+async def sync_clock():
+    """ Acerta o RTC por NTP fora do ciclo asyncio; devolve True se acertou """
+    global _ntp_busy
+    try:
+        import ntptime
+    except ImportError:
+        return False
+    if _ntp_busy:
+        return False  # acerto anterior ainda pendurado no DNS
+    _ntp_busy = True
+    ntptime.timeout = NTP_TIMEOUT_S
+    result = [False]
+    done = asyncio.ThreadSafeFlag()
+    _thread.start_new_thread(_set_clock, (ntptime, result, done))
+    try:
+        await asyncio.wait_for_ms(done.wait(), NTP_WAIT_MS)
+    except asyncio.TimeoutError:
+        return False
+    return result[0]
+
+async def wifi_task(on_connected=None):
+    """
+    Mantém a ligação Wi-Fi. `on_connected` (corrotina, opcional) é chamada a
+    cada ligação estabelecida, por exemplo para arrancar o servidor HTTP.
+    """
+    station = network.WLAN(network.STA_IF)
+    retry_s = RETRY_MIN_S
+
+    while True:
+        cfg = config.load_wifi_config()
+        if not cfg:
+            _set_status("AP")
+            if not await _run_portal():
+                _set_status("IDLE")
+                print("[Wi-Fi] Sem configuração. Modo standalone.")
+                leds.flash((20, 0, 0))
+                return
+            continue
 
-    print(f"[Wi-Fi] Conectado com sucesso! Endereço IP: {station.ifconfig()[0]}")
-    print("Hostname mDNS:", station.config("dhcp_hostname"))
-    state.operating_mode = "ONLINE"
-    state.menu_state = "BLOQUEADO"
+        _set_status("CONNECTING")
+        if not await _connect(station, cfg):
+            _set_status("BACKOFF")
+            print(f"[Wi-Fi] Falha ao conectar. Nova tentativa em {retry_s} s.")
+            await asyncio.sleep(retry_s)
+            retry_s = min(RETRY_MAX_S, retry_s * 2)
+            continue
 
-    for _ in range(4):
-        np[0] = (0, 20, 0)
-        np.write()
-        time.sleep(0.2)
-        np[0] = (0, 0, 0)
-        np.write()
-        time.sleep(0.2)
-    return True
\ No newline at end of file
+        retry_s = RETRY_MIN_S
+        status["connects"] += 1
+        status["ip"] = station.ifconfig()[0]
+        _set_status("CONNECTED")
+        print(f"[Wi-Fi] Conectado com sucesso! Endereço IP: {status['ip']}")
+        print("Hostname mDNS:", station.config("dhcp_hostname"))
+        set_operating_mode("ONLINE")
+        leds.flash((0, 20, 0))
+        synced = await sync_clock()
+        synced_at = utime.ticks_ms()
+        if on_connected is not None:
+            await on_connected()
+
+        while station.isconnected():
+            await asyncio.sleep_ms(POLL_MS * 4)
+            # Sem acerto: tenta de novo dentro de um minuto; com acerto, uma vez por dia
+            if utime.ticks_diff(utime.ticks_ms(), synced_at) >= (NTP_RESYNC_S if synced else 60) * 1000:
+                synced = await sync_clock()
+                synced_at = utime.ticks_ms()
+
+        # Ligação perdida: regula com os limites standalone até voltar
+        status["drops"] += 1
+        status["ip"] = None
+        print("[Wi-Fi] Ligação perdida. Modo standalone até nova ligação.")
+        set_operating_mode("STANDALONE")
+        leds.flash((20, 0, 0))
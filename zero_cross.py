@@ -0,0 +1,81 @@
+import utime
+from array import array
+
+# Medição do semiciclo da rede a partir dos flancos do detetor de zero-crossing.
+# on_edge() corre no contexto da IRQ: só aritmética inteira e escrita em arrays
+# pré-alocados. As estatísticas (média, jitter) são calculadas fora da IRQ.
+
+DEFAULT_HALF_PERIOD_US = 10000  # 50 Hz até haver medições
+MIN_HALF_PERIOD_US = 7000       # ~71 Hz: flancos mais próximos são ruído/ressalto
+MAX_HALF_PERIOD_US = 12500      # 40 Hz: intervalos maiores indicam flancos perdidos
+WINDOW = 32                     # média deslizante (potência de 2)
+
+_periods = array('l', [0] * WINDOW)
+_index = 0
+_sum = 0
+_last_edge_us = 0
+_synced = False
+
+samples = 0     # semiciclos medidos
+rejected = 0    # flancos espúrios ignorados
+resyncs = 0     # intervalos demasiado longos (flancos perdidos, rede ausente)
+
+def on_edge(now_us):
+    """
+    Regista um flanco do detetor. Devolve True se é um zero-crossing válido
+    (o disparo pode ser armado), False se foi rejeitado como espúrio.
+    """
+    global _index, _sum, _last_edge_us, _synced, samples, rejected, resyncs
+    if not _synced:
+        _last_edge_us = now_us
+        _synced = True
+        return True
+
+    dt = utime.ticks_diff(now_us, _last_edge_us)
+    if dt < MIN_HALF_PERIOD_US:
+        # Não move a referência: o próximo flanco real é medido desde o último válido
+        rejected += 1
+        return False
+    _last_edge_us = now_us
+    if dt > MAX_HALF_PERIOD_US:
+        resyncs += 1
+        return True
+
+    _sum += dt - _periods[_index]
+    _periods[_index] = dt
+    _index = (_index + 1) & (WINDOW - 1)
+    samples += 1
+    return True
+
+def half_period_us():
+    """ Média deslizante do semiciclo (us) """
+    n = samples if samples < WINDOW else WINDOW
+    if not n:
+        return DEFAULT_HALF_PERIOD_US
+    return _sum // n
+
+def frequency_hz():
+    return 1000000 / (2 * half_period_us())
+
+def stats():
+    """ Frequência e jitter dos flancos na janela atual (para /status) """
+    n = samples if samples < WINDOW else WINDOW
+    avg = half_period_us()
+    var = 0
+    peak = 0
+    for i in range(n):
+        d = _periods[i] - avg
+        var += d * d
+        if d < 0:
+            d = -d
+        if d > peak:
+            peak = d
+    return {
+        "hz": round(frequency_hz(), 2),
+        "half_period_us": avg,
+        "jitter_us": round((var / n) ** 0.5, 1) if n else None,
+        "jitter_max_us": peak if n else None,
+        "samples": samples,
+        "rejected": rejected,
+        "resyncs": resyncs
+    }